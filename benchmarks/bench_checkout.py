@@ -0,0 +1,164 @@
+"""Checkout benchmark suite with machine-readable results.
+
+Times product purchases, every promotion, Store.order with small and huge
+shopping lists, the Store aggregates and the magic Store operators on
+synthetic catalogs of several sizes. Results are written as JSON; pass a
+previous result file with --compare to flag regressions.
+
+Usage:
+    python benchmarks/bench_checkout.py [--scales 1000 10000] [--output run.json]
+                                        [--compare baseline.json] [--threshold 1.25]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import products
+import stores
+import stores_with_magic
+
+# Effectively unlimited stock, so repeated orders never sell out
+STOCK = 10**12
+
+
+def build_catalog(count, seed=42):
+    """Build a reproducible mix of products and promotions."""
+    rng = random.Random(seed)
+    promotions = [None, products.SecondHalfPrice("Second Half price!"),
+                  products.ThirdOneFree("Third One Free!"), products.PercentDiscount("30% off!", percent=30)]
+    catalog = []
+    for i in range(count):
+        price = round(rng.uniform(1, 2000), 2)
+        kind = rng.random()
+        if kind < 0.05:
+            product = products.NonStockedProduct(f"License {i}", price=price)
+        elif kind < 0.10:
+            product = products.LimitedProduct(f"Shipping {i}", price=price, quantity=STOCK, maximum=STOCK)
+        else:
+            product = products.Product(f"Product {i}", price=price, quantity=STOCK)
+        promotion = rng.choice(promotions)
+        if promotion:
+            product.set_promotion(promotion)
+        catalog.append(product)
+    return catalog
+
+
+def measure(function, min_time=0.2, repeats=5):
+    """Return the median seconds per call of function over several timed rounds."""
+    # Find a number of calls per round that takes at least min_time / repeats
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / repeats or calls >= 1_000_000:
+            break
+        calls *= 2
+
+    rounds = [elapsed / calls]
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(calls):
+            function()
+        rounds.append((time.perf_counter() - started) / calls)
+    return statistics.median(rounds), calls
+
+
+def benchmarks_for(scale):
+    """Yield (name, function) pairs to time for one catalog size."""
+    catalog = build_catalog(scale)
+    store = stores.Store(catalog)
+    rng = random.Random(scale)
+
+    product = products.Product("Benchmark Product", price=19.99, quantity=STOCK)
+    yield "Product.buy", lambda: product.buy(1)
+
+    quoted = products.Product("Quoted Product", price=19.99, quantity=STOCK)
+    for promotion in [products.SecondHalfPrice("Second Half price!"), products.ThirdOneFree("Third One Free!"),
+                      products.PercentDiscount("30% off!", percent=30)]:
+        yield f"{type(promotion).__name__}.apply_promotion", \
+            lambda promotion=promotion: promotion.apply_promotion(quoted, 7)
+
+    small_order = [(product, 1) for product in rng.sample(catalog, min(5, scale))]
+    huge_order = [(product, 1) for product in rng.sample(catalog, min(10_000, scale))]
+    yield "Store.order (5 lines)", lambda: store.order(small_order, quiet=True)
+    yield f"Store.order ({len(huge_order)} lines)", lambda: store.order(huge_order, quiet=True)
+
+    yield "Store.get_all_products", store.get_all_products
+    yield "Store.get_total_quantity", store.get_total_quantity
+
+    magic_store = stores_with_magic.Store(catalog)
+    other_store = stores_with_magic.Store(build_catalog(scale, seed=7))
+    missing = products.Product("Missing Product", price=1, quantity=1)
+    last_name = catalog[-1].name
+    yield "magic Store.__contains__ (name)", lambda: last_name in magic_store
+    yield "magic Store.__contains__ (product)", lambda: missing in magic_store
+    yield "magic Store.__add__", lambda: magic_store + other_store
+
+
+def run(scales):
+    results = []
+    for scale in scales:
+        for name, function in benchmarks_for(scale):
+            seconds, calls = measure(function)
+            results.append({"benchmark": name, "scale": scale, "seconds_per_call": seconds, "calls": calls})
+            print(f"{scale:>9,} {name:40} {seconds * 1e6:12.2f} µs", file=sys.stderr)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Return the results that got slower than threshold times the baseline."""
+    previous = {(result["benchmark"], result["scale"]): result["seconds_per_call"]
+                for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get((result["benchmark"], result["scale"]))
+        if before and result["seconds_per_call"] > before * threshold:
+            regressions.append({**result, "baseline_seconds_per_call": before,
+                                "ratio": result["seconds_per_call"] / before})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio that counts as a regression (default 1.25)")
+    args = parser.parse_args()
+
+    report = run(args.scales)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            report["regressions"] = compare(report, json.load(baseline_file), args.threshold)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+    if report.get("regressions"):
+        for regression in report["regressions"]:
+            print(f"REGRESSION {regression['benchmark']} at {regression['scale']:,}: "
+                  f"{regression['ratio']:.2f}x slower", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
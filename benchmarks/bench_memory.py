@@ -0,0 +1,66 @@
+"""Measure the memory used per product with and without __slots__.
+
+Usage: python benchmarks/bench_memory.py [number_of_products]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import products
+import products_with_magic
+
+
+class DictProduct:
+    """The Product layout before __slots__: every attribute in an instance __dict__."""
+
+    def __init__(self, name, price, quantity):
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+        self.active = True
+        self.promotion = None
+
+
+class DictMagicProduct:
+    """The products_with_magic.Product layout before __slots__."""
+
+    def __init__(self, name, price, quantity):
+        self.name = name
+        self.price = price
+        self._quantity = quantity
+        self._active = True
+        self._promotion = None
+
+
+def bytes_per_product(product_class, count):
+    """Build count products and return the bytes allocated for each one."""
+    # Names are built up front so that only the product objects are measured
+    names = [f"Product {i}" for i in range(count)]
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    catalog = [product_class(name, 10, 5) for name in names]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The list holding the products is not part of the per-product cost
+    list_size = sys.getsizeof(catalog)
+    return (after - before - list_size) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"Bytes per product for {count:,} products")
+    for label, before_class, after_class in [
+        ("products.Product", DictProduct, products.Product),
+        ("products_with_magic.Product", DictMagicProduct, products_with_magic.Product),
+    ]:
+        before = bytes_per_product(before_class, count)
+        after = bytes_per_product(after_class, count)
+        print(f"{label:30} __dict__: {before:6.1f}  __slots__: {after:6.1f}  saved: {before - after:6.1f}")
+
+
+if __name__ == "__main__":
+    main()
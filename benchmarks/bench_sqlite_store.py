@@ -0,0 +1,68 @@
+"""Compare the list backed Store with SQLiteStore at several catalog sizes.
+
+Usage: python benchmarks/bench_sqlite_store.py [size ...]   (default: 10000 100000 1000000)
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import products
+from sqlite_store import SQLiteStore
+from stores import Store
+
+
+def build_products(count):
+    product_list = [products.Product(f"Product {i}", price=10 + i % 90, quantity=10**6) for i in range(count)]
+    for product in product_list[::3]:
+        product.set_promotion(products.ThirdOneFree("Third One Free!"))
+    return product_list
+
+
+def timed(function, repeat=1):
+    """Return the average seconds per call of function."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def measure(store, count):
+    names = [f"Product {i}" for i in range(0, count, max(1, count // 10))]
+    shopping_list = [(store.get_product(name), 1) for name in names]
+    return {
+        "get_total_quantity": timed(store.get_total_quantity, 10),
+        "get_all_products": timed(store.get_all_products),
+        "get_product": timed(lambda: [store.get_product(name) for name in names], 10) / len(names),
+        "order (10 lines)": timed(lambda: store.order(shopping_list, quiet=True), 10),
+    }
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    with tempfile.TemporaryDirectory() as directory:
+        for count in sizes:
+            product_list = build_products(count)
+
+            started = time.perf_counter()
+            memory_store = Store(product_list)
+            memory_build = time.perf_counter() - started
+
+            started = time.perf_counter()
+            sqlite_store = SQLiteStore(os.path.join(directory, f"store_{count}.db"), product_list)
+            sqlite_build = time.perf_counter() - started
+
+            print(f"\n{count:,} products")
+            print(f"{'operation':22} {'Store':>12} {'SQLiteStore':>12}")
+            print(f"{'build':22} {memory_build * 1000:10.2f}ms {sqlite_build * 1000:10.2f}ms")
+            memory_times, sqlite_times = measure(memory_store, count), measure(sqlite_store, count)
+            for operation in memory_times:
+                print(f"{operation:22} {memory_times[operation] * 1000:10.3f}ms "
+                      f"{sqlite_times[operation] * 1000:10.3f}ms")
+            sqlite_store.close()
+
+
+if __name__ == "__main__":
+    main()
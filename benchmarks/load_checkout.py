@@ -0,0 +1,101 @@
+"""Load generator for the asyncio checkout service.
+
+Starts a CheckoutService on a local port, connects many concurrent clients
+that each send a series of orders, and reports orders/sec and latency
+percentiles.
+
+Usage: python benchmarks/load_checkout.py [--clients N] [--orders N] [--in-process]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import products
+from service import CheckoutService
+from stores import Store
+
+
+def build_store(product_count):
+    """Build a store with enough stock that orders never run out."""
+    product_list = [products.Product(f"Product {i}", price=10 + i % 90, quantity=10**9)
+                    for i in range(product_count)]
+    for i, product in enumerate(product_list):
+        if i % 3 == 0:
+            product.set_promotion(products.SecondHalfPrice("Second Half price!"))
+    return Store(product_list)
+
+
+def order_items(client, order, product_count):
+    return [[f"Product {(client * 7 + order + line) % product_count}", 1 + line] for line in range(3)]
+
+
+async def run_tcp_client(port, client, orders, product_count, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for order in range(orders):
+        request = json.dumps({"items": order_items(client, order, product_count)}).encode() + b"\n"
+        started = time.perf_counter()
+        writer.write(request)
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - started)
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run_queue_client(service, client, orders, product_count, latencies):
+    for order in range(orders):
+        started = time.perf_counter()
+        await service.submit(order_items(client, order, product_count))
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_load(clients, orders, product_count, in_process):
+    service = CheckoutService(build_store(product_count))
+    latencies = []
+
+    started = time.perf_counter()
+    if in_process:
+        await service.start()
+        await asyncio.gather(*(run_queue_client(service, client, orders, product_count, latencies)
+                               for client in range(clients)))
+    else:
+        server = await service.serve()
+        port = server.sockets[0].getsockname()[1]
+        await asyncio.gather(*(run_tcp_client(port, client, orders, product_count, latencies)
+                               for client in range(clients)))
+        server.close()
+        await server.wait_closed()
+    elapsed = time.perf_counter() - started
+    await service.stop()
+
+    latencies.sort()
+    return {
+        "orders": len(latencies),
+        "orders_per_sec": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=20, help="orders sent by each client")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--in-process", action="store_true", help="use the in-process queue instead of TCP")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load(args.clients, args.orders, args.products, args.in_process))
+    print(f"{result['orders']} orders, {result['orders_per_sec']:.0f} orders/sec, "
+          f"p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
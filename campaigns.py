@@ -0,0 +1,83 @@
+"""What-if pricing of a whole catalog under candidate promotion campaigns.
+
+The catalog is cut into chunks of plain (price, promotion) tuples, which are
+priced in worker processes. Nothing in the store is changed.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+
+class _QuotedProduct:
+    """The part of a product that apply_promotion looks at."""
+    __slots__ = ("price",)
+
+    def __init__(self, price):
+        self.price = price
+
+
+class CampaignQuote:
+    """Revenue of selling the same quantity of every product under one campaign."""
+
+    def __init__(self, name, revenue, baseline_revenue):
+        self.name = name
+        self.revenue = revenue
+        self.baseline_revenue = baseline_revenue
+
+    @property
+    def revenue_change(self):
+        """Revenue difference compared to the products' current promotions."""
+        return self.revenue - self.baseline_revenue
+
+    def __repr__(self):
+        return f"CampaignQuote({self.name!r}, revenue={self.revenue:.2f}, change={self.revenue_change:.2f})"
+
+
+def _quote(price, promotion, quantity):
+    if promotion is None:
+        return quantity * price
+    return promotion.apply_promotion(_QuotedProduct(price), quantity)
+
+
+def _price_chunk(chunk, candidates, quantity):
+    """Return the baseline revenue and the revenue under every candidate for one chunk."""
+    baseline = 0
+    revenues = [0] * len(candidates)
+    for price, promotion in chunk:
+        baseline += _quote(price, promotion, quantity)
+        for index, candidate in enumerate(candidates):
+            revenues[index] += _quote(price, candidate, quantity)
+    return baseline, revenues
+
+
+def _chunks(products, chunk_size):
+    chunk = []
+    for product in products:
+        chunk.append((product.price, product.promotion))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def simulate_campaigns(store, candidates, quantity=1, workers=None, chunk_size=50_000):
+    """Quote every active product at quantity units under each candidate promotion.
+
+    candidates maps a campaign name to a Promotion, or to None for "no
+    promotion". Returns a CampaignQuote per campaign, in the same order.
+    workers is passed to ProcessPoolExecutor; with workers=1 the chunks are
+    priced in this process.
+    """
+    names = list(candidates)
+    promotions = [candidates[name] for name in names]
+    chunks = _chunks(store.get_all_products(), chunk_size)
+
+    if workers == 1:
+        results = [_price_chunk(chunk, promotions, quantity) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_price_chunk, chunk, promotions, quantity) for chunk in chunks]
+            results = [future.result() for future in futures]
+
+    baseline = sum(result[0] for result in results)
+    return [CampaignQuote(name, sum(result[1][index] for result in results), baseline)
+            for index, name in enumerate(names)]
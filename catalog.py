@@ -0,0 +1,332 @@
+"""Columnar product catalog: product state lives in contiguous arrays."""
+import heapq
+import sys
+from array import array
+from bisect import insort
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; reductions fall back to the array module
+    np = None
+
+from money import Money
+from products import Product, NonStockedProduct, LimitedProduct
+from stores import Store
+
+# Values of the Catalog.kinds column
+KIND_PRODUCT = 0
+KIND_NON_STOCKED = 1
+KIND_LIMITED = 2
+
+
+class Catalog:
+    """Stores prices, quantities and active flags of many products in arrays.
+
+    Each product is a row and prices are kept in cents. Names are interned and
+    kept in a side table next to promotions; removed rows keep their slot with
+    an empty name so that row numbers (and the views pointing at them) stay
+    valid.
+    """
+
+    def __init__(self):
+        self.prices = array("q")
+        self.quantities = array("q")
+        self.active = array("b")
+        self.kinds = array("b")
+        self.maximums = array("q")
+        self.names = []
+        self.promotions = []
+        self._rows_by_name = {}  # Built lazily by _name_index when set to None
+        self.names_version = 0  # Bumped when rows are added, removed or renamed
+
+    @classmethod
+    def from_columns(cls, prices, quantities, active, kinds, maximums, names, promotions):
+        """Build a catalog from ready-made columns, e.g. read from a snapshot."""
+        catalog = cls()
+        catalog.prices = prices
+        catalog.quantities = quantities
+        catalog.active = active
+        catalog.kinds = kinds
+        catalog.maximums = maximums
+        catalog.names = names
+        catalog.promotions = promotions
+        # Indexing a large catalog by name is left to the first lookup
+        catalog._rows_by_name = None
+        return catalog
+
+    def _name_index(self):
+        """Return the name -> rows index, building it if needed."""
+        if self._rows_by_name is None:
+            rows_by_name = {}
+            for row, name in enumerate(self.names):
+                if name is not None:
+                    rows_by_name.setdefault(name, []).append(row)
+            self._rows_by_name = rows_by_name
+        return self._rows_by_name
+
+    def __len__(self):
+        """Return the number of rows, including removed ones."""
+        return len(self.names)
+
+    def append(self, product):
+        """Copy a product into a new row and return the row number."""
+        if isinstance(product, LimitedProduct):
+            kind, maximum = KIND_LIMITED, product.maximum
+        elif isinstance(product, NonStockedProduct):
+            kind, maximum = KIND_NON_STOCKED, 0
+        else:
+            kind, maximum = KIND_PRODUCT, 0
+
+        row = len(self.names)
+        name = sys.intern(product.name)
+        self.prices.append(Money(product.price).cents)
+        self.quantities.append(product.quantity)
+        self.active.append(1 if product.active else 0)
+        self.kinds.append(kind)
+        self.maximums.append(maximum)
+        self.names.append(name)
+        self.promotions.append(product.promotion)
+        if self._rows_by_name is not None:
+            self._rows_by_name.setdefault(name, []).append(row)
+        self.names_version += 1
+        return row
+
+    def remove(self, row):
+        """Clear a row so it no longer counts as a product."""
+        name = self.names[row]
+        if name is None:
+            return
+
+        rows_by_name = self._name_index()
+        rows = rows_by_name[name]
+        rows.remove(row)
+        if not rows:
+            del rows_by_name[name]
+
+        self.names[row] = None
+        self.promotions[row] = None
+        self.quantities[row] = 0
+        self.active[row] = 0
+        self.names_version += 1
+
+    def rename(self, row, name):
+        """Give a live row a new name, keeping the name index in row order."""
+        old_name = self.names[row]
+        if old_name is None:
+            raise ValueError("Cannot rename a removed product!")
+
+        rows_by_name = self._name_index()
+        rows = rows_by_name[old_name]
+        rows.remove(row)
+        if not rows:
+            del rows_by_name[old_name]
+        name = sys.intern(name)
+        insort(rows_by_name.setdefault(name, []), row)
+        self.names[row] = name
+        self.names_version += 1
+
+    def is_live(self, row):
+        """Check whether a row holds a product that has not been removed."""
+        return 0 <= row < len(self.names) and self.names[row] is not None
+
+    def find(self, name):
+        """Return the first live row with the given name, or None."""
+        rows = self._name_index().get(name)
+        return rows[0] if rows else None
+
+    def live_rows(self):
+        """Return the row numbers of all products that have not been removed."""
+        return [row for row, name in enumerate(self.names) if name is not None]
+
+    def active_rows(self):
+        """Return the row numbers of all active products."""
+        if np is not None and self.active:
+            return np.flatnonzero(np.frombuffer(self.active, dtype=np.int8)).tolist()
+        return [row for row, flag in enumerate(self.active) if flag]
+
+    def total_quantity(self):
+        """Return the sum of the quantity column."""
+        if np is not None and self.quantities:
+            return int(np.frombuffer(self.quantities, dtype=np.int64).sum())
+        return sum(self.quantities)
+
+    def view(self, row):
+        """Return a Product view over a row."""
+        kind = self.kinds[row]
+        if kind == KIND_LIMITED:
+            return LimitedProductView(self, row)
+        if kind == KIND_NON_STOCKED:
+            return NonStockedProductView(self, row)
+        return ProductView(self, row)
+
+
+class ProductView(Product):
+    """A Product whose state is read from and written to a Catalog row.
+
+    Views are cheap to create and carry no state of their own, so two views of
+    the same row compare equal.
+    """
+
+    def __init__(self, catalog, row):
+        self._catalog = catalog
+        self._row = row
+        self._observers = ()
+
+    @property
+    def name(self):
+        return self._catalog.names[self._row]
+
+    @name.setter
+    def name(self, name):
+        if not name:
+            raise ValueError("Product name cannot be empty!")
+        self._catalog.rename(self._row, name)
+
+    @property
+    def price(self):
+        return Money.from_cents(self._catalog.prices[self._row])
+
+    @price.setter
+    def price(self, price):
+        self._catalog.prices[self._row] = Money(price).cents
+
+    @property
+    def quantity(self):
+        return self._catalog.quantities[self._row]
+
+    @quantity.setter
+    def quantity(self, quantity):
+        self._catalog.quantities[self._row] = quantity
+
+    @property
+    def active(self):
+        return bool(self._catalog.active[self._row])
+
+    @active.setter
+    def active(self, active):
+        self._catalog.active[self._row] = 1 if active else 0
+
+    @property
+    def promotion(self):
+        return self._catalog.promotions[self._row]
+
+    @promotion.setter
+    def promotion(self, promotion):
+        self._catalog.promotions[self._row] = promotion
+
+    def __eq__(self, other):
+        if isinstance(other, ProductView):
+            return self._catalog is other._catalog and self._row == other._row
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((id(self._catalog), self._row))
+
+
+class NonStockedProductView(ProductView, NonStockedProduct):
+    """View over a catalog row holding a NonStockedProduct."""
+
+
+class LimitedProductView(ProductView, LimitedProduct):
+    """View over a catalog row holding a LimitedProduct."""
+
+    @property
+    def maximum(self):
+        return self._catalog.maximums[self._row]
+
+
+class CatalogStore(Store):
+    """A Store whose products are rows of a columnar Catalog.
+
+    Products added to the store are copied into the catalog; the store hands
+    out ProductView objects, which keep the regular Store and Product API
+    working on top of the arrays.
+    """
+
+    def __init__(self, products=None, catalog=None):
+        super().__init__()
+        self.catalog = catalog if catalog is not None else Catalog()
+        for product in products if products is not None else []:
+            self.add_product(product)
+
+    def _owns(self, product):
+        return isinstance(product, ProductView) and product._catalog is self.catalog
+
+    def _product_tuple(self):
+        """Views of all products in catalog order, backing the products view."""
+        return tuple(self.catalog.view(row) for row in self.catalog.live_rows())
+
+    def add_product(self, product):
+        """Copy a product into the catalog and return its view."""
+        if self._owns(product):
+            return product
+        with self._lock:
+            return self.catalog.view(self.catalog.append(product))
+
+    def remove_product(self, product):
+        """Remove the product's row from the catalog if it belongs to this store."""
+        if self._owns(product):
+            with self._lock:
+                self.catalog.remove(product._row)
+                self._product_locks.pop(product._row, None)
+
+    @property
+    def names_version(self):
+        """Follows the catalog, whose rows views can rename."""
+        return self.catalog.names_version
+
+    def get_product(self, name):
+        """Return a view of the first product with the given name, or None."""
+        row = self.catalog.find(name)
+        return None if row is None else self.catalog.view(row)
+
+    def product_names(self):
+        """Return a live set-like view of the names of all products in the catalog."""
+        return self.catalog._name_index().keys()
+
+    def get_products_named(self, name):
+        """Return views of all products with the given name."""
+        return [self.catalog.view(row) for row in self.catalog._name_index().get(name, [])]
+
+    def has_product(self, product):
+        """Check whether the product is a live row of this store's catalog."""
+        return self._owns(product) and self.catalog.is_live(product._row)
+
+    def lock_key(self, product):
+        """Views are created on demand, so lock by row instead of by object."""
+        if self._owns(product):
+            return product._row
+        return super().lock_key(product)
+
+    def total_quantity(self):
+        """Return the total of the quantity column."""
+        return self.catalog.total_quantity()
+
+    def get_all_products(self):
+        """Return views of all active products."""
+        return [self.catalog.view(row) for row in self.catalog.active_rows()]
+
+    def iter_products(self, cursor=None, active_only=True):
+        """Yield (row, view) pairs in catalog order, starting after the row given as cursor."""
+        catalog = self.catalog
+        for row in range(0 if cursor is None else cursor + 1, len(catalog)):
+            if catalog.is_live(row) and (catalog.active[row] or not active_only):
+                yield row, catalog.view(row)
+
+    def _rows_by_price(self, k, active_only, largest):
+        rows = self.catalog.active_rows() if active_only else self.catalog.live_rows()
+        select = heapq.nlargest if largest else heapq.nsmallest
+        return [self.catalog.view(row) for row in select(k, rows, key=self.catalog.prices.__getitem__)]
+
+    def cheapest(self, k, active_only=True):
+        """Return the k cheapest products; the catalog selects them with a heap."""
+        return self._rows_by_price(k, active_only, largest=False)
+
+    def most_expensive(self, k, active_only=True):
+        """Return the k most expensive products; the catalog selects them with a heap."""
+        return self._rows_by_price(k, active_only, largest=True)
+
+    def _query_candidates(self, min_price, max_price, promotion_type, kind, name_prefix, active_only):
+        """The catalog has no secondary indexes, so queries scan its rows."""
+        rows = self.catalog.active_rows() if active_only else self.catalog.live_rows()
+        return (self.catalog.view(row) for row in rows)
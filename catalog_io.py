@@ -0,0 +1,300 @@
+"""Streaming catalog import and export in CSV and JSON Lines.
+
+Feeds are processed row by row through generators, so memory use does not
+grow with the size of the file. Every row has the columns
+
+    name, kind, price, quantity, maximum, active, promotion, promotion_name, percent, base_promotion
+
+where kind is "product", "non_stocked" or "limited", active is true or false
+(true when empty) and promotion is empty, "second_half_price",
+"third_one_free", "percent_discount" or "pricing_plan". A pricing plan, as
+compiled by the promotion engine, is its combined percent off, exact (e.g.
+"27.1" or "1/3"), on top of an optional base_promotion such as
+"third_one_free"; the base promotion is named after its key.
+"""
+import csv
+import json
+from decimal import Decimal
+from fractions import Fraction
+from itertools import islice
+
+from money import Money
+from products import (Product, NonStockedProduct, LimitedProduct,
+                      SecondHalfPrice, ThirdOneFree, PercentDiscount)
+from promotion_engine import PricingPlan
+
+FIELDS = ["name", "kind", "price", "quantity", "maximum", "active", "promotion", "promotion_name", "percent",
+          "base_promotion"]
+
+PROMOTION_TYPES = {
+    "second_half_price": SecondHalfPrice,
+    "third_one_free": ThirdOneFree,
+    "percent_discount": PercentDiscount,
+    "pricing_plan": PricingPlan,
+}
+_PROMOTION_KEYS = {promotion_type: key for key, promotion_type in PROMOTION_TYPES.items()}
+
+
+class RowError(ValueError):
+    """A feed row that could not be read; readers yield it in place of the row.
+
+    parse_product raises it, so the row is reported like any other invalid row
+    and the rest of the feed is still imported.
+    """
+
+
+class ImportBatch:
+    """Products parsed from one batch of rows, plus the errors of the rows that failed."""
+
+    def __init__(self, products, errors):
+        self.products = products
+        self.errors = errors  # list of (row number, message)
+
+
+class ImportReport:
+    """Summary of a whole import; keeps at most max_errors error messages."""
+
+    def __init__(self, max_errors):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add(self, batch):
+        self.imported += len(batch.products)
+        self.failed += len(batch.errors)
+        room = self.max_errors - len(self.errors)
+        if room > 0:
+            self.errors.extend(batch.errors[:room])
+
+
+def read_csv(path):
+    """Yield the rows of a CSV feed as dicts."""
+    with open(path, newline="", encoding="utf-8") as feed:
+        yield from csv.DictReader(feed)
+
+
+def read_jsonl(path):
+    """Yield the rows of a JSON Lines feed as dicts; blank lines are skipped.
+
+    A line that is not a JSON object is yielded as a RowError naming its line number.
+    """
+    with open(path, encoding="utf-8") as feed:
+        for line_number, line in enumerate(feed, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield RowError(f"Invalid JSON on line {line_number}: {e}!")
+                continue
+            if not isinstance(row, dict):
+                yield RowError(f"Line {line_number} is not a JSON object!")
+                continue
+            yield row
+
+
+def _number(value, convert):
+    if value is None or value == "":
+        raise ValueError("Missing value!")
+    return convert(value)
+
+
+def _price(value):
+    """Read a price as exact Money; "19.99" is 1999 cents."""
+    try:
+        return Money(value)
+    except ArithmeticError:
+        raise ValueError(f"Invalid price {value!r}!")
+
+
+def _integer(value):
+    """Read a whole number; 1.7 or True are rejected instead of being truncated."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"Invalid whole number {value!r}!")
+    return int(value)
+
+
+def _name(value):
+    """Read a product name; anything but a string is rejected before it reaches a store's indexes."""
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"Invalid product name {value!r}!")
+    return value
+
+
+def _active(value):
+    """Read the active flag; rows without one are active."""
+    if value is None or value == "":
+        return True
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise ValueError(f"Invalid active flag {value!r}!")
+
+
+def parse_product(row, promotions=None):
+    """Build a product from a feed row; raise if the row is invalid.
+
+    promotions is an optional dict used to share one promotion object between
+    all rows with the same promotion, instead of creating one per product.
+    """
+    if isinstance(row, RowError):
+        raise row
+    name = _name(row.get("name"))
+    kind = row.get("kind") or "product"
+    price = _number(row.get("price"), _price)
+    active = _active(row.get("active"))
+
+    if kind == "product":
+        product = Product(name, price, _number(row.get("quantity"), _integer))
+    elif kind == "non_stocked":
+        product = NonStockedProduct(name, price)
+    elif kind == "limited":
+        product = LimitedProduct(name, price, _number(row.get("quantity"), _integer),
+                                 _number(row.get("maximum"), _integer))
+    else:
+        raise ValueError(f"Unknown product kind {kind}!")
+    product.active = active
+
+    promotion_key = row.get("promotion")
+    if promotion_key:
+        promotion_type = PROMOTION_TYPES.get(promotion_key)
+        if promotion_type is None:
+            raise ValueError(f"Unknown promotion {promotion_key}!")
+        promotion_name = row.get("promotion_name") or promotion_key
+        if promotion_type is PercentDiscount:
+            settings = _number(row.get("percent"), float)
+        elif promotion_type is PricingPlan:
+            settings = (_number(row.get("percent"), Fraction), row.get("base_promotion") or None)
+        else:
+            settings = None
+
+        cache_key = (promotion_key, promotion_name, settings)
+        promotion = promotions.get(cache_key) if promotions is not None else None
+        if promotion is None:
+            promotion = _build_promotion(promotion_type, promotion_name, settings)
+            if promotions is not None:
+                promotions[cache_key] = promotion
+        product.set_promotion(promotion)
+
+    return product
+
+
+def _build_promotion(promotion_type, name, settings):
+    if promotion_type is PercentDiscount:
+        return PercentDiscount(name, percent=settings)
+    if promotion_type is PricingPlan:
+        percent, base_key = settings
+        base_type = PROMOTION_TYPES.get(base_key) if base_key else None
+        if base_key and base_type not in (SecondHalfPrice, ThirdOneFree):
+            raise ValueError(f"Unknown base promotion {base_key}!")
+        return PricingPlan(name, base_type(base_key) if base_type else None, 1 - percent / 100)
+    return promotion_type(name)
+
+
+def _percent_text(discount_factor):
+    """Return the percent off of a discount factor exactly, as a decimal if it has one."""
+    percent = (1 - Fraction(discount_factor)) * 100
+    decimal = Decimal(percent.numerator) / percent.denominator
+    return str(decimal) if Fraction(decimal) == percent else str(percent)
+
+
+def import_products(rows, batch_size=1000):
+    """Parse rows in batches and yield an ImportBatch for each.
+
+    Invalid rows are reported in the batch's errors instead of stopping the
+    import. Row numbers count data rows from 1.
+    """
+    promotions = {}
+    rows = iter(rows)
+    row_number = 0
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            return
+
+        products, errors = [], []
+        for row in chunk:
+            row_number += 1
+            try:
+                products.append(parse_product(row, promotions))
+            except Exception as e:
+                errors.append((row_number, str(e)))
+        yield ImportBatch(products, errors)
+
+
+def load_into_store(store, rows, batch_size=1000, max_errors=1000):
+    """Import rows into a store batch by batch and return an ImportReport."""
+    report = ImportReport(max_errors)
+    add_products = getattr(store, "add_products", None)
+    for batch in import_products(rows, batch_size):
+        if add_products is not None:
+            add_products(batch.products)
+        else:
+            for product in batch.products:
+                store.add_product(product)
+        report.add(batch)
+    return report
+
+
+def product_to_row(product):
+    """Return the feed row describing a product."""
+    if isinstance(product, LimitedProduct):
+        kind, maximum = "limited", product.maximum
+    elif isinstance(product, NonStockedProduct):
+        kind, maximum = "non_stocked", ""
+    else:
+        kind, maximum = "product", ""
+
+    promotion = product.promotion
+    promotion_key = _PROMOTION_KEYS.get(type(promotion), "") if promotion else ""
+    if promotion and not promotion_key:
+        raise ValueError(f"Cannot export promotion of type {type(promotion).__name__}!")
+    percent, base_key = "", ""
+    if isinstance(promotion, PercentDiscount):
+        percent = promotion.percent
+    elif isinstance(promotion, PricingPlan):
+        percent = _percent_text(promotion.discount_factor)
+        base = promotion.base_promotion
+        if base is not None:
+            base_key = _PROMOTION_KEYS.get(type(base))
+            if type(base) not in (SecondHalfPrice, ThirdOneFree):
+                raise ValueError(f"Cannot export base promotion of type {type(base).__name__}!")
+
+    return {
+        "name": product.name,
+        "kind": kind,
+        "price": str(product.price),
+        "quantity": product.quantity,
+        "maximum": maximum,
+        "active": product.active,
+        "promotion": promotion_key,
+        "promotion_name": promotion.name if promotion else "",
+        "percent": percent,
+        "base_promotion": base_key,
+    }
+
+
+def write_csv(products, path):
+    """Write products to a CSV feed and return how many were written."""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as feed:
+        writer = csv.DictWriter(feed, fieldnames=FIELDS)
+        writer.writeheader()
+        for product in products:
+            writer.writerow(product_to_row(product))
+            count += 1
+    return count
+
+
+def write_jsonl(products, path):
+    """Write products to a JSON Lines feed and return how many were written."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as feed:
+        for product in products:
+            feed.write(json.dumps(product_to_row(product)) + "\n")
+            count += 1
+    return count
@@ -0,0 +1,211 @@
+"""Event-sourced inventory: every change is an appended event, the Store is a projection.
+
+Products are added, removed, bought, restocked and given promotions only
+through EventSourcedInventory. Each change is validated, appended to the
+event log as one JSON line and only then applied to the projection:
+
+    {"seq": 1, "type": "add", "product": {...}}
+    {"seq": 2, "type": "buy", "items": [["MacBook Air M2", 2]]}
+    {"seq": 3, "type": "restock", "name": "MacBook Air M2", "quantity": 50}
+    {"seq": 4, "type": "promotion", "name": "MacBook Air M2", "promotion": {...} or null}
+    {"seq": 5, "type": "remove", "name": "MacBook Air M2"}
+
+Every compact_every events the projection is written to a snapshot and the
+log is moved aside to an archive segment, so recovery loads one snapshot and
+replays at most compact_every events. Archived segments keep the full history
+for audits.
+"""
+import glob
+import os
+import threading
+
+from catalog import CatalogStore
+from money import Money
+from pricing import price_lines, sum_prices
+from persistence import (AppendOnlyLog, read_log, save_snapshot, load_snapshot,
+                         promotion_spec, promotion_from_spec)
+from products import Product, NonStockedProduct, LimitedProduct
+
+
+def product_spec(product):
+    """Return a JSON-friendly description of a product, as recorded by an add event."""
+    spec = {"name": product.name, "kind": "product", "price_cents": Money(product.price).cents,
+            "quantity": product.quantity, "active": product.active,
+            "promotion": promotion_spec(product.promotion) if product.promotion else None}
+    if isinstance(product, LimitedProduct):
+        spec.update(kind="limited", maximum=product.maximum)
+    elif isinstance(product, NonStockedProduct):
+        spec["kind"] = "non_stocked"
+    return spec
+
+
+def product_from_spec(spec):
+    """Build a product from the description made by product_spec."""
+    price = Money.from_cents(spec["price_cents"])
+    if spec["kind"] == "limited":
+        product = LimitedProduct(spec["name"], price, spec["quantity"], spec["maximum"])
+    elif spec["kind"] == "non_stocked":
+        product = NonStockedProduct(spec["name"], price)
+    else:
+        product = Product(spec["name"], price, spec["quantity"])
+    product.active = spec["active"]
+    if spec["promotion"] is not None:
+        product.set_promotion(promotion_from_spec(spec["promotion"]))
+    return product
+
+
+class EventSourcedInventory:
+    """A Store whose state is rebuilt from a snapshot plus the events appended since.
+
+    Opening an inventory recovers it from snapshot_path and log_path; both
+    are created on the first compaction and the first event. Product names
+    identify products in events, so they must be unique.
+    """
+
+    def __init__(self, log_path, snapshot_path, compact_every=10_000, sync=False):
+        self.log_path = str(log_path)
+        self.snapshot_path = str(snapshot_path)
+        self.compact_every = compact_every
+        self.sync = sync
+        # Automatic compaction runs after an event is already written, so its
+        # failure is kept here instead of failing the command that caused it
+        self.last_compaction_error = None
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.snapshot_path):
+            self.store, self.snapshot_seq = load_snapshot(self.snapshot_path)
+        else:
+            self.store, self.snapshot_seq = CatalogStore(), 0
+        self.log = AppendOnlyLog(self.log_path, sync=sync)
+        # A log moved aside by compaction starts over; keep numbering after the snapshot
+        self.log.last_seq = max(self.log.last_seq, self.snapshot_seq)
+        for event in self.log.read(after_seq=self.snapshot_seq):
+            self._apply(event)
+
+    @property
+    def last_seq(self):
+        return self.log.last_seq
+
+    def get_product(self, name):
+        return self.store.get_product(name)
+
+    def add_product(self, product):
+        """Add a product and return its projection; raise if the name is taken."""
+        with self._lock:
+            if self.store.get_product(product.name) is not None:
+                raise Exception(f"Product {product.name} already exists!")
+            spec = product_spec(product)
+            product_from_spec(spec)  # Fails here, before anything is written, if the spec is unusable
+            return self._record({"type": "add", "product": spec})
+
+    def remove_product(self, name):
+        with self._lock:
+            self._product(name)
+            self._record({"type": "remove", "name": name})
+
+    def order(self, items):
+        """Order (product name, quantity) pairs and return the total price."""
+        with self._lock:
+            shopping_list = [(self._product(name), quantity) for name, quantity in items]
+            # Every command holds the inventory lock, so the check stays valid until applied
+            self.store.check_stock(shopping_list)
+            line_prices = price_lines(shopping_list)
+            self._record({"type": "buy", "items": [[name, quantity] for name, quantity in items]})
+            return sum_prices(line_prices)
+
+    def restock(self, name, quantity):
+        """Add quantity to a product's stock, reactivating it if it had sold out."""
+        if quantity <= 0:
+            raise Exception("Quantity to restock must be at least 1!")
+        with self._lock:
+            if isinstance(self._product(name), NonStockedProduct):
+                raise Exception(f"Product {name} has no stock to restock!")
+            self._record({"type": "restock", "name": name, "quantity": quantity})
+
+    def set_promotion(self, name, promotion):
+        """Set a product's promotion, or remove it when promotion is None."""
+        with self._lock:
+            self._product(name)
+            spec = promotion_spec(promotion) if promotion else None
+            self._record({"type": "promotion", "name": name, "promotion": spec})
+
+    def events(self, after_seq=0):
+        """Yield every event after after_seq, including those in archived segments."""
+        for segment in sorted(glob.glob(glob.escape(self.log_path) + "." + "[0-9]" * 12)):
+            yield from read_log(segment, after_seq)
+        yield from self.log.read(after_seq)
+
+    def compact(self):
+        """Snapshot the projection and move the current log aside to an archive segment."""
+        with self._lock:
+            self._compact()
+
+    def close(self):
+        self.log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _product(self, name):
+        product = self.store.get_product(name)
+        if product is None:
+            raise Exception(f"Product {name} is not in the inventory!")
+        return product
+
+    def _record(self, event):
+        """Append a validated event to the log, then apply it to the projection.
+
+        If the write fails, the projection is left untouched. Every
+        compact_every events the projection is compacted afterwards.
+        """
+        seq = self.log.write(event)
+        result = self._apply(event)
+        if seq - self.snapshot_seq >= self.compact_every:
+            try:
+                self._compact()
+            except Exception as e:
+                # The event is written and applied; compaction is retried on a later event
+                self.last_compaction_error = e
+        return result
+
+    def _apply(self, event):
+        """Apply one event to the projection, without any checks, and return the added product if any."""
+        kind = event["type"]
+        if kind == "add":
+            return self.store.add_product(product_from_spec(event["product"]))
+        if kind == "buy":
+            shopping_list = [(self._product(name), quantity) for name, quantity in event["items"]]
+            self.store.apply_order(shopping_list)
+        elif kind == "restock":
+            product = self._product(event["name"])
+            product.quantity += event["quantity"]
+            product.activate()
+        elif kind == "promotion":
+            spec = event["promotion"]
+            self._product(event["name"]).set_promotion(promotion_from_spec(spec) if spec else None)
+        elif kind == "remove":
+            self.store.remove_product(self._product(event["name"]))
+        else:
+            raise ValueError(f"Unknown event type {kind}!")
+        return None
+
+    def _compact(self):
+        # The snapshot is in place before the log moves, so a crash in between
+        # only leaves events that replay skips
+        seq = self.log.last_seq
+        if seq == self.snapshot_seq and os.path.exists(self.snapshot_path):
+            return  # Nothing happened since the last snapshot
+        save_snapshot(self.store, self.snapshot_path, order_seq=seq)
+        self.snapshot_seq = seq
+        self.log.close()
+        try:
+            os.replace(self.log_path, f"{self.log_path}.{seq:012d}")
+        finally:
+            # Reopened even if the move failed; replay skips what the snapshot covers
+            self.log = AppendOnlyLog(self.log_path, sync=self.sync)
+            self.log.last_seq = max(self.log.last_seq, seq)
+        self.last_compaction_error = None
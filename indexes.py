@@ -0,0 +1,233 @@
+"""Secondary indexes that Store maintains next to its product list."""
+from bisect import bisect_left, bisect_right
+from itertools import chain
+
+# Entries per chunk of a PriceIndex; chunks are split at twice this size
+_CHUNK_SIZE = 512
+
+
+class PriceIndex:
+    """Products sorted by price in cents.
+
+    Entries are sorted by (cents, sequence) so that products with the same
+    price keep the order they were added in. They are kept in chunks of a few
+    hundred, so an insert or removal only shifts one chunk instead of the
+    whole index. Chunks are replaced rather than changed in place, which
+    makes snapshot() cheap: it copies the chunk list, not the entries.
+    """
+
+    def __init__(self, entries=()):
+        """Build the index from (cents, sequence, product) entries, sorting them once."""
+        entries = sorted(entries, key=lambda entry: (entry[0], entry[1]))
+        self._key_chunks = []
+        self._product_chunks = []
+        for start in range(0, len(entries), _CHUNK_SIZE):
+            chunk = entries[start:start + _CHUNK_SIZE]
+            self._key_chunks.append([(cents, sequence) for cents, sequence, _ in chunk])
+            self._product_chunks.append([product for _, _, product in chunk])
+        self._maxes = [keys[-1] for keys in self._key_chunks]
+        self._length = len(entries)
+
+    def __len__(self):
+        return self._length
+
+    def add(self, cents, sequence, product):
+        key = (cents, sequence)
+        if not self._key_chunks:
+            self._key_chunks.append([key])
+            self._product_chunks.append([product])
+            self._maxes.append(key)
+            self._length = 1
+            return
+
+        index = min(bisect_left(self._maxes, key), len(self._maxes) - 1)
+        keys = list(self._key_chunks[index])
+        products = list(self._product_chunks[index])
+        position = bisect_left(keys, key)
+        keys.insert(position, key)
+        products.insert(position, product)
+        self._length += 1
+
+        if len(keys) > 2 * _CHUNK_SIZE:
+            self._key_chunks[index:index + 1] = [keys[:_CHUNK_SIZE], keys[_CHUNK_SIZE:]]
+            self._product_chunks[index:index + 1] = [products[:_CHUNK_SIZE], products[_CHUNK_SIZE:]]
+            self._maxes[index:index + 1] = [keys[_CHUNK_SIZE - 1], keys[-1]]
+        else:
+            self._key_chunks[index] = keys
+            self._product_chunks[index] = products
+            self._maxes[index] = keys[-1]
+
+    def remove(self, cents, sequence):
+        key = (cents, sequence)
+        index = bisect_left(self._maxes, key)
+        if index == len(self._maxes):
+            return
+        keys = self._key_chunks[index]
+        position = bisect_left(keys, key)
+        if position == len(keys) or keys[position] != key:
+            return
+
+        self._length -= 1
+        if len(keys) == 1:
+            del self._key_chunks[index], self._product_chunks[index], self._maxes[index]
+            return
+        keys = keys[:position] + keys[position + 1:]
+        products = self._product_chunks[index]
+        self._key_chunks[index] = keys
+        self._product_chunks[index] = products[:position] + products[position + 1:]
+        self._maxes[index] = keys[-1]
+
+    def snapshot(self):
+        """Return a PriceIndexSnapshot that stays unchanged when the index changes."""
+        return PriceIndexSnapshot(list(self._key_chunks), list(self._product_chunks), list(self._maxes))
+
+    def products(self, min_cents=None, max_cents=None, reverse=False):
+        """Yield the products priced within the bounds, cheapest first unless reversed."""
+        return self.snapshot().products(min_cents, max_cents, reverse)
+
+
+class PriceIndexSnapshot:
+    """The entries of a PriceIndex at one point in time, safe to read without the store lock."""
+
+    def __init__(self, key_chunks, product_chunks, maxes):
+        self._key_chunks = key_chunks
+        self._product_chunks = product_chunks
+        self._maxes = maxes
+
+    def products(self, min_cents=None, max_cents=None, reverse=False):
+        """Yield the products priced within the bounds, cheapest first unless reversed."""
+        chunks = len(self._key_chunks)
+        if not chunks:
+            return iter(())
+        # Chunk and position of the first entry priced at least min_cents
+        if min_cents is None:
+            first_chunk, first = 0, 0
+        else:
+            first_chunk = bisect_left(self._maxes, (min_cents,))
+            first = 0 if first_chunk == chunks else bisect_left(self._key_chunks[first_chunk], (min_cents,))
+        # Chunk and position just past the last entry priced at most max_cents;
+        # (max_cents, inf) sorts after every entry priced max_cents
+        if max_cents is None:
+            last_chunk, end = chunks - 1, len(self._key_chunks[-1])
+        else:
+            bound = (max_cents, float("inf"))
+            last_chunk = min(bisect_right(self._maxes, bound), chunks - 1)
+            end = bisect_right(self._key_chunks[last_chunk], bound)
+        if (first_chunk, first) >= (last_chunk, end):
+            return iter(())
+
+        if first_chunk == last_chunk:
+            slices = [self._product_chunks[first_chunk][first:end]]
+        else:
+            slices = [self._product_chunks[first_chunk][first:]]
+            slices.extend(self._product_chunks[first_chunk + 1:last_chunk])
+            slices.append(self._product_chunks[last_chunk][:end])
+        if reverse:
+            return chain.from_iterable(reversed(products) for products in reversed(slices))
+        return chain.from_iterable(slices)
+
+
+class _TrieNode:
+    __slots__ = ("label", "children", "products")
+
+    def __init__(self, label=""):
+        self.label = label  # The characters on the edge leading to this node
+        self.children = {}  # By the first character of the child's label
+        self.products = {}
+
+
+class NameTrie:
+    """Compressed prefix tree over product names.
+
+    Each edge holds a run of characters instead of a single one, so the tree
+    has at most two nodes per distinct name, however long the names are.
+    """
+
+    def __init__(self):
+        self._root = _TrieNode()
+
+    def add(self, name, key, product):
+        node = self._root
+        rest = name
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                child = node.children[rest[0]] = _TrieNode(rest)
+                node = child
+                break
+            common = _common_prefix_length(child.label, rest)
+            if common < len(child.label):
+                # Split the edge where the names part ways
+                middle = node.children[rest[0]] = _TrieNode(child.label[:common])
+                child.label = child.label[common:]
+                middle.children[child.label[0]] = child
+                child = middle
+            node = child
+            rest = rest[common:]
+        node.products[key] = product
+
+    def remove(self, name, key):
+        path = [self._root]
+        rest = name
+        while rest:
+            child = path[-1].children.get(rest[0])
+            if child is None or not rest.startswith(child.label):
+                return
+            path.append(child)
+            rest = rest[len(child.label):]
+
+        node = path[-1]
+        node.products.pop(key, None)
+        if node is self._root or node.products:
+            return
+        parent = path[-2]
+        if not node.children:
+            del parent.children[node.label[0]]
+            # The parent may now be a plain pass-through node
+            if parent is not self._root:
+                self._merge(path[-3], parent)
+        else:
+            self._merge(parent, node)
+
+    @staticmethod
+    def _merge(parent, node):
+        """Fold a node without products and with a single child into that child."""
+        if node.products or len(node.children) != 1:
+            return
+        child, = node.children.values()
+        child.label = node.label + child.label
+        parent.children[child.label[0]] = child
+
+    def with_prefix(self, prefix):
+        """Yield the products whose name starts with prefix, in name order."""
+        node = self._root
+        rest = prefix
+        while rest:
+            node = node.children.get(rest[0])
+            if node is None:
+                return
+            if node.label.startswith(rest):
+                break  # The prefix ends on this edge
+            if not rest.startswith(node.label):
+                return
+            rest = rest[len(node.label):]
+
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            yield from node.products.values()
+            stack.extend(node.children[character] for character in sorted(node.children, reverse=True))
+
+
+def _common_prefix_length(first, second):
+    """Return the length of the common prefix, comparing slices instead of characters."""
+    if second.startswith(first):
+        return len(first)
+    low, high = 0, min(len(first), len(second))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[:middle] == second[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
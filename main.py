@@ -3,6 +3,8 @@ from products import NonStockedProduct, LimitedProduct
 from stores import Store
 from colorama import Fore, Style
 
+PAGE_SIZE = 10  # Products shown per page when listing the store
+
 
 def initialize_products():
     """Initialize and return the list of products"""
@@ -87,8 +89,8 @@ def get_product_number(products_list):
         return None, False  # Return None and a flag indicating to continue
 
 
-def get_valid_quantity(product, is_limited=False, maximum=0):
-    """Get a valid quantity from user input"""
+def get_valid_quantity(product, is_limited=False, maximum=0, reservations=None):
+    """Get a valid quantity from user input, within the stock not held by other carts"""
     while True:
         try:
             quantity = int(input(f"What amount of {product.name} do you want? "))
@@ -104,7 +106,7 @@ def get_valid_quantity(product, is_limited=False, maximum=0):
 
             # For regular products, check if enough quantity is available
             if not isinstance(product, NonStockedProduct):
-                available = product.get_quantity()
+                available = reservations.available(product) if reservations else product.get_quantity()
                 if quantity > available:
                     print_error(f"Error: Not enough stock. Only {available} available")
                     continue
@@ -115,8 +117,8 @@ def get_valid_quantity(product, is_limited=False, maximum=0):
             print_error("No valid number entered! Enter only integers.")
 
 
-def build_shopping_list(products_list):
-    """Build a shopping list from user input"""
+def build_shopping_list(products_list, cart=None):
+    """Build a shopping list from user input; each line is held in the cart if one is given"""
     shopping_list = []
 
     while True:
@@ -135,7 +137,15 @@ def build_shopping_list(products_list):
         # Get quantity for the selected product
         is_limited = isinstance(selected_product, LimitedProduct)
         maximum = selected_product.maximum if is_limited else 0
-        quantity = get_valid_quantity(selected_product, is_limited, maximum)
+        quantity = get_valid_quantity(selected_product, is_limited, maximum, cart.book if cart else None)
+
+        # Hold the stock so that it is still there when the order is placed
+        if cart is not None:
+            try:
+                cart.add(selected_product, quantity)
+            except Exception as e:
+                print_error(f"Error: {e}")
+                continue
 
         # Add to shopping list
         shopping_list.append((product_index, quantity))
@@ -152,11 +162,21 @@ def list_available_products(products_list):
             print(f"{i}. {product.show()}")
 
 
-def handle_list_products(products_list):
-    """Handle the list products menu option"""
+def handle_list_products(store, page_size=PAGE_SIZE):
+    """Handle the list products menu option, one page at a time"""
     print(" ")
-    for product in products_list:
-        print(product.show())
+    cursor = None
+    while True:
+        page = store.list_products(cursor, page_size=page_size)
+        for line in page.render():
+            print(line)
+
+        # Stop at the last page or when the user has seen enough
+        if page.next_cursor is None:
+            break
+        if input("\nPress Enter for more products, or q to return to the menu: ").strip().lower() == "q":
+            break
+        cursor = page.next_cursor
 
 
 def handle_show_total(store):
@@ -171,21 +191,22 @@ def process_order(store, products_list):
     active_products = store.get_all_products()
     list_available_products(active_products)
 
-    # Build the shopping list based on the active products
-    shopping_list = build_shopping_list(active_products)
+    # Fill the cart from the active products, holding each line's stock
+    cart = store.reservations().cart()
+    build_shopping_list(active_products, cart)
 
-    if not shopping_list:
+    if not cart.lines:
         print_error("No items in cart.")
         return
 
-    # Convert indices to products from the active products list
-    product_shopping_list = [(active_products[idx], qty) for idx, qty in shopping_list]
-
-    # Process the order using the store's order method
+    # Process the held lines using the store's order method
     try:
-        store.order(product_shopping_list)
+        cart.order()
     except Exception as e:
         print(Fore.RED + f"Error processing order: {str(e)}" + Style.RESET_ALL)
+    finally:
+        # Give back whatever a failed order left held
+        cart.release()
 
 
 def main():
@@ -195,17 +216,15 @@ def main():
     while True:
         user_choice = display_menu()
 
-        # Get the most current list of active products
-        products_list = best_buy.get_all_products()
-
         if user_choice == "1":
-            handle_list_products(products_list)
+            handle_list_products(best_buy)
 
         elif user_choice == "2":
             handle_show_total(best_buy)
 
         elif user_choice == "3":
-            process_order(best_buy, products_list)
+            # Get the most current list of active products
+            process_order(best_buy, best_buy.get_all_products())
 
         elif user_choice == "4":
             print("Goodbye")
@@ -0,0 +1,195 @@
+"""Opt-in instrumentation for ordering, buying and promotion pricing.
+
+Recording is off by default. Hot paths check the module-level `enabled`
+flag before doing any work, so a disabled recorder costs one global lookup
+per call. Turn it on with enable(), read the numbers with snapshot() and
+write them for Prometheus with write_prometheus(path).
+"""
+import os
+import threading
+from bisect import bisect_left
+
+# Checked by the instrumented hot paths; change it with enable() and disable()
+enabled = False
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (1e-06, 2.5e-06, 5e-06, 1e-05, 2.5e-05, 5e-05, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Histogram:
+    """Counts observations in fixed buckets, like a Prometheus histogram."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Return (upper bound, observations at or below it) pairs, ending with +Inf."""
+        pairs = []
+        total = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class MetricsRecorder:
+    """Collects order, buy and promotion metrics; safe to share between threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.latency = {}
+            self.orders = {"ok": 0, "failed": 0}
+            self.units_sold = {}
+            self.lines_priced = 0
+            self.promotion_lines = {}
+            self.stockouts = {}
+            self.deactivations = {}
+
+    def _observe(self, operation, seconds):
+        histogram = self.latency.get(operation)
+        if histogram is None:
+            histogram = self.latency[operation] = Histogram()
+        histogram.observe(seconds)
+
+    def record_order(self, shopping_list, deactivated, seconds):
+        """Record an applied order: its latency, units sold and sold-out products."""
+        with self._lock:
+            self._observe("order", seconds)
+            self.orders["ok"] += 1
+            for product, quantity in shopping_list:
+                self.units_sold[product.name] = self.units_sold.get(product.name, 0) + quantity
+            for product in deactivated:
+                self.deactivations[product.name] = self.deactivations.get(product.name, 0) + 1
+
+    def record_failed_order(self, seconds):
+        with self._lock:
+            self._observe("order", seconds)
+            self.orders["failed"] += 1
+
+    def record_buy(self, product, quantity, seconds):
+        """Record a Product.buy call, and the deactivation if it sold the product out."""
+        with self._lock:
+            self._observe("buy", seconds)
+            self.units_sold[product.name] = self.units_sold.get(product.name, 0) + quantity
+            if not product.active:
+                self.deactivations[product.name] = self.deactivations.get(product.name, 0) + 1
+
+    def record_pricing(self, promotions, seconds=None):
+        """Record priced lines, given the promotion of each line (None for none)."""
+        with self._lock:
+            if seconds is not None:
+                self._observe("promotion", seconds)
+            for promotion in promotions:
+                self.lines_priced += 1
+                if promotion is not None:
+                    promotion_type = type(promotion).__name__
+                    self.promotion_lines[promotion_type] = self.promotion_lines.get(promotion_type, 0) + 1
+
+    def record_stockout(self, product):
+        """Record an order line rejected because the product lacked stock."""
+        with self._lock:
+            self.stockouts[product.name] = self.stockouts.get(product.name, 0) + 1
+
+    def snapshot(self):
+        """Return a consistent copy of all metrics as plain dicts."""
+        with self._lock:
+            promoted = sum(self.promotion_lines.values())
+            return {
+                "latency": {operation: {"count": histogram.count, "sum": histogram.sum,
+                                        "buckets": histogram.cumulative()}
+                            for operation, histogram in self.latency.items()},
+                "orders": dict(self.orders),
+                "units_sold": dict(self.units_sold),
+                "lines_priced": self.lines_priced,
+                "promotion_lines": dict(self.promotion_lines),
+                "promotion_hit_rate": promoted / self.lines_priced if self.lines_priced else 0.0,
+                "stockouts": dict(self.stockouts),
+                "deactivations": dict(self.deactivations),
+            }
+
+
+# Shared by all stores and products
+recorder = MetricsRecorder()
+
+
+def enable():
+    """Start recording metrics."""
+    global enabled
+    enabled = True
+
+
+def disable():
+    """Stop recording metrics; what was recorded is kept until reset()."""
+    global enabled
+    enabled = False
+
+
+def reset():
+    recorder.reset()
+
+
+def snapshot():
+    return recorder.snapshot()
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _bound(value):
+    return "+Inf" if value == float("inf") else repr(value)
+
+
+def prometheus_text(metrics=None):
+    """Render a snapshot in the Prometheus text exposition format."""
+    metrics = metrics if metrics is not None else snapshot()
+    lines = ["# HELP bestbuy_latency_seconds Latency of instrumented operations.",
+             "# TYPE bestbuy_latency_seconds histogram"]
+    for operation, histogram in sorted(metrics["latency"].items()):
+        for bound, count in histogram["buckets"]:
+            lines.append(f'bestbuy_latency_seconds_bucket{{operation="{operation}",le="{_bound(bound)}"}} {count}')
+        lines.append(f'bestbuy_latency_seconds_sum{{operation="{operation}"}} {histogram["sum"]!r}')
+        lines.append(f'bestbuy_latency_seconds_count{{operation="{operation}"}} {histogram["count"]}')
+
+    counters = [
+        ("bestbuy_orders_total", "Orders by outcome.", "outcome", metrics["orders"]),
+        ("bestbuy_units_sold_total", "Units sold by product.", "product", metrics["units_sold"]),
+        ("bestbuy_promotion_lines_total", "Lines priced through a promotion, by promotion type.",
+         "promotion", metrics["promotion_lines"]),
+        ("bestbuy_stockouts_total", "Order lines rejected for lack of stock, by product.",
+         "product", metrics["stockouts"]),
+        ("bestbuy_deactivations_total", "Products deactivated by selling out.",
+         "product", metrics["deactivations"]),
+    ]
+    for name, help_text, label, values in counters:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for key, value in sorted(values.items()):
+            lines.append(f'{name}{{{label}="{_label(key)}"}} {value}')
+
+    lines.append("# HELP bestbuy_lines_priced_total Order lines priced.")
+    lines.append("# TYPE bestbuy_lines_priced_total counter")
+    lines.append(f"bestbuy_lines_priced_total {metrics['lines_priced']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """Write the current metrics to path in Prometheus text format, replacing it atomically."""
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(prometheus_text())
+    os.replace(temporary_path, path)
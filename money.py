@@ -0,0 +1,203 @@
+"""Fixed-point money amounts in integer cents.
+
+Rounding rules:
+    - Amounts are converted to whole cents, rounding halves away from zero
+      (19.995 becomes 20.00). Floats are read by their shortest decimal form,
+      so 19.99 is exactly 1999 cents.
+    - Adding and subtracting Money is exact.
+    - Multiplying or dividing by a number is computed exactly and rounded
+      once, to the cent, with the same half-away-from-zero rule.
+
+Money compares equal to ints and floats of the same value, so existing code
+can keep comparing prices with plain numbers, and hashes like them. Decimal
+and Fraction amounts can be ordered against Money but never compare equal to
+it, since no hash could match all of them; convert them with Money() first.
+"""
+from decimal import Decimal
+from fractions import Fraction
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1024)
+def _ratio(value):
+    """Return a number as an exact (numerator, denominator) pair of ints."""
+    if isinstance(value, float):
+        value = Decimal(repr(value))
+    elif isinstance(value, str):
+        value = Decimal(value)
+    if isinstance(value, Decimal) and not value.is_finite():
+        raise ValueError("Money amounts must be finite!")
+    return value.as_integer_ratio()
+
+
+def exact(value):
+    """Return a number as an exact Fraction, reading floats by their shortest decimal form."""
+    if isinstance(value, Fraction):
+        return value
+    return Fraction(*_ratio(value))
+
+
+@lru_cache(maxsize=256)
+def discount_factor(percent):
+    """Return the exact Fraction of a price that is left after a percent discount."""
+    return (100 - exact(percent)) / 100
+
+
+def round_half_up(numerator, denominator):
+    """Divide two ints and round to the nearest int, halves away from zero."""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if 2 * remainder >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+class Money:
+    """An amount of money held as an int number of cents; treat it as immutable."""
+    __slots__ = ("cents",)
+
+    def __init__(self, amount=0):
+        if isinstance(amount, Money):
+            self.cents = amount.cents
+        elif isinstance(amount, int):
+            self.cents = amount * 100
+        else:
+            numerator, denominator = _ratio(amount)
+            self.cents = round_half_up(numerator * 100, denominator)
+
+    @classmethod
+    def from_cents(cls, cents):
+        return _from_cents(int(cents))
+
+    def to_decimal(self):
+        return Decimal(self.cents).scaleb(-2)
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return _from_cents(self.cents + other.cents)
+        if isinstance(other, (int, float, Decimal, Fraction)):
+            return _from_cents(self.cents + Money(other).cents)
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return _from_cents(self.cents - other.cents)
+        if isinstance(other, (int, float, Decimal, Fraction)):
+            return _from_cents(self.cents - Money(other).cents)
+        return NotImplemented
+
+    def __rsub__(self, other):
+        if isinstance(other, (int, float, Decimal, Fraction)):
+            return _from_cents(Money(other).cents - self.cents)
+        return NotImplemented
+
+    def __neg__(self):
+        return _from_cents(-self.cents)
+
+    def __abs__(self):
+        return _from_cents(abs(self.cents))
+
+    def __mul__(self, factor):
+        if isinstance(factor, int):
+            return _from_cents(self.cents * factor)
+        if isinstance(factor, Fraction):
+            return _from_cents(round_half_up(self.cents * factor.numerator, factor.denominator))
+        if isinstance(factor, (float, Decimal)):
+            numerator, denominator = _ratio(factor)
+            return _from_cents(round_half_up(self.cents * numerator, denominator))
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, divisor):
+        if isinstance(divisor, Money):
+            return Fraction(self.cents, divisor.cents)
+        if isinstance(divisor, (int, float, Decimal, Fraction)):
+            divisor = exact(divisor)
+            return _from_cents(round_half_up(self.cents * divisor.denominator, divisor.numerator))
+        return NotImplemented
+
+    def _operands(self, other):
+        """Return this amount and other in comparable form, or None if other is not a number."""
+        if isinstance(other, Money):
+            return self.cents, other.cents
+        if isinstance(other, int):
+            return self.cents, other * 100
+        if isinstance(other, float):
+            return self.cents / 100, other
+        if isinstance(other, (Decimal, Fraction)):
+            return Fraction(self.cents, 100), Fraction(other)
+        return None
+
+    def __eq__(self, other):
+        # Only Money, int and float, which all hash like the equal float
+        if not isinstance(other, (Money, int, float)):
+            return NotImplemented
+        operands = self._operands(other)
+        return operands[0] == operands[1]
+
+    def __lt__(self, other):
+        operands = self._operands(other)
+        return NotImplemented if operands is None else operands[0] < operands[1]
+
+    def __le__(self, other):
+        operands = self._operands(other)
+        return NotImplemented if operands is None else operands[0] <= operands[1]
+
+    def __gt__(self, other):
+        operands = self._operands(other)
+        return NotImplemented if operands is None else operands[0] > operands[1]
+
+    def __ge__(self, other):
+        operands = self._operands(other)
+        return NotImplemented if operands is None else operands[0] >= operands[1]
+
+    def __hash__(self):
+        # Hash like the equal float, so Money(10) and 10 are the same dict key
+        return hash(self.cents / 100)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __float__(self):
+        return self.cents / 100
+
+    def __round__(self, ndigits=None):
+        if ndigits is None:
+            return round_half_up(self.cents, 100)
+        if ndigits >= 2:
+            return self
+        step = 10 ** (2 - ndigits)
+        return _from_cents(round_half_up(self.cents, step) * step)
+
+    def __format__(self, format_spec):
+        if not format_spec:
+            return str(self)
+        return format(self.to_decimal(), format_spec)
+
+    def __str__(self):
+        """Whole amounts print without decimals, like the int prices in main.py; others with two."""
+        if self.cents % 100 == 0:
+            return str(self.cents // 100)
+        return str(self.to_decimal())
+
+    def __repr__(self):
+        return f"Money('{self.to_decimal()}')"
+
+
+@lru_cache(maxsize=4096)
+def shared_money(cents):
+    """Return one shared Money object for each number of cents.
+
+    Money is immutable, so products with the same price can hold the same
+    object; most catalogs repeat a few hundred prices.
+    """
+    return _from_cents(cents)
+
+
+def _from_cents(cents):
+    """Build Money from an int number of cents without any checks."""
+    money = object.__new__(Money)
+    money.cents = cents
+    return money
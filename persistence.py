@@ -0,0 +1,335 @@
+"""Binary catalog snapshots and an append-only order log for Store.
+
+A snapshot stores the catalog column by column, each column aligned to
+8 bytes, so it can be read straight out of an mmap. Orders applied after
+the snapshot are appended to the order log and replayed on startup; take
+snapshots of a store that is taking orders with checkpoint().
+
+Snapshot layout (little-endian):
+    header          magic, row count, order sequence, names size, promotions size
+    prices          row count * int64 cents
+    quantities      row count * int64
+    maximums        row count * int64
+    promotion ids   row count * int64, index into the promotions table or -1
+    active flags    row count * int8
+    kinds           row count * int8
+    names           NUL separated UTF-8
+    promotions      JSON list of promotion specs
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from fractions import Fraction
+
+from catalog import Catalog, CatalogStore, KIND_LIMITED, KIND_NON_STOCKED, KIND_PRODUCT
+from money import Money
+from products import NonStockedProduct, LimitedProduct, SecondHalfPrice, ThirdOneFree, PercentDiscount
+from promotion_engine import PricingPlan
+
+SNAPSHOT_MAGIC = b"BBSNAP2\0"
+_HEADER = struct.Struct("<8sQQQQ")
+
+
+def promotion_spec(promotion):
+    """Return a JSON-friendly description of a promotion."""
+    if isinstance(promotion, PercentDiscount):
+        return {"type": "PercentDiscount", "name": promotion.name, "percent": promotion.percent}
+    if isinstance(promotion, (SecondHalfPrice, ThirdOneFree)):
+        return {"type": type(promotion).__name__, "name": promotion.name}
+    if isinstance(promotion, PricingPlan):
+        # The factor is kept as an exact fraction, so stacked discounts price the same after loading
+        factor = Fraction(promotion.discount_factor)
+        base = promotion.base_promotion
+        return {"type": "PricingPlan", "name": promotion.name,
+                "base": promotion_spec(base) if base is not None else None,
+                "factor": [factor.numerator, factor.denominator]}
+    raise ValueError(f"Cannot store promotion of type {type(promotion).__name__}!")
+
+
+def promotion_from_spec(spec):
+    """Build a promotion from the description made by promotion_spec."""
+    if spec["type"] == "PercentDiscount":
+        return PercentDiscount(spec["name"], percent=spec["percent"])
+    if spec["type"] == "SecondHalfPrice":
+        return SecondHalfPrice(spec["name"])
+    if spec["type"] == "ThirdOneFree":
+        return ThirdOneFree(spec["name"])
+    if spec["type"] == "PricingPlan":
+        base = promotion_from_spec(spec["base"]) if spec["base"] is not None else None
+        return PricingPlan(spec["name"], base, Fraction(*spec["factor"]))
+    raise ValueError(f"Unknown promotion type {spec['type']}!")
+
+
+def _padding(size):
+    return b"\0" * (-size % 8)
+
+
+def _column_bytes(column):
+    """Return the raw bytes of an array column in little-endian order."""
+    if sys.byteorder != "little":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_column(view, offset, typecode, count):
+    """Copy count items of a column out of a buffer; return the column and the next offset."""
+    column = array(typecode)
+    end = offset + count * column.itemsize
+    with view[offset:end] as chunk:
+        column.frombytes(chunk)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column, end + (-end % 8)
+
+
+def save_snapshot(store, path, order_seq=0):
+    """Write all products of a store to a snapshot file.
+
+    order_seq is the sequence number of the last order log entry already
+    reflected in the store; replay skips everything up to it. Orders are
+    logged before their stock changes, so a store taking orders must not be
+    snapshotted directly; use checkpoint() instead. The file is written next
+    to its destination and moved into place, so a crash never leaves a
+    half-written snapshot behind.
+    """
+    prices, quantities, maximums = array("q"), array("q"), array("q")
+    promotion_ids, active, kinds = array("q"), array("b"), array("b")
+    names = []
+    promotion_specs = []
+    promotion_ids_by_object = {}
+
+    for product in store.products:
+        if "\0" in product.name:
+            raise ValueError("Product names cannot contain NUL characters!")
+
+        if isinstance(product, LimitedProduct):
+            kinds.append(KIND_LIMITED)
+            maximums.append(product.maximum)
+        else:
+            kinds.append(KIND_NON_STOCKED if isinstance(product, NonStockedProduct) else KIND_PRODUCT)
+            maximums.append(0)
+
+        promotion = product.promotion
+        if promotion is None:
+            promotion_ids.append(-1)
+        else:
+            if id(promotion) not in promotion_ids_by_object:
+                promotion_ids_by_object[id(promotion)] = len(promotion_specs)
+                promotion_specs.append(promotion_spec(promotion))
+            promotion_ids.append(promotion_ids_by_object[id(promotion)])
+
+        prices.append(Money(product.price).cents)
+        quantities.append(product.quantity)
+        active.append(1 if product.active else 0)
+        names.append(product.name)
+
+    names_blob = "\0".join(names).encode("utf-8")
+    promotions_blob = json.dumps(promotion_specs).encode("utf-8")
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as snapshot:
+        snapshot.write(_HEADER.pack(SNAPSHOT_MAGIC, len(names), order_seq,
+                                    len(names_blob), len(promotions_blob)))
+        for column in (prices, quantities, maximums, promotion_ids, active, kinds):
+            data = _column_bytes(column)
+            snapshot.write(data + _padding(len(data)))
+        snapshot.write(names_blob + _padding(len(names_blob)))
+        snapshot.write(promotions_blob)
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    os.replace(temporary_path, path)
+
+
+def checkpoint(store, log, path):
+    """Snapshot a store whose orders go to an OrderLog, covering exactly the logged orders.
+
+    Every product is locked while the snapshot is written, so running orders
+    finish applying their stock first and new ones wait. Returns the order
+    sequence stored in the snapshot.
+    """
+    locks = store.lock_all_products()
+    try:
+        order_seq = log.last_seq
+        save_snapshot(store, path, order_seq=order_seq)
+    finally:
+        store.unlock_products(locks)
+    return order_seq
+
+
+def load_snapshot(path):
+    """Load a snapshot into a CatalogStore; return the store and its order sequence."""
+    with open(path, "rb") as snapshot, \
+            mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+            memoryview(data) as view:
+        magic, count, order_seq, names_size, promotions_size = _HEADER.unpack_from(view)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a store snapshot!")
+
+        offset = _HEADER.size
+        prices, offset = _read_column(view, offset, "q", count)
+        quantities, offset = _read_column(view, offset, "q", count)
+        maximums, offset = _read_column(view, offset, "q", count)
+        promotion_ids, offset = _read_column(view, offset, "q", count)
+        active, offset = _read_column(view, offset, "b", count)
+        kinds, offset = _read_column(view, offset, "b", count)
+
+        names_blob = bytes(view[offset:offset + names_size])
+        offset += names_size + (-names_size % 8)
+        promotion_specs = json.loads(bytes(view[offset:offset + promotions_size]))
+
+    names = names_blob.decode("utf-8").split("\0") if count else []
+    promotion_table = [promotion_from_spec(spec) for spec in promotion_specs]
+    if promotion_table:
+        promotions = [promotion_table[index] if index >= 0 else None for index in promotion_ids]
+    else:
+        promotions = [None] * count
+
+    catalog = Catalog.from_columns(prices, quantities, active, kinds, maximums, names, promotions)
+    return CatalogStore(catalog=catalog), order_seq
+
+
+def read_log(path, after_seq=0):
+    """Yield every complete entry of an AppendOnlyLog file after after_seq as a dict."""
+    with open(path, encoding="utf-8") as log:
+        for line in log:
+            try:
+                entry = json.loads(line)
+                seq = entry["seq"]
+            except (ValueError, TypeError, KeyError):
+                continue  # Torn write at the end of the log, or not an entry
+            if seq > after_seq:
+                yield entry
+
+
+class AppendOnlyLog:
+    """Append-only JSON Lines file whose entries are numbered by a "seq" field.
+
+    A crash can leave the last line half-written; such a line is skipped when
+    reading and the next entry starts on a fresh line. A write that fails is
+    cut off the file again, so a sequence number is only used once its entry
+    is written in full.
+    """
+
+    def __init__(self, path, sync=False):
+        self.path = path
+        self.sync = sync  # fsync after every entry, for durability across power loss
+        self.last_seq = self._read_last_seq()
+        self._lock = threading.Lock()
+        self._file = open(path, "ab", buffering=0)
+        # Start on a fresh line if the last write was torn by a crash
+        self._torn = False
+        if self._file.seek(0, os.SEEK_END) > 0:
+            with open(path, "rb") as log:
+                log.seek(-1, os.SEEK_END)
+                self._torn = log.read(1) != b"\n"
+
+    def _read_last_seq(self):
+        """Return the sequence number of the last complete entry in the log."""
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, "rb") as log:
+            log.seek(0, os.SEEK_END)
+            size = log.tell()
+            chunk_size = 4096
+            while True:
+                start = max(0, size - chunk_size)
+                log.seek(start)
+                lines = log.read(size - start).splitlines()
+                # The first line may be cut off unless the chunk starts at the beginning
+                candidates = lines if start == 0 else lines[1:]
+                for line in reversed(candidates):
+                    try:
+                        return json.loads(line)["seq"]
+                    except (ValueError, TypeError, KeyError):
+                        continue  # Torn write at the end of the log, or not an entry
+                if start == 0:
+                    return 0
+                chunk_size *= 2
+
+    def write(self, entry):
+        """Append a dict as the next entry and return its sequence number."""
+        with self._lock:
+            seq = self.last_seq + 1
+            data = (json.dumps({"seq": seq, **entry}) + "\n").encode("utf-8")
+            if self._torn:
+                data = b"\n" + data
+            offset = self._file.seek(0, os.SEEK_END)
+            try:
+                written = 0
+                while written < len(data):
+                    written += self._file.write(data[written:])
+                if self.sync:
+                    os.fsync(self._file.fileno())
+            except BaseException:
+                self._discard_after(offset)
+                raise
+            self._torn = False
+            self.last_seq = seq
+            return seq
+
+    def _discard_after(self, offset):
+        """Cut a failed write off the end of the log, or start the next entry on a fresh line."""
+        try:
+            self._file.truncate(offset)
+        except (OSError, ValueError):
+            self._torn = True
+
+    def read(self, after_seq=0):
+        """Yield every complete entry after after_seq as a dict."""
+        return read_log(self.path, after_seq)
+
+    def close(self):
+        self._file.close()
+
+
+class OrderLog(AppendOnlyLog):
+    """Append-only log of the orders applied to a store, one JSON line per order.
+
+    Attach the log to a store to record every order before it is acknowledged
+    to the caller; replay the log into a freshly loaded snapshot to restore
+    the stock levels at the time of a shutdown or crash.
+    """
+
+    def append(self, shopping_list):
+        """Record an applied order of (product, quantity) pairs."""
+        self.write({"items": [[product.name, quantity] for product, quantity in shopping_list]})
+
+    def attach(self, store):
+        """Log every order applied to the store from now on."""
+        store.add_order_listener(self.append)
+
+    def entries(self, after_seq=0):
+        """Yield (seq, items) for every complete entry after after_seq."""
+        for entry in self.read(after_seq):
+            yield entry["seq"], entry["items"]
+
+    def replay(self, store, after_seq=0):
+        """Apply the logged orders after after_seq to a store; return how many were applied."""
+        replayed = 0
+        for _, items in self.entries(after_seq):
+            shopping_list = []
+            for name, quantity in items:
+                product = store.get_product(name)
+                if product is None:
+                    raise ValueError(f"Order log refers to unknown product {name}!")
+                shopping_list.append((product, quantity))
+            store.apply_order(shopping_list)
+            replayed += 1
+        return replayed
+
+
+def restore(snapshot_path, log_path, sync=False):
+    """Load a snapshot, replay the newer orders from the log and attach the log.
+
+    Returns the restored store and the open OrderLog.
+    """
+    store, order_seq = load_snapshot(snapshot_path)
+    log = OrderLog(log_path, sync=sync)
+    log.replay(store, after_seq=order_seq)
+    log.attach(store)
+    return store, log
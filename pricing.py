@@ -0,0 +1,106 @@
+"""Order line pricing, with a NumPy batch path for large shopping lists."""
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; without it every line is priced on its own
+    np = None
+
+import metrics
+from money import Money, discount_factor
+from products import SecondHalfPrice, ThirdOneFree, PercentDiscount
+
+# Below this many lines the per-line path is faster than building arrays.
+# Install NumPy (requirements-optional.txt) to enable the batch path at all.
+BATCH_MIN_LINES = 64
+
+# Groups whose line cents could reach this are priced with Python ints instead
+_INT64_LIMIT = 2**63
+
+
+def price_line(product, quantity):
+    """Return the price of one order line, applying the product's promotion."""
+    return product.get_price(quantity)
+
+
+def price_lines(shopping_list):
+    """Return the price of every (product, quantity) line, in order."""
+    if np is None or len(shopping_list) < BATCH_MIN_LINES:
+        return [price_line(product, quantity) for product, quantity in shopping_list]
+    return _price_lines_batch(shopping_list)
+
+
+def sum_prices(line_prices):
+    """Sum line prices in order, exactly like the per-line checkout loop."""
+    total = Money(0)
+    for line_price in line_prices:
+        total += line_price
+    return total
+
+
+def _price_lines_batch(shopping_list):
+    """Group lines by promotion type and price each group in one integer array pass.
+
+    Prices are taken in cents and every group repeats the rounding rules of
+    the matching apply_promotion, so the results are identical to pricing
+    line by line. Promotions of any other type, and groups whose cents could
+    overflow int64, are priced through apply_promotion.
+
+    Reading the products is a single Python pass that fills plain int lists
+    per group; the arithmetic and rounding then run in NumPy. The batch path
+    pays off once the per-line promotion calls outweigh building the arrays,
+    which is what BATCH_MIN_LINES encodes.
+    """
+    if metrics.enabled:
+        metrics.recorder.record_pricing(product.promotion for product, _ in shopping_list)
+
+    # Per promotion type: line indexes, cents, quantities and, for discounts,
+    # the numerators and denominators of the exact discount factors
+    groups = {promotion_type: ([], [], [], [], [])
+              for promotion_type in (None, SecondHalfPrice, ThirdOneFree, PercentDiscount)}
+    line_prices = [None] * len(shopping_list)
+
+    for index, (product, quantity) in enumerate(shopping_list):
+        promotion = product.promotion
+        group = groups.get(type(promotion) if promotion else None)
+        if group is None:
+            line_prices[index] = promotion.apply_promotion(product, quantity)
+            continue
+        group[0].append(index)
+        group[1].append(product.price.cents)
+        group[2].append(quantity)
+        if group is groups[PercentDiscount]:
+            factor = discount_factor(promotion.percent)
+            group[3].append(factor.numerator)
+            group[4].append(factor.denominator)
+
+    for promotion_type, (indexes, cent_list, quantity_list, numerator_list, denominator_list) in groups.items():
+        if not indexes:
+            continue
+
+        largest_factor = 2 * max(numerator_list) if numerator_list else 1
+        if max(cent_list) * max(quantity_list) * largest_factor >= _INT64_LIMIT:
+            for i in indexes:
+                product, quantity = shopping_list[i]
+                line_prices[i] = (product.promotion.apply_promotion(product, quantity) if product.promotion
+                                  else quantity * product.price)
+            continue
+
+        cents = np.array(cent_list, dtype=np.int64)
+        quantities = np.array(quantity_list, dtype=np.int64)
+        if promotion_type is SecondHalfPrice:
+            # Half price items are rounded together, halves away from zero
+            full_price_count = (quantities + 1) // 2
+            half_price_count = quantities // 2
+            group_cents = full_price_count * cents + (half_price_count * cents + 1) // 2
+        elif promotion_type is ThirdOneFree:
+            group_cents = cents * (quantities - quantities // 3)
+        elif promotion_type is PercentDiscount:
+            numerators = np.array(numerator_list, dtype=np.int64)
+            denominators = np.array(denominator_list, dtype=np.int64)
+            group_cents = (2 * cents * quantities * numerators + denominators) // (2 * denominators)
+        else:
+            group_cents = quantities * cents
+
+        for index, line_cents in zip(indexes, group_cents.tolist()):
+            line_prices[index] = Money.from_cents(line_cents)
+
+    return line_prices
@@ -1,4 +1,12 @@
+import threading
+import weakref
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from time import perf_counter
+from types import MethodType
+
+import metrics
+from money import Money, discount_factor, round_half_up, shared_money
 
 
 # Promotions Module
@@ -12,6 +20,15 @@ class Promotion(ABC):
     def apply_promotion(self, product, quantity):
         pass
 
+    def cache_key(self):
+        """Return a hashable key; promotions with equal keys must price identically.
+
+        The default keys on the promotion object itself. Subclasses whose
+        pricing depends only on their settings return those settings instead,
+        so equal promotions share cached quotes.
+        """
+        return self
+
 
 class SecondHalfPrice(Promotion):
     """Every second item is half price."""
@@ -21,8 +38,12 @@ class SecondHalfPrice(Promotion):
         full_price_count = (quantity + 1) // 2  # Round up for odd quantities
         half_price_count = quantity // 2  # Integer division for even count
 
-        total = (full_price_count * product.price) + (half_price_count * product.price * 0.5)
-        return total
+        # The half price items are rounded to the cent together, halves up
+        cents = product.price.cents
+        return Money.from_cents(full_price_count * cents + round_half_up(half_price_count * cents, 2))
+
+    def cache_key(self):
+        return (type(self),)
 
 
 class ThirdOneFree(Promotion):
@@ -36,6 +57,9 @@ class ThirdOneFree(Promotion):
 
         return product.price * paid_items
 
+    def cache_key(self):
+        return (type(self),)
+
 
 class PercentDiscount(Promotion):
     """Applies a percentage discount to a product."""
@@ -47,12 +71,89 @@ class PercentDiscount(Promotion):
         self.percent = percent
 
     def apply_promotion(self, product, quantity):
-        discount_factor = (100 - self.percent) / 100
-        return product.price * quantity * discount_factor
+        # Exact factor, so the line is rounded to the cent only once
+        return product.price * quantity * discount_factor(self.percent)
+
+    def cache_key(self):
+        return (type(self), self.percent)
+
+
+class QuoteCache:
+    """Bounded LRU cache of promotion prices, keyed on (promotion, price, quantity).
+
+    Keys are built from the promotion's cache_key() and the product's current
+    price, so changing a product's promotion or price can never return a stale
+    quote: the old entries simply stop matching and age out.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._quotes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def quote(self, promotion, product, quantity):
+        """Return promotion.apply_promotion(product, quantity), from the cache if possible."""
+        key = (promotion.cache_key(), product.price, quantity)
+        with self._lock:
+            if key in self._quotes:
+                self.hits += 1
+                self._quotes.move_to_end(key)
+                return self._quotes[key]
+            self.misses += 1
+
+        price = promotion.apply_promotion(product, quantity)
+        with self._lock:
+            self._quotes[key] = price
+            while len(self._quotes) > self.maxsize:
+                self._quotes.popitem(last=False)
+        return price
+
+    def resize(self, maxsize):
+        """Change the maximum number of cached quotes, dropping the oldest ones."""
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._quotes) > maxsize:
+                self._quotes.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached quotes and reset the statistics."""
+        with self._lock:
+            self._quotes.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return hits, misses, hit rate and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._quotes),
+                "maxsize": self.maxsize,
+            }
+
+
+# Shared by all products; resize it with quote_cache.resize(n)
+quote_cache = QuoteCache()
+
+
+def _observer_callback(observer):
+    """Return the callable behind an observer, or None once a weakly held one is gone."""
+    return observer() if type(observer) is weakref.WeakMethod else observer
+
+
+def _live_observers(observers):
+    return tuple(observer for observer in observers if _observer_callback(observer) is not None)
 
 
 # Products Module
 class Product:
+    # Fixed attribute layout instead of a per-instance __dict__
+    __slots__ = ("_name", "_price", "_quantity", "_active", "_promotion", "_observers")
 
     def __init__(self, name, price, quantity):
         if not name:
@@ -67,12 +168,112 @@ class Product:
         except (ValueError, TypeError):
             raise ValueError("Quantity must be a valid integer!")
 
-        self.name = name
-        self.price = price
-        self.quantity = quantity
-        self.active = True
-        self.promotion = None  # Default: no promotion
+        self._observers = ()  # Callbacks notified about name/price/quantity/active/promotion changes
+        self._name = name
+        self._price = shared_money(Money(price).cents)
+        self._quantity = quantity
+        self._active = True
+        self._promotion = None  # Default: no promotion
 
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        if not name:
+            raise ValueError("Product name cannot be empty!")
+        old_name = self._name
+        self._name = name
+        if name != old_name:
+            self._notify("name", old_name, name)
+
+    @property
+    def price(self):
+        return self._price
+
+    @price.setter
+    def price(self, price):
+        old_price = self._price
+        price = shared_money(Money(price).cents)
+        self._price = price
+        if price != old_price:
+            self._notify("price", old_price, price)
+
+    @property
+    def quantity(self):
+        return self._quantity
+
+    @quantity.setter
+    def quantity(self, quantity):
+        old_quantity = self._quantity
+        self._quantity = quantity
+        if quantity != old_quantity:
+            self._notify("quantity", old_quantity, quantity)
+
+    @property
+    def active(self):
+        return self._active
+
+    @active.setter
+    def active(self, active):
+        old_active = self._active
+        self._active = active
+        if active != old_active:
+            self._notify("active", old_active, active)
+
+    @property
+    def promotion(self):
+        return self._promotion
+
+    @promotion.setter
+    def promotion(self, promotion):
+        old_promotion = self._promotion
+        self._promotion = promotion
+        if promotion is not old_promotion:
+            self._notify("promotion", old_promotion, promotion)
+
+    def add_observer(self, callback):
+        """Register callback(product, attribute, old_value, new_value) for state changes.
+
+        Bound methods are held by weak reference: an observer such as a Store
+        that is dropped without removing its products is not kept alive, or
+        called, because of them.
+        """
+        if isinstance(callback, MethodType):
+            callback = weakref.WeakMethod(callback)
+        self._observers = _live_observers(self._observers) + (callback,)
+
+    def remove_observer(self, callback):
+        """Unregister a previously added observer callback."""
+        self._observers = tuple(observer for observer in _live_observers(self._observers)
+                                if _observer_callback(observer) != callback)
+
+    def _notify(self, attribute, old_value, new_value):
+        for observer in self._observers:
+            callback = _observer_callback(observer)
+            if callback is None:
+                self._observers = _live_observers(self._observers)
+            else:
+                callback(self, attribute, old_value, new_value)
+
+    def __getstate__(self):
+        """Pickle the product's data without its observers, which belong to this process.
+
+        Subclasses without __slots__ also get an instance __dict__; its
+        attributes are pickled along with the slots.
+        """
+        state = {slot: getattr(self, slot)
+                 for cls in type(self).__mro__ for slot in cls.__dict__.get("__slots__", ())
+                 if slot not in ("_observers", "__dict__", "__weakref__") and hasattr(self, slot)}
+        state.update(getattr(self, "__dict__", {}))
+        state.pop("_observers", None)
+        return state
+
+    def __setstate__(self, state):
+        self._observers = ()
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
 
     def get_quantity(self):
         return int(self.quantity)
@@ -111,6 +312,17 @@ class Product:
         """Remove the current promotion from this product."""
         self.promotion = None
 
+    def get_price(self, quantity):
+        """Return the price of quantity items, with the promotion applied if there is one."""
+        started = perf_counter() if metrics.enabled else None
+        if self.promotion:
+            price = quote_cache.quote(self.promotion, self, quantity)
+        else:
+            price = quantity * self.price
+        if started is not None:
+            metrics.recorder.record_pricing((self.promotion,), perf_counter() - started)
+        return price
+
     def show(self):
         """Display the products with promotion"""
         if self.promotion:
@@ -120,26 +332,29 @@ class Product:
 
     def buy(self, quantity):
         """Checks product availability and then processes the order"""
+        started = perf_counter() if metrics.enabled else None
         if quantity <= 0:
             raise Exception("Quantity to buy must be at least 1!")
         if quantity > self.quantity:
+            if started is not None:
+                metrics.recorder.record_stockout(self)
             raise Exception(f"Not enough {self.name} in stock!")
         if not self.active:
             raise Exception(f"Product {self.name} is not available!")
 
         # Calculate price with promotion if applicable
-        if self.promotion:
-            total_price = self.promotion.apply_promotion(self, quantity)
-        else:
-            total_price = quantity * self.price
+        total_price = self.get_price(quantity)
 
         self.set_quantity(self.quantity - quantity)
+        if started is not None:
+            metrics.recorder.record_buy(self, quantity, perf_counter() - started)
         return total_price
 
 
 class NonStockedProduct(Product):
     """A product that doesn't have physical stock (e.g., digital licenses).
     Quantity is always zero, but the product remains active."""
+    __slots__ = ()
 
     def __init__(self, name, price):
         # Initialize with zero quantity:
@@ -154,21 +369,21 @@ class NonStockedProduct(Product):
         self.activate()
 
     def buy(self, quantity):
+        started = perf_counter() if metrics.enabled else None
         if quantity <= 0:
             raise Exception("Quantity to buy must be at least 1!")
         if not self.active:
             raise Exception(f"Product {self.name} is not active!")
 
         # Calculate price with promotion if applicable
-        if self.promotion:
-            total_price = self.promotion.apply_promotion(self, quantity)
-        else:
-            total_price = quantity * self.price
+        total_price = self.get_price(quantity)
 
         # Don't call set_quantity here as it would reset to 0 anyway
         # Instead, explicitly ensure the product stays active
         self.activate()
 
+        if started is not None:
+            metrics.recorder.record_buy(self, quantity, perf_counter() - started)
         return total_price
 
     def show(self):
@@ -180,6 +395,7 @@ class NonStockedProduct(Product):
 
 class LimitedProduct(Product):
     """A product with a maximum purchase quantity per order (e.g., shipping fee)."""
+    __slots__ = ("maximum",)
 
     def __init__(self, name, price, quantity, maximum):
         super().__init__(name, price, quantity)
@@ -190,6 +406,7 @@ class LimitedProduct(Product):
         self.maximum = maximum
 
     def buy(self, quantity):
+        started = perf_counter() if metrics.enabled else None
         if quantity <= 0:
             raise Exception("Quantity to buy must be at least 1!")
 
@@ -198,17 +415,18 @@ class LimitedProduct(Product):
             raise Exception(f"Error: Cannot purchase more than {self.maximum} of {self.name} per order!")
 
         if quantity > self.quantity:
+            if started is not None:
+                metrics.recorder.record_stockout(self)
             raise Exception(f"Not enough {self.name} in stock!")
         if not self.active:
             raise Exception(f"Product {self.name} is not active!")
 
         # Calculate price with promotion if applicable
-        if self.promotion:
-            total_price = self.promotion.apply_promotion(self, quantity)
-        else:
-            total_price = quantity * self.price
+        total_price = self.get_price(quantity)
 
         self.set_quantity(self.quantity - quantity)
+        if started is not None:
+            metrics.recorder.record_buy(self, quantity, perf_counter() - started)
         return total_price
 
     def show(self):
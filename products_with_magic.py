@@ -1,4 +1,8 @@
+import weakref
 from abc import ABC, abstractmethod
+from types import MethodType
+
+from money import Money, discount_factor, shared_money
 
 
 # Promotions Module
@@ -47,12 +51,24 @@ class PercentDiscount(Promotion):
         self.percent = percent
 
     def apply_promotion(self, product, quantity):
-        discount_factor = (100 - self.percent) / 100
-        return product.price * quantity * discount_factor
+        # Exact factor, so the line is rounded to the cent only once
+        return product.price * quantity * discount_factor(self.percent)
+
+
+def _observer_callback(observer):
+    """Return the callable behind an observer, or None once a weakly held one is gone."""
+    return observer() if type(observer) is weakref.WeakMethod else observer
+
+
+def _live_observers(observers):
+    return tuple(observer for observer in observers if _observer_callback(observer) is not None)
 
 
 # Products Module
 class Product:
+    # Fixed attribute layout instead of a per-instance __dict__
+    __slots__ = ("_name", "_price", "_quantity", "_active", "_promotion", "_observers")
+
     def __init__(self, name, price, quantity):
         if not name:
             raise Exception("Product name cannot be empty!")
@@ -61,19 +77,47 @@ class Product:
         if quantity < 0:
             raise Exception("Quantity cannot be negative!")
 
-        self.name = name
-        self.price = price
+        self._observers = ()  # Callbacks notified about state changes, as in products.Product
+        self._name = name
+        self._price = shared_money(Money(price).cents)
         self._quantity = quantity
         self._active = True
         self._promotion = None  # Default: no promotion
 
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        if not name:
+            raise Exception("Product name cannot be empty!")
+        old_name = self._name
+        self._name = name
+        if name != old_name:
+            self._notify("name", old_name, name)
+
+    @property
+    def price(self):
+        return self._price
+
+    @price.setter
+    def price(self, price):
+        old_price = self._price
+        self._price = shared_money(Money(price).cents)
+        if self._price != old_price:
+            self._notify("price", old_price, self._price)
+
     @property
     def quantity(self):
         return int(self._quantity)
 
     @quantity.setter
     def quantity(self, quantity):
+        old_quantity = self._quantity
         self._quantity = quantity
+        if quantity != old_quantity:
+            self._notify("quantity", old_quantity, quantity)
         if self._quantity <= 0:
             self.deactivate()
 
@@ -81,11 +125,21 @@ class Product:
     def active(self):
         return self._active
 
+    @active.setter
+    def active(self, active):
+        old_active = self._active
+        self._active = active
+        if active != old_active:
+            self._notify("active", old_active, active)
+
+    def is_active(self):
+        return self._active
+
     def activate(self):
-        self._active = True
+        self.active = True
 
     def deactivate(self):
-        self._active = False
+        self.active = False
 
     @property
     def promotion(self):
@@ -95,11 +149,44 @@ class Product:
     @promotion.setter
     def promotion(self, promotion):
         """Set a promotion for this product."""
+        old_promotion = self._promotion
         self._promotion = promotion
+        if promotion is not old_promotion:
+            self._notify("promotion", old_promotion, promotion)
 
     def remove_promotion(self):
         """Remove the current promotion from this product."""
-        self._promotion = None
+        self.promotion = None
+
+    def add_observer(self, callback):
+        """Register callback(product, attribute, old_value, new_value), as a Store does.
+
+        Bound methods are held by weak reference, as in products.Product.
+        """
+        if isinstance(callback, MethodType):
+            callback = weakref.WeakMethod(callback)
+        self._observers = _live_observers(self._observers) + (callback,)
+
+    def remove_observer(self, callback):
+        self._observers = tuple(observer for observer in _live_observers(self._observers)
+                                if _observer_callback(observer) != callback)
+
+    def _notify(self, attribute, old_value, new_value):
+        for observer in self._observers:
+            callback = _observer_callback(observer)
+            if callback is None:
+                self._observers = _live_observers(self._observers)
+            else:
+                callback(self, attribute, old_value, new_value)
+
+    def get_price(self, quantity):
+        """Return the price of quantity items, with the promotion applied if there is one."""
+        if self._promotion:
+            return self._promotion.apply_promotion(self, quantity)
+        return quantity * self.price
+
+    def show(self):
+        return str(self)
 
     def __str__(self):
         if self._promotion:
@@ -113,6 +200,12 @@ class Product:
             return self.price > other.price
         return NotImplemented
 
+    def __lt__(self, other):
+        """Less than comparison based on price, used by sorted()."""
+        if isinstance(other, Product):
+            return self.price < other.price
+        return NotImplemented
+
     def __eq__(self, other):
         """Equality comparison based on name."""
         if isinstance(other, Product):
@@ -127,11 +220,7 @@ class Product:
         if not self._active:
             raise Exception(f"Product {self.name} is not active!")
 
-        # Calculate price with promotion if applicable
-        if self._promotion:
-            total_price = self._promotion.apply_promotion(self, quantity)
-        else:
-            total_price = quantity * self.price
+        total_price = self.get_price(quantity)
 
         self.quantity = self._quantity - quantity
         return total_price
@@ -140,6 +229,7 @@ class Product:
 class NonStockedProduct(Product):
     """A product that doesn't have physical stock (e.g., digital licenses).
     Quantity is always zero, but the product remains active."""
+    __slots__ = ()
 
     def __init__(self, name, price):
         # Initialize with zero quantity:
@@ -183,6 +273,7 @@ class NonStockedProduct(Product):
 
 class LimitedProduct(Product):
     """A product with a maximum purchase quantity per order (e.g., shipping fee)."""
+    __slots__ = ("maximum",)
 
     def __init__(self, name, price, quantity, maximum):
         super().__init__(name, price, quantity)
@@ -0,0 +1,143 @@
+"""Stacked promotions with priorities, exclusivity and category-wide rules.
+
+The engine keeps the promotion rules for products and categories. Whenever
+the rules of a product change, they are compiled into a single PricingPlan
+that is set as the product's promotion, so checkout prices the product with
+one plan evaluation instead of walking the rules.
+"""
+import money
+from products import Promotion, PercentDiscount
+
+
+class PromotionRule:
+    """A promotion with a priority; exclusive rules cannot be combined with others."""
+
+    def __init__(self, promotion, priority=0, exclusive=False):
+        self.promotion = promotion
+        self.priority = priority
+        self.exclusive = exclusive
+
+
+class PricingPlan(Promotion):
+    """A compiled set of stacked promotions.
+
+    The plan applies at most one quantity-based promotion (e.g. Third One
+    Free) and multiplies the result by the combined factor of all percentage
+    discounts. The factor is an exact Fraction, so stacked discounts round
+    to the cent only once.
+    """
+
+    def __init__(self, name, base_promotion, discount_factor):
+        super().__init__(name)
+        self.base_promotion = base_promotion
+        self.discount_factor = discount_factor
+
+    def apply_promotion(self, product, quantity):
+        if self.base_promotion is not None:
+            total = self.base_promotion.apply_promotion(product, quantity)
+        else:
+            total = quantity * product.price
+        if self.discount_factor != 1:
+            total = total * self.discount_factor
+        return total
+
+    def cache_key(self):
+        base_key = self.base_promotion.cache_key() if self.base_promotion is not None else None
+        return (type(self), base_key, self.discount_factor)
+
+
+def compile_plan(rules):
+    """Compile promotion rules into a single promotion, or None if there are none.
+
+    Rules are applied in descending priority. If the highest priority rule is
+    exclusive, only that rule applies; lower priority exclusive rules are
+    skipped. Percentage discounts stack; of the other promotions only the
+    highest priority one is used.
+    """
+    rules = sorted(rules, key=lambda rule: rule.priority, reverse=True)
+    if not rules:
+        return None
+    if rules[0].exclusive:
+        rules = rules[:1]
+
+    base_promotion = None
+    discount_factor = 1
+    names = []
+    for rule in rules:
+        if rule.exclusive and len(rules) > 1:
+            continue
+
+        promotion = rule.promotion
+        if type(promotion) is PercentDiscount:
+            discount_factor *= money.discount_factor(promotion.percent)
+        elif base_promotion is None:
+            base_promotion = promotion
+        else:
+            continue
+        names.append(promotion.name)
+
+    if base_promotion is not None and discount_factor == 1 and len(names) == 1:
+        # A single promotion needs no plan around it
+        return base_promotion
+    return PricingPlan(" + ".join(names), base_promotion, discount_factor)
+
+
+class PromotionEngine:
+    """Keeps promotion rules per product and per category and compiles them on change.
+
+    Products are tracked by identity. Rules only take effect for products
+    added with add_product; their promotion is managed by the engine from
+    then on.
+    """
+
+    def __init__(self):
+        self._products = {}
+        self._categories = {}
+        self._product_rules = {}
+        self._category_rules = {}
+
+    def add_product(self, product, category=None):
+        """Let the engine manage a product's promotion, optionally as part of a category."""
+        self._products[id(product)] = (product, category)
+        if category is not None:
+            self._categories.setdefault(category, {})[id(product)] = product
+        self._compile(product)
+
+    def remove_product(self, product):
+        """Stop managing a product; its current promotion is left in place."""
+        _, category = self._products.pop(id(product), (None, None))
+        self._product_rules.pop(id(product), None)
+        if category is not None:
+            self._categories[category].pop(id(product), None)
+
+    def add_rule(self, product, promotion, priority=0, exclusive=False):
+        """Add a promotion rule for one product and recompile its plan."""
+        if id(product) not in self._products:
+            self.add_product(product)
+        self._product_rules.setdefault(id(product), []).append(PromotionRule(promotion, priority, exclusive))
+        self._compile(product)
+
+    def add_category_rule(self, category, promotion, priority=0, exclusive=False):
+        """Add a promotion rule for every product in a category and recompile their plans."""
+        self._category_rules.setdefault(category, []).append(PromotionRule(promotion, priority, exclusive))
+        for product in self._categories.get(category, {}).values():
+            self._compile(product)
+
+    def clear_rules(self, product):
+        """Remove a product's own rules; category rules still apply."""
+        self._product_rules.pop(id(product), None)
+        self._compile(product)
+
+    def clear_category_rules(self, category):
+        """Remove all rules of a category."""
+        self._category_rules.pop(category, None)
+        for product in self._categories.get(category, {}).values():
+            self._compile(product)
+
+    def rules_for(self, product):
+        """Return all rules that apply to a product."""
+        _, category = self._products.get(id(product), (None, None))
+        return self._product_rules.get(id(product), []) + self._category_rules.get(category, [])
+
+    def _compile(self, product):
+        product.promotion = compile_plan(self.rules_for(product))
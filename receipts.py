@@ -0,0 +1,17 @@
+"""Console rendering of order results."""
+from colorama import Fore, Style
+
+
+def format_order(result):
+    """Return the colored lines of an order summary."""
+    lines = [Fore.BLUE + f"{line.quantity} * {line.product.name} for {line.product.price}€"
+             for line in result.lines]
+    lines.append("_____________________________________")
+    lines.append(f"Total price: {result.total_price:.2f} €" + Style.RESET_ALL)
+    return lines
+
+
+def print_order(result):
+    """Print an order summary to the console."""
+    for line in format_order(result):
+        print(line)
@@ -0,0 +1,186 @@
+"""Cart reservations: stock held against products for a limited time.
+
+A hold takes quantity out of a product's available stock until it is
+ordered, released or expires. Each ReservationBook keeps a running total of
+the held quantity per product, so available stock is on-hand minus holds in
+O(1). Expiry times are kept in a heap; expiring holds only pops the entries
+that are due instead of scanning every hold.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+# Seconds a hold lasts unless another TTL is given
+DEFAULT_HOLD_TTL = 15 * 60
+
+
+class Hold:
+    """Quantity of one product held for a cart until expires_at."""
+
+    def __init__(self, hold_id, product, quantity, expires_at):
+        self.id = hold_id
+        self.product = product
+        self.quantity = quantity
+        self.expires_at = expires_at
+
+
+class ReservationBook:
+    """The live holds on the products of one Store; get it with Store.reservations()."""
+
+    def __init__(self, store, ttl=DEFAULT_HOLD_TTL, clock=time.monotonic):
+        self.store = store
+        self.ttl = ttl
+        self.clock = clock
+        self._holds = {}  # Live holds by id
+        self._held = {}  # Held quantity by the store's product lock key
+        # (expires_at, hold id) entries; entries of released or extended holds
+        # stay behind and are skipped when they come up
+        self._expiries = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def hold(self, product, quantity, ttl=None):
+        """Hold quantity of a product and return the Hold; raise if it is not available."""
+        if quantity <= 0:
+            raise Exception("Quantity to hold must be at least 1!")
+
+        # Holding the product's lock keeps orders from taking the stock between check and hold
+        locks = self.store.lock_products([product])
+        try:
+            self.store.check_stock([(product, quantity)])
+            with self._lock:
+                hold = Hold(next(self._ids), product, quantity, self.clock() + (self.ttl if ttl is None else ttl))
+                key = self.store.lock_key(product)
+                self._holds[hold.id] = hold
+                self._held[key] = self._held.get(key, 0) + quantity
+                heapq.heappush(self._expiries, (hold.expires_at, hold.id))
+        finally:
+            self.store.unlock_products(locks)
+        return hold
+
+    def extend(self, hold, ttl=None):
+        """Restart the TTL of a live hold; raise if it has already expired or been released."""
+        with self._lock:
+            self._expire()
+            if self._holds.get(hold.id) is not hold:
+                raise Exception(f"Reservation of {hold.product.name} has expired!")
+            hold.expires_at = self.clock() + (self.ttl if ttl is None else ttl)
+            heapq.heappush(self._expiries, (hold.expires_at, hold.id))
+            self._compact()
+
+    def release(self, hold):
+        """Give the held stock back; releasing an expired hold does nothing."""
+        with self._lock:
+            self._remove(hold)
+            self._compact()
+
+    def is_live(self, hold):
+        with self._lock:
+            self._expire()
+            return self._holds.get(hold.id) is hold
+
+    def held(self, product):
+        """Return the quantity of a product held by live holds."""
+        return self._held_quantity(self.store.lock_key(product))
+
+    def available(self, product):
+        """Return the on-hand quantity of a product minus its live holds."""
+        return product.quantity - self.held(product)
+
+    def expire(self):
+        """Drop every hold that is past its expiry time and return them."""
+        with self._lock:
+            return self._expire()
+
+    def cart(self, ttl=None):
+        """Start an empty Cart whose lines are held on this book."""
+        return Cart(self, ttl)
+
+    def _held_quantity(self, key):
+        with self._lock:
+            self._expire()
+            return self._held.get(key, 0)
+
+    def _held_by_others(self, keys, holds=()):
+        """Return the quantity held per product key, leaving out the given holds.
+
+        The totals and the given holds are read under one lock, so a hold that
+        expires meanwhile drops out of both: its stock went back to the
+        product, and the order is checked against it like any other.
+        """
+        with self._lock:
+            self._expire()
+            held = {key: self._held.get(key, 0) for key in keys}
+            for hold in holds:
+                key = self.store.lock_key(hold.product)
+                if self._holds.get(hold.id) is hold and key in held:
+                    held[key] -= hold.quantity
+            return held
+
+    def _consume(self, holds):
+        """Remove holds whose stock has just been ordered."""
+        with self._lock:
+            for hold in holds:
+                self._remove(hold)
+            self._compact()
+
+    def _remove(self, hold):
+        if self._holds.pop(hold.id, None) is None:
+            return
+        key = self.store.lock_key(hold.product)
+        remaining = self._held[key] - hold.quantity
+        if remaining:
+            self._held[key] = remaining
+        else:
+            del self._held[key]
+
+    def _expire(self):
+        """Pop the due heap entries; only entries matching a live hold's expiry release it."""
+        expired = []
+        now = self.clock()
+        while self._expiries and self._expiries[0][0] <= now:
+            expires_at, hold_id = heapq.heappop(self._expiries)
+            hold = self._holds.get(hold_id)
+            if hold is not None and hold.expires_at == expires_at:
+                self._remove(hold)
+                expired.append(hold)
+        return expired
+
+    def _compact(self):
+        """Rebuild the heap once most of its entries belong to released or extended holds."""
+        if len(self._expiries) > 2 * len(self._holds) + 64:
+            self._expiries = [(hold.expires_at, hold.id) for hold in self._holds.values()]
+            heapq.heapify(self._expiries)
+
+
+class Cart:
+    """Order lines whose stock is held until the cart is ordered or released."""
+
+    def __init__(self, book, ttl=None):
+        self.book = book
+        self.ttl = ttl
+        self.holds = []
+
+    @property
+    def lines(self):
+        """Return the cart as a (product, quantity) shopping list."""
+        return [(hold.product, hold.quantity) for hold in self.holds]
+
+    def add(self, product, quantity):
+        """Hold quantity of a product for this cart; raise if it is not available."""
+        hold = self.book.hold(product, quantity, self.ttl)
+        self.holds.append(hold)
+        return hold
+
+    def order(self, quiet=False):
+        """Order the held lines and return the total price; the cart is empty afterwards."""
+        total_price = self.book.store.order(self.lines, quiet=quiet, holds=self.holds)
+        self.holds = []
+        return total_price
+
+    def release(self):
+        """Give back the stock of every line and empty the cart."""
+        for hold in self.holds:
+            self.book.release(hold)
+        self.holds = []
@@ -0,0 +1,113 @@
+"""Asyncio checkout service that processes orders for one Store.
+
+Orders arrive through an in-process queue (CheckoutService.submit) or over
+a local TCP socket speaking JSON Lines. Each request line looks like
+{"items": [["MacBook Air M2", 2], ["Shipping", 1]]} and is answered with
+{"ok": true, "total": 2185.0} or {"ok": false, "error": "..."}. Totals are
+sent as JSON numbers with at most two decimals.
+"""
+import asyncio
+import json
+
+
+class CheckoutService:
+    """Serves many concurrent shoppers from a single event loop.
+
+    Orders are queued and processed by one worker task, which drains
+    everything that is waiting on each wake-up. Orders are checked and priced
+    with the store's transaction logic, so nothing is printed.
+    """
+
+    def __init__(self, store, max_pending=0):
+        self.store = store
+        self.max_pending = max_pending
+        self._queue = None
+        self._worker = None
+        self.orders_processed = 0
+        self.orders_failed = 0
+
+    async def start(self):
+        """Start the worker task; must be awaited inside the event loop."""
+        if self._worker is None:
+            self._queue = asyncio.Queue(self.max_pending)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker task once all queued orders are processed."""
+        if self._worker is not None:
+            await self._queue.join()
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, items):
+        """Queue an order of (product name, quantity) pairs and return its total price."""
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((items, future))
+        return await future
+
+    def process(self, items):
+        """Check, price and apply one order of (product name, quantity) pairs.
+
+        Items come straight from the network, so names must be strings and
+        quantities whole numbers of at least 1; 1.5 or true are rejected.
+        """
+        transaction = self.store.transaction()
+        for name, quantity in items:
+            if not isinstance(name, str):
+                raise Exception(f"Invalid product name {name!r}!")
+            if type(quantity) is not int or quantity < 1:
+                raise Exception(f"Invalid quantity {quantity!r} for {name}!")
+            product = self.store.get_product(name)
+            if product is None:
+                raise Exception(f"Product {name} is not available!")
+            transaction.reserve(product, quantity)
+        return transaction.commit()
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            for items, future in batch:
+                try:
+                    result = self.process(items)
+                except Exception as e:
+                    self.orders_failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.orders_processed += 1
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self._queue.task_done()
+
+    async def serve(self, host="127.0.0.1", port=0):
+        """Start accepting JSON Lines orders over TCP and return the asyncio server."""
+        await self.start()
+        return await asyncio.start_server(self._handle_client, host, port)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    total = await self.submit(request["items"])
+                    response = {"ok": True, "total": float(total)}
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
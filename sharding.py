@@ -0,0 +1,236 @@
+"""Inventory sharded across several Stores, optionally in worker processes.
+
+Products are assigned to a shard by a stable hash of their name. The router
+splits each order by shard, has every shard check and price its part in
+parallel, and only commits once all shards have accepted; otherwise every
+shard drops its part. Shards hold back the stock of accepted but not yet
+committed parts, so a commit can never fail.
+"""
+import multiprocessing
+import threading
+import zlib
+from itertools import count
+
+from pricing import price_lines, sum_prices
+from stores import Store
+
+
+def shard_for(name, shard_count):
+    """Return the shard number for a product name; stable across processes."""
+    return zlib.crc32(name.encode("utf-8")) % shard_count
+
+
+class ShardServer:
+    """Runs the shard protocol against one Store."""
+
+    def __init__(self, store):
+        self.store = store
+        self._prepared = {}
+        self._held = {}  # product name -> quantity held by prepared orders
+
+    def handle(self, command, args):
+        """Run a command and return ("ok", result) or ("error", message)."""
+        try:
+            return "ok", getattr(self, f"_{command}")(*args)
+        except Exception as e:
+            return "error", str(e)
+
+    def _add_products(self, products):
+        for product in products:
+            self.store.add_product(product)
+
+    def _get_product(self, name):
+        return self.store.get_product(name)
+
+    def _total_quantity(self):
+        return self.store.total_quantity()
+
+    def _prepare(self, order_id, items):
+        """Check and price a part of an order, and hold its stock until commit or abort."""
+        shopping_list = []
+        for name, quantity in items:
+            product = self.store.get_product(name)
+            if product is None:
+                raise Exception(f"Product {name} is not available!")
+            shopping_list.append((product, quantity))
+
+        # Check each product against its stock minus what prepared orders are holding
+        requested = {}
+        products_by_name = {}
+        for product, quantity in shopping_list:
+            requested[product.name] = requested.get(product.name, 0) + quantity
+            products_by_name[product.name] = product
+        self.store.check_stock([(products_by_name[name], quantity + self._held.get(name, 0))
+                                 for name, quantity in requested.items()])
+        line_prices = price_lines(shopping_list)
+
+        for name, quantity in items:
+            self._held[name] = self._held.get(name, 0) + quantity
+        self._prepared[order_id] = (items, shopping_list)
+        return line_prices
+
+    def _release(self, order_id):
+        items, shopping_list = self._prepared.pop(order_id)
+        for name, quantity in items:
+            self._held[name] -= quantity
+            if not self._held[name]:
+                del self._held[name]
+        return shopping_list
+
+    def _commit(self, order_id):
+        self.store.checkout(self._release(order_id))
+
+    def _abort(self, order_id):
+        if order_id in self._prepared:
+            self._release(order_id)
+
+
+def _serve(connection, store):
+    """Worker process loop: answer commands until told to stop."""
+    server = ShardServer(store)
+    while True:
+        command, args = connection.recv()
+        if command == "stop":
+            connection.close()
+            return
+        connection.send(server.handle(command, args))
+
+
+class _LocalShard:
+    """A shard served in the router's own process."""
+
+    def __init__(self, store):
+        self._server = ShardServer(store)
+        self._reply = None
+
+    def send(self, command, *args):
+        self._reply = self._server.handle(command, args)
+
+    def receive(self):
+        return self._reply
+
+    def close(self):
+        pass
+
+
+class _ProcessShard:
+    """A shard served by a worker process over a pipe."""
+
+    def __init__(self, store):
+        self._connection, worker_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve, args=(worker_connection, store), daemon=True)
+        self._process.start()
+        worker_connection.close()
+
+    def send(self, command, *args):
+        self._connection.send((command, args))
+
+    def receive(self):
+        return self._connection.recv()
+
+    def close(self):
+        self._connection.send(("stop", ()))
+        self._process.join()
+        self._connection.close()
+
+
+class ShardedInventory:
+    """Routes products and orders to shards partitioned by product name.
+
+    With processes=True every shard is a Store in its own worker process;
+    otherwise the shards live in this process, which is handy for tests and
+    small deployments. Orders go through order(), which keeps the semantics
+    of Store.order: all lines are applied or none, and the total is the sum
+    of the line prices in shopping list order.
+    """
+
+    def __init__(self, shard_count=4, processes=True):
+        shard_class = _ProcessShard if processes else _LocalShard
+        self.shards = [shard_class(Store()) for _ in range(shard_count)]
+        # One lock per shard, so requests to different shards do not wait for each other
+        self._shard_locks = [threading.Lock() for _ in self.shards]
+        self._order_ids = count(1)
+
+    def close(self):
+        """Stop all worker processes."""
+        for shard in self.shards:
+            shard.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _request_all(self, requests):
+        """Send {shard number: (command, args)} to the shards at once and collect the replies.
+
+        Only the shards addressed are locked, in ascending order to avoid deadlocks.
+        """
+        shard_numbers = sorted(requests)
+        for shard_number in shard_numbers:
+            self._shard_locks[shard_number].acquire()
+        try:
+            for shard_number in shard_numbers:
+                command, args = requests[shard_number]
+                self.shards[shard_number].send(command, *args)
+            replies = {shard_number: self.shards[shard_number].receive() for shard_number in shard_numbers}
+        finally:
+            for shard_number in reversed(shard_numbers):
+                self._shard_locks[shard_number].release()
+
+        errors = [result for status, result in replies.values() if status == "error"]
+        return {shard_number: result for shard_number, (_, result) in replies.items()}, errors
+
+    def add_products(self, products):
+        """Send each product to its shard."""
+        by_shard = {}
+        for product in products:
+            by_shard.setdefault(shard_for(product.name, len(self.shards)), []).append(product)
+        _, errors = self._request_all({shard: ("add_products", (batch,)) for shard, batch in by_shard.items()})
+        if errors:
+            raise Exception(errors[0])
+
+    def get_product(self, name):
+        """Return a copy of the product from its shard, or None."""
+        results, errors = self._request_all({shard_for(name, len(self.shards)): ("get_product", (name,))})
+        if errors:
+            raise Exception(errors[0])
+        return next(iter(results.values()))
+
+    def total_quantity(self):
+        results, errors = self._request_all({shard: ("total_quantity", ()) for shard in range(len(self.shards))})
+        if errors:
+            raise Exception(errors[0])
+        return sum(results.values())
+
+    def get_total_quantity(self):
+        """Return formatted total of all product quantities across shards."""
+        return f"Total items of {self.total_quantity()} in store"
+
+    def order(self, items):
+        """Order (product name, quantity) pairs across shards and return the total price."""
+        order_id = next(self._order_ids)
+        positions_by_shard = {}
+        for position, (name, _) in enumerate(items):
+            positions_by_shard.setdefault(shard_for(name, len(self.shards)), []).append(position)
+
+        # Phase one: every shard checks, prices and holds its part in parallel
+        results, errors = self._request_all({
+            shard: ("prepare", (order_id, [tuple(items[position]) for position in positions]))
+            for shard, positions in positions_by_shard.items()})
+        if errors:
+            self._request_all({shard: ("abort", (order_id,)) for shard in positions_by_shard})
+            raise Exception(errors[0])
+
+        # Phase two: every part was accepted, so apply them all
+        _, errors = self._request_all({shard: ("commit", (order_id,)) for shard in positions_by_shard})
+        if errors:
+            raise Exception(errors[0])
+
+        line_prices = [None] * len(items)
+        for shard, positions in positions_by_shard.items():
+            for position, line_price in zip(positions, results[shard]):
+                line_prices[position] = line_price
+        return sum_prices(line_prices)
@@ -0,0 +1,231 @@
+"""Store backed by a SQLite database instead of an in-memory product list."""
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from catalog import KIND_LIMITED, KIND_NON_STOCKED, KIND_PRODUCT
+from money import Money
+from persistence import promotion_spec, promotion_from_spec
+from pricing import price_lines, sum_prices
+from products import Product, NonStockedProduct, LimitedProduct
+from stores import OrderLine, OrderResult
+
+# Stored in PRAGMA user_version, so a database written by another version is refused
+SCHEMA_VERSION = 1
+
+# Separate statements, so they can run inside a transaction (executescript commits)
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        kind INTEGER NOT NULL,
+        price_cents INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        maximum INTEGER NOT NULL DEFAULT 0,
+        active INTEGER NOT NULL,
+        promotion TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS products_name ON products (name)",
+    "CREATE INDEX IF NOT EXISTS products_active ON products (active)",
+)
+
+_COLUMNS = "id, name, kind, price_cents, quantity, maximum, active, promotion"
+
+# Stay below SQLite's limit on bound parameters per statement
+_NAMES_PER_QUERY = 500
+
+
+def _product_row(product):
+    """Return the column values for a product, without the id."""
+    if isinstance(product, LimitedProduct):
+        kind, maximum = KIND_LIMITED, product.maximum
+    elif isinstance(product, NonStockedProduct):
+        kind, maximum = KIND_NON_STOCKED, 0
+    else:
+        kind, maximum = KIND_PRODUCT, 0
+    promotion = json.dumps(promotion_spec(product.promotion)) if product.promotion else None
+    return (product.name, kind, Money(product.price).cents, product.quantity, maximum,
+            1 if product.active else 0, promotion)
+
+
+def _product_from_row(row):
+    """Build a detached Product from a database row."""
+    _, name, kind, price_cents, quantity, maximum, active, promotion = row
+    price = Money.from_cents(price_cents)
+    if kind == KIND_LIMITED:
+        product = LimitedProduct(name, price, quantity, maximum)
+    elif kind == KIND_NON_STOCKED:
+        product = NonStockedProduct(name, price)
+    else:
+        product = Product(name, price, quantity)
+    product.active = bool(active)
+    if promotion is not None:
+        product.set_promotion(promotion_from_spec(json.loads(promotion)))
+    return product
+
+
+class SQLiteStore:
+    """A store whose products live in a SQLite database.
+
+    It offers the same methods as stores.Store, so the catalog can outgrow
+    memory and several processes can share one inventory file. Products
+    handed out are detached copies of their rows; the database stays the
+    source of truth, and orders match products to rows by name.
+    """
+
+    def __init__(self, path=":memory:", products=None):
+        self.path = path
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        try:
+            self._open_schema()
+        except Exception:
+            self._connection.close()
+            raise
+        if products:
+            self.add_products(products)
+
+    def close(self):
+        self._connection.close()
+
+    def _open_schema(self):
+        """Create the schema in a new database, or check the version of an existing one."""
+        with self._transaction() as connection:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            has_products = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products'").fetchone()
+            if version != SCHEMA_VERSION and (version or has_products):
+                raise Exception(f"{self.path} uses schema version {version}, "
+                                f"not the supported version {SCHEMA_VERSION}!")
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @contextmanager
+    def _transaction(self):
+        """Run a block in one write transaction, rolled back if the block or the commit fails."""
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so reads made inside
+            # the block cannot be invalidated by another process
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+                self._connection.execute("COMMIT")
+            except BaseException:
+                if self._connection.in_transaction:
+                    self._connection.execute("ROLLBACK")
+                raise
+
+    def _read(self, query, parameters=()):
+        """Run a read query on the shared connection and return all its rows."""
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchall()
+
+    @property
+    def products(self):
+        """Return all products in the order they were added."""
+        rows = self._read(f"SELECT {_COLUMNS} FROM products ORDER BY id")
+        return [_product_from_row(row) for row in rows]
+
+    def add_product(self, product):
+        """Add a single product to the store."""
+        self.add_products([product])
+
+    def add_products(self, products):
+        """Add many products in one transaction."""
+        with self._transaction() as connection:
+            connection.executemany(
+                "INSERT INTO products (name, kind, price_cents, quantity, maximum, active, promotion) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (_product_row(product) for product in products))
+
+    def remove_product(self, product):
+        """Remove the first product with the product's name, if there is one."""
+        with self._transaction() as connection:
+            connection.execute(
+                "DELETE FROM products WHERE id = (SELECT MIN(id) FROM products WHERE name = ?)",
+                (product.name,))
+
+    def get_product(self, name):
+        """Return the first product with the given name, or None."""
+        rows = self._read(f"SELECT {_COLUMNS} FROM products WHERE name = ? ORDER BY id LIMIT 1", (name,))
+        return _product_from_row(rows[0]) if rows else None
+
+    def get_total_quantity(self):
+        """Return formatted total of all product quantities."""
+        total_sum = self._read("SELECT COALESCE(SUM(quantity), 0) FROM products")[0][0]
+        return f"Total items of {total_sum} in store"
+
+    def get_all_products(self):
+        """Return a list of all active products."""
+        rows = self._read(f"SELECT {_COLUMNS} FROM products WHERE active = 1 ORDER BY id")
+        return [_product_from_row(row) for row in rows]
+
+    def _rows_by_name(self, names):
+        """Return the first row for each of the given names; call inside a transaction."""
+        names = list(dict.fromkeys(names))
+        rows_by_name = {}
+        for start in range(0, len(names), _NAMES_PER_QUERY):
+            chunk = names[start:start + _NAMES_PER_QUERY]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self._connection.execute(
+                f"SELECT {_COLUMNS} FROM products WHERE name IN ({placeholders}) ORDER BY id", chunk)
+            for row in rows:
+                rows_by_name.setdefault(row[1], row)
+        return rows_by_name
+
+    def checkout(self, shopping_list):
+        """Process an order in one database transaction and return its OrderResult.
+
+        Stock, prices and promotions are read from the database inside the
+        transaction, so concurrent orders from other processes cannot oversell.
+        The products passed in are updated to the new stock levels.
+        """
+        with self._transaction() as connection:
+            rows_by_name = self._rows_by_name(product.name for product, _ in shopping_list)
+            current_lines = []
+            requested = {}
+            for product, quantity in shopping_list:
+                row = rows_by_name.get(product.name)
+                if row is None or not row[6]:
+                    raise Exception(f"Product {product.name} is not available!")
+                requested[row[0]] = requested.get(row[0], 0) + quantity
+                if row[2] != KIND_NON_STOCKED and row[4] < requested[row[0]]:
+                    raise Exception(f"Not enough {product.name} in stock!")
+                current_lines.append((_product_from_row(row), quantity))
+
+            line_prices = price_lines(current_lines)
+
+            # Non-stocked products have no quantity to take stock from
+            rows_by_id = {row[0]: row for row in rows_by_name.values()}
+            updates = [(quantity, quantity, row_id) for row_id, quantity in requested.items()
+                       if rows_by_id[row_id][2] != KIND_NON_STOCKED]
+            connection.executemany(
+                "UPDATE products SET quantity = quantity - ?, "
+                "active = CASE WHEN quantity - ? <= 0 THEN 0 ELSE active END WHERE id = ?",
+                updates)
+
+        # Bring the caller's product objects in line with the database
+        deactivated = []
+        for product, _ in shopping_list:
+            row = rows_by_name[product.name]
+            if row[2] == KIND_NON_STOCKED:
+                continue
+            remaining = row[4] - requested[row[0]]
+            product.quantity = remaining
+            if remaining <= 0 and product.active:
+                product.deactivate()
+                deactivated.append(product)
+
+        lines = [OrderLine(product, quantity, line_price)
+                 for (product, quantity), line_price in zip(shopping_list, line_prices)]
+        return OrderResult(lines, sum_prices(line_prices), deactivated)
+
+    def order(self, shopping_list, quiet=False):
+        """Process an order and return the total price, printing a summary unless quiet."""
+        result = self.checkout(shopping_list)
+        if not quiet:
+            from receipts import print_order
+            print_order(result)
+        return result.total_price
@@ -1,78 +1,741 @@
-from colorama import Fore, Style
+import math
+import threading
+from collections import namedtuple
+from collections.abc import Sequence
+from bisect import bisect_right
+from itertools import islice
+from time import perf_counter
+import metrics
+from money import Money, exact
 from products import Product, NonStockedProduct
+from pricing import price_lines, sum_prices
+from indexes import PriceIndex, NameTrie
+from reservations import ReservationBook
+
+
+# One priced line of an order: the product, how many were bought and the line price
+OrderLine = namedtuple("OrderLine", ["product", "quantity", "price"])
+
+
+class OrderResult:
+    """Outcome of an order: the priced lines, their total and the products that sold out."""
+
+    def __init__(self, lines, total_price, deactivated_products):
+        self.lines = lines
+        self.total_price = total_price
+        self.deactivated_products = deactivated_products
+
+
+def _cents_at_least(price):
+    """Return the smallest whole number of cents that is not below price."""
+    return price.cents if isinstance(price, Money) else math.ceil(exact(price) * 100)
+
+
+def _cents_at_most(price):
+    """Return the largest whole number of cents that is not above price."""
+    return price.cents if isinstance(price, Money) else math.floor(exact(price) * 100)
+
+
+class ProductPage:
+    """One page of a product listing; pass next_cursor back to get the following page."""
+
+    def __init__(self, products, next_cursor):
+        self.products = products
+        self.next_cursor = next_cursor  # None on the last page
+
+    def render(self):
+        """Yield the display line of each product, formatted only when consumed."""
+        for product in self.products:
+            yield product.show()
+
+
+class ProductsView(Sequence):
+    """Read-only, live sequence of a store's products in the order they were added.
+
+    The view follows later additions and removals. It cannot be changed
+    itself; use Store.add_product and Store.remove_product instead.
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def _products(self):
+        return self._store._product_tuple()
+
+    def __len__(self):
+        return len(self._products())
+
+    def __getitem__(self, index):
+        return self._products()[index]
+
+    def __iter__(self):
+        return iter(self._products())
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return list(self._products()) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"ProductsView({list(self._products())!r})"
+
 
 class Store:
     """Manages a collection of products in a store."""
 
-    def __init__(self, products):
+    def __init__(self, products=None):
         """Initialize store with optional product list."""
-        self.products = products if products is not None else []
+        # Products are indexed by identity (kept in insertion order) and by
+        # name, so lookups and removals don't have to walk the whole catalog.
+        self._products_by_id = {}
+        self._products_by_name = {}
+        self._names_version = 0  # See names_version
+        self._products_tuple = None  # Cached for ProductsView, rebuilt after changes
+        # Aggregates kept up to date by product observers (see _on_product_changed)
+        self._total_quantity = 0
+        self._active_products = {}
+        self._active_order_stale = False
+        self._active_tuple = None  # Cached for queries, rebuilt after activation changes
+        # Secondary indexes for filtered listings (see query). Sequence numbers
+        # record the order products were added in and break ties between them.
+        self._sequence = {}
+        self._next_sequence = 0
+        # Sequence numbers in ascending order, for cursor based listings; removed
+        # products leave their number behind until the list is compacted
+        self._sequence_keys = []
+        self._products_by_sequence = {}
+        self._price_index = PriceIndex()
+        # Only the active products, so top-k listings never skip inactive ones
+        self._active_price_index = PriceIndex()
+        self._name_trie = NameTrie()
+        self._products_by_promotion_type = {}
+        self._products_by_kind = {}
+        # Guards the indexes and aggregates above; stock changes made by
+        # order() are serialized per product by the locks in _product_locks
+        self._lock = threading.Lock()
+        # Locks of products in the store, created on first order; products that
+        # are not in the store share one lock instead of leaving entries behind
+        self._product_locks = {}
+        self._unlisted_product_lock = threading.Lock()
+        self._order_listeners = []
+        self._reservations = None  # Created by reservations() on first use
+        if products:
+            with self._lock:
+                for product in products:
+                    self._add_product(product, index_price=False)
+                # Sorted once instead of inserting the products one by one
+                entries = [(product.price.cents, sequence, product)
+                           for sequence, product in self._products_by_sequence.items()]
+                self._price_index = PriceIndex(entries)
+                self._active_price_index = PriceIndex(entry for entry in entries if entry[2].active)
+
+
+    @property
+    def products(self):
+        """Return a read-only, live ProductsView of all products in the order they were added.
+
+        The store keeps its own index of the products, so the list passed to
+        the constructor is not shared with it.
+        """
+        return ProductsView(self)
+
+
+    @property
+    def names_version(self):
+        """A number that changes whenever products are added, removed or renamed.
+
+        Views such as StoreUnion compare it to know when name-based results
+        they cached are stale.
+        """
+        return self._names_version
+
+
+    def _product_tuple(self):
+        products = self._products_tuple
+        if products is None:
+            with self._lock:
+                products = self._products_tuple = tuple(self._products_by_id.values())
+        return products
 
 
     def add_product(self, product):
         """Add a single product to the store."""
-        self.products.append(product)
+        with self._lock:
+            self._add_product(product)
+
+
+    def _add_product(self, product, index_price=True):
+        """Add a product to the store's indexes; call with the store lock held."""
+        if id(product) in self._products_by_id:
+            return
+        # The trie is the one index that inspects the name, so a bad name fails
+        # here before any other index holds the product
+        self._name_trie.add(product.name, id(product), product)
+
+        self._products_by_id[id(product)] = product
+        self._products_tuple = None
+        self._names_version += 1
+        self._products_by_name.setdefault(product.name, {})[id(product)] = product
+
+        self._total_quantity += product.quantity
+        if product.active:
+            self._active_products[id(product)] = product
+            self._active_tuple = None
+
+        sequence = self._next_sequence
+        self._next_sequence += 1
+        self._sequence[id(product)] = sequence
+        self._sequence_keys.append(sequence)
+        self._products_by_sequence[sequence] = product
+        if index_price:
+            self._price_index.add(product.price.cents, sequence, product)
+            if product.active:
+                self._active_price_index.add(product.price.cents, sequence, product)
+        self._products_by_kind.setdefault(type(product), {})[id(product)] = product
+        if product.promotion:
+            self._products_by_promotion_type.setdefault(type(product.promotion), {})[id(product)] = product
+
+        product.add_observer(self._on_product_changed)
 
 
     def remove_product(self, product):
         """Remove specified product if it exists in the store."""
-        if product in self.products:
-            self.products.remove(product)
+        with self._lock:
+            if self._products_by_id.pop(id(product), None) is None:
+                return
+            self._products_tuple = None
+            self._names_version += 1
+
+            same_name = self._products_by_name[product.name]
+            del same_name[id(product)]
+            if not same_name:
+                del self._products_by_name[product.name]
+
+            product.remove_observer(self._on_product_changed)
+            self._total_quantity -= product.quantity
+            was_active = self._active_products.pop(id(product), None) is not None
+            if was_active:
+                self._active_tuple = None
+            self._product_locks.pop(self.lock_key(product), None)
+
+            sequence = self._sequence.pop(id(product))
+            del self._products_by_sequence[sequence]
+            if len(self._sequence_keys) > 2 * len(self._products_by_sequence) + 64:
+                self._sequence_keys = [key for key in self._sequence_keys if key in self._products_by_sequence]
+            self._price_index.remove(product.price.cents, sequence)
+            if was_active:
+                self._active_price_index.remove(product.price.cents, sequence)
+            self._name_trie.remove(product.name, id(product))
+            self._discard_from_bucket(self._products_by_kind, type(product), product)
+            if product.promotion:
+                self._discard_from_bucket(self._products_by_promotion_type, type(product.promotion), product)
+
+
+    @staticmethod
+    def _discard_from_bucket(buckets, key, product):
+        bucket = buckets.get(key)
+        if bucket is not None:
+            bucket.pop(id(product), None)
+            if not bucket:
+                del buckets[key]
+
+
+    def get_product(self, name):
+        """Return the first product added with the given name, or None."""
+        same_name = self._products_by_name.get(name)
+        if not same_name:
+            return None
+        return next(iter(same_name.values()))
+
+
+    def has_product(self, product):
+        """Check whether this exact product instance is in the store."""
+        return id(product) in self._products_by_id
+
+
+    def product_names(self):
+        """Return a live set-like view of the names of all products in the store."""
+        return self._products_by_name.keys()
+
+
+    def get_products_named(self, name):
+        """Return all products with the given name, in the order they were added."""
+        return list(self._products_by_name.get(name, {}).values())
+
+
+    def _on_product_changed(self, product, attribute, old_value, new_value):
+        """Keep the aggregates and indexes in sync with a product."""
+        with self._lock:
+            if attribute == "name":
+                self._names_version += 1
+                same_name = self._products_by_name[old_value]
+                del same_name[id(product)]
+                if not same_name:
+                    del self._products_by_name[old_value]
+                same_name = self._products_by_name.setdefault(new_value, {})
+                same_name[id(product)] = product
+                if len(same_name) > 1:
+                    # get_product returns the first product added, so keep catalog order
+                    self._products_by_name[new_value] = dict(
+                        sorted(same_name.items(), key=lambda item: self._sequence[item[0]]))
+                self._name_trie.remove(old_value, id(product))
+                self._name_trie.add(new_value, id(product), product)
+            elif attribute == "price":
+                sequence = self._sequence[id(product)]
+                self._price_index.remove(old_value.cents, sequence)
+                self._price_index.add(new_value.cents, sequence, product)
+                if id(product) in self._active_products:
+                    self._active_price_index.remove(old_value.cents, sequence)
+                    self._active_price_index.add(new_value.cents, sequence, product)
+            elif attribute == "promotion":
+                if old_value:
+                    self._discard_from_bucket(self._products_by_promotion_type, type(old_value), product)
+                if new_value:
+                    self._products_by_promotion_type.setdefault(type(new_value), {})[id(product)] = product
+            elif attribute == "quantity":
+                self._total_quantity += new_value - old_value
+            elif attribute == "active":
+                self._active_tuple = None
+                sequence = self._sequence[id(product)]
+                if new_value:
+                    if id(product) not in self._active_products:
+                        self._active_price_index.add(product.price.cents, sequence, product)
+                    self._active_products[id(product)] = product
+                    # Reactivated products land at the end of the dict, so the
+                    # catalog order has to be restored on the next listing
+                    self._active_order_stale = True
+                elif self._active_products.pop(id(product), None) is not None:
+                    self._active_price_index.remove(product.price.cents, sequence)
+
+
+    def total_quantity(self):
+        """Return the total of all product quantities as a number."""
+        return self._total_quantity
 
 
     def get_total_quantity(self):
-        """Calculate and return formatted total of all product quantities."""
-        total_sum = sum(product.quantity for product in self.products)
-        return f"Total items of {total_sum} in store"
+        """Return formatted total of all product quantities."""
+        return f"Total items of {self.total_quantity()} in store"
 
 
     def get_all_products(self):
         """Return a list of all active products."""
-        return [product for product in self.products if product.active]
+        with self._lock:
+            return list(self._ordered_active_products())
 
-    def order(self, shopping_list):
-        """Process an order based on a shopping list and return the total price."""
-        total_price = 0
-        order_details = []
-        products_to_deactivate = []
 
-        # First check all products are available and quantities are sufficient
-        for product, quantity in shopping_list:
+    def _ordered_active_products(self):
+        """Return the active products in catalog order; call with the store lock held."""
+        if self._active_order_stale:
+            self._active_products = {key: product for key, product in self._products_by_id.items()
+                                     if product.active}
+            self._active_order_stale = False
+        return self._active_products.values()
+
+
+    def query(self, min_price=None, max_price=None, promotion_type=None, kind=None,
+              name_prefix=None, active_only=True, offset=0, limit=None):
+        """Return the products matching every given filter, one page at a time.
+
+        promotion_type and kind are matched against the exact class of the
+        promotion and of the product. offset skips that many matches and limit
+        caps the page size. The most selective index drives the search, so
+        matches come in name order for a name_prefix, in price order for a
+        price range and in catalog order otherwise.
+        """
+        # Only picking the candidates needs the lock; they are filtered without it
+        with self._lock:
+            candidates = self._query_candidates(min_price, max_price, promotion_type, kind,
+                                                name_prefix, active_only)
+        matches = (product for product in candidates
+                   if (min_price is None or product.price >= min_price)
+                   and (max_price is None or product.price <= max_price)
+                   and (promotion_type is None or type(product.promotion) is promotion_type)
+                   and (kind is None or type(product) is kind)
+                   and (name_prefix is None or product.name.startswith(name_prefix))
+                   and (not active_only or product.active))
+        return list(islice(matches, offset, None if limit is None else offset + limit))
+
+
+    def iter_products(self, cursor=None, active_only=True):
+        """Yield products in catalog order, starting after the given cursor.
+
+        Products are looked up one at a time as the generator is consumed, so
+        taking the first n costs O(log N + n) no matter how large the store is.
+        Yields (cursor, product) pairs; a cursor stays valid when products are
+        added or removed.
+        """
+        with self._lock:
+            keys = self._sequence_keys
+            position = 0 if cursor is None else bisect_right(keys, cursor)
+        while True:
+            with self._lock:
+                # Pick up a compacted key list if the store changed in between
+                if keys is not self._sequence_keys:
+                    keys = self._sequence_keys
+                    position = 0 if cursor is None else bisect_right(keys, cursor)
+                if position >= len(keys):
+                    return
+                cursor = keys[position]
+                product = self._products_by_sequence.get(cursor)
+            position += 1
+            if product is not None and (product.active or not active_only):
+                yield cursor, product
+
+
+    def list_products(self, cursor=None, page_size=20, active_only=True):
+        """Return a ProductPage of up to page_size products after the cursor."""
+        entries = list(islice(self.iter_products(cursor, active_only), page_size + 1))
+        products = [product for _, product in entries[:page_size]]
+        next_cursor = entries[page_size - 1][0] if len(entries) > page_size else None
+        return ProductPage(products, next_cursor)
+
+
+    def cheapest(self, k, active_only=True):
+        """Return the k cheapest products, cheapest first, straight from the price index.
+
+        Active products have an index of their own, so no inactive products
+        are skipped on the way, however many there are.
+        """
+        with self._lock:
+            index = self._active_price_index if active_only else self._price_index
+            return list(islice(index.products(), k))
+
+
+    def most_expensive(self, k, active_only=True):
+        """Return the k most expensive products, most expensive first."""
+        with self._lock:
+            index = self._active_price_index if active_only else self._price_index
+            return list(islice(index.products(reverse=True), k))
+
+
+    def _query_candidates(self, min_price, max_price, promotion_type, kind, name_prefix, active_only):
+        """Return the products a query has to look at, from the narrowest index.
+
+        Called with the store lock held; the result can be iterated after the
+        lock is released.
+        """
+        if name_prefix is not None:
+            return list(self._name_trie.with_prefix(name_prefix))
+        if min_price is not None or max_price is not None:
+            index = self._active_price_index if active_only else self._price_index
+            return index.products(None if min_price is None else _cents_at_least(min_price),
+                                              None if max_price is None else _cents_at_most(max_price))
+        if promotion_type is not None:
+            return list(self._products_by_promotion_type.get(promotion_type, {}).values())
+        if kind is not None:
+            return list(self._products_by_kind.get(kind, {}).values())
+        if active_only:
+            if self._active_tuple is None:
+                self._active_tuple = tuple(self._ordered_active_products())
+            return self._active_tuple
+        if self._products_tuple is None:
+            self._products_tuple = tuple(self._products_by_id.values())
+        return self._products_tuple
+
+
+    def lock_key(self, product):
+        """Return the key identifying a product's lock; keys also fix the locking order."""
+        return id(product)
+
+
+    def lock_products(self, products):
+        """Lock each distinct product, in ascending key order to avoid deadlocks.
+
+        Returns the locks; pass them to unlock_products when done. Products
+        that are not in the store are serialized by a shared lock, taken after
+        all the others. Orders and reservations lock their products this way.
+        """
+        with self._lock:
+            keys = set()
+            unlisted = False
+            for product in products:
+                if self.has_product(product):
+                    keys.add(self.lock_key(product))
+                else:
+                    unlisted = True
+            locks = [self._product_locks.setdefault(key, threading.Lock()) for key in sorted(keys)]
+            if unlisted:
+                locks.append(self._unlisted_product_lock)
+
+        for lock in locks:
+            lock.acquire()
+        return locks
+
+
+    def lock_all_products(self):
+        """Lock every product, and the lock shared by products outside the store; return the locks.
+
+        No order, hold or replay can run until unlock_products releases them,
+        and orders already running finish first. Products added meanwhile are
+        not covered.
+        """
+        locks = self.lock_products(self.products)
+        self._unlisted_product_lock.acquire()
+        return locks + [self._unlisted_product_lock]
+
+
+    def unlock_products(self, locks):
+        """Release the locks returned by lock_products."""
+        for lock in reversed(locks):
+            lock.release()
+
+
+    def check_stock(self, shopping_list, holds=()):
+        """Raise if a product is inactive or lacks stock; authoritative only while the products are locked.
+
+        Stock held by reservations is not available, except for the given holds,
+        which belong to this order. Holds that have expired meanwhile no longer
+        keep stock aside, so their lines only fail if the stock is gone.
+        """
+        keys = [self.lock_key(product) for product, _ in shopping_list]
+        reservations = self._reservations
+        held = reservations._held_by_others(keys, holds) if reservations is not None else None
+        # Products that appear on several lines are checked against their combined quantity
+        requested = {}
+        for (product, quantity), key in zip(shopping_list, keys):
+            requested[key] = requested.get(key, 0) + quantity
             if not product.is_active():
-                raise Exception(Fore.RED + f"Product {product.name} is not available!" + Style.RESET_ALL)
-            if product.quantity < quantity and not isinstance(product, NonStockedProduct):
-                raise Exception(Fore.RED + f"Not enough {product.name} in stock!" + Style.RESET_ALL)
+                raise Exception(f"Product {product.name} is not available!")
+            available = product.quantity
+            if held is not None:
+                available -= held[key]
+            if available < requested[key] and not isinstance(product, NonStockedProduct):
+                if metrics.enabled:
+                    metrics.recorder.record_stockout(product)
+                raise Exception(f"Not enough {product.name} in stock!")
+
 
-        # Process all products without deactivating any during the process
+    def _stock_deltas(self, shopping_list):
+        """Combine the lines of a shopping list into one (product, quantity) delta per product."""
+        # Non-stocked products have no quantity to take stock from
+        deltas = {}
         for product, quantity in shopping_list:
-            # Save original quantity for later
-            original_quantity = product.quantity
+            if not isinstance(product, NonStockedProduct):
+                key = self.lock_key(product)
+                deltas[key] = (product, deltas[key][1] + quantity if key in deltas else quantity)
+        return list(deltas.values())
 
-            # Calculate price but don't deactivate the product yet
-            if product.promotion:
-                item_price = product.promotion.apply_promotion(product, quantity)
-            else:
-                item_price = quantity * product.price
 
-            # Update quantity without deactivating
+    def _checkout(self, shopping_list, holds=()):
+        """Check, price and apply a shopping list as one unit.
+
+        Returns the line prices and the products that sold out. The given
+        reservation holds count as available stock and are used up by the order.
+
+        Safe to call from many threads: the ordered products stay locked from
+        the stock check until their quantities are updated. Nothing is changed
+        unless every line can be checked and priced.
+        """
+        return checkout_across([(self, shopping_list, holds)], shopping_list)
+
+
+    def add_order_listener(self, callback):
+        """Register callback(shopping_list), called for every order accepted by the store.
+
+        Callbacks run once the order is checked and priced but before its stock
+        changes are applied; if one raises, the order fails and nothing is
+        changed. The ordered products stay locked meanwhile, so callbacks see
+        orders of the same product in the order they are applied.
+        """
+        self._order_listeners.append(callback)
+
+
+    def apply_order(self, shopping_list):
+        """Apply the stock changes of an order that was already accepted, e.g. one replayed from a log.
+
+        Nothing is checked or priced and no listeners are called. Returns the
+        products that sold out.
+        """
+        locks = self.lock_products(product for product, _ in shopping_list)
+        try:
+            return _apply_quantity_deltas(self._stock_deltas(shopping_list))
+        finally:
+            self.unlock_products(locks)
+
+
+    def transaction(self):
+        """Start an OrderTransaction on this store."""
+        return OrderTransaction(self)
+
+
+    def reservations(self):
+        """Return the store's ReservationBook, creating it on first use.
+
+        Once it exists, stock held by its reservations is no longer available
+        to orders that do not own the holds.
+        """
+        with self._lock:
+            if self._reservations is None:
+                self._reservations = ReservationBook(self)
+            return self._reservations
+
+
+    def checkout(self, shopping_list, holds=()):
+        """Process an order without any output and return its OrderResult.
+
+        The order is applied completely or not at all. holds are reservations
+        made for this order; their stock is used up by it.
+        """
+        line_prices, deactivated = self._checkout(shopping_list, holds)
+        lines = [OrderLine(product, quantity, line_price)
+                 for (product, quantity), line_price in zip(shopping_list, line_prices)]
+        return OrderResult(lines, sum_prices(line_prices), deactivated)
+
+
+    def order(self, shopping_list, quiet=False, holds=()):
+        """Process an order based on a shopping list and return the total price.
+
+        Prints an order summary unless quiet is set; quiet orders skip all
+        formatting and only pay for checking, pricing and updating stock.
+        holds are reservations made for this order, e.g. the holds of a Cart.
+        """
+        if quiet:
+            line_prices, _ = self._checkout(shopping_list, holds)
+            return sum_prices(line_prices)
+
+        # Imported here so that headless callers never load the console renderer
+        from receipts import print_order
+
+        result = self.checkout(shopping_list, holds)
+        print_order(result)
+        return result.total_price
+
+
+def _apply_quantity_deltas(deltas):
+    """Subtract (product, quantity) deltas in one batch and return the products that sold out.
+
+    If any write fails, every product is restored before the error is raised.
+    """
+    previous = [(product, product.quantity, product.active) for product, _ in deltas]
+    deactivated = []
+    try:
+        for product, quantity in deltas:
             product.quantity -= quantity
+        # Deactivate only once all quantities are written
+        for product, _ in deltas:
+            if product.quantity <= 0:
+                product.deactivate()
+                deactivated.append(product)
+    except Exception:
+        for product, quantity, active in previous:
+            product.quantity = quantity
+            product.active = active
+        raise
+    return deactivated
+
+
+def checkout_across(parts, shopping_list):
+    """Check, price and apply an order split over several stores as one unit.
+
+    parts are (store, lines, holds) triples that together make up
+    shopping_list; every line is handled by its own store. Returns the prices
+    of the shopping list's lines and the products that sold out.
+
+    Each store locks its ordered products from the stock check until their
+    quantities are updated, so orders placed in the stores directly see this
+    order like one of their own. Stores are locked one after the other,
+    always in the same order, so two orders spanning the same stores cannot
+    deadlock. Nothing is changed unless every line can be checked and priced.
+    """
+    started = perf_counter() if metrics.enabled else None
+    parts = sorted(parts, key=lambda part: id(part[0]))
+    locked = []
+    try:
+        for store, lines, _ in parts:
+            locked.append((store, store.lock_products(product for product, _ in lines)))
+        for store, lines, holds in parts:
+            store.check_stock(lines, holds)
+
+        # Price all lines up front; large orders are priced in one batch per promotion type
+        line_prices = price_lines(shopping_list)
+
+        # Listeners such as the order log see the order before any stock
+        # changes, so one that fails rejects the order with nothing applied
+        for store, lines, _ in parts:
+            for callback in store._order_listeners:
+                callback(lines)
+        deltas = [delta for store, lines, _ in parts for delta in store._stock_deltas(lines)]
+        deactivated = _apply_quantity_deltas(deltas)
+        for store, _, holds in parts:
+            if holds:
+                store._reservations._consume(holds)
+    except Exception:
+        if started is not None:
+            metrics.recorder.record_failed_order(perf_counter() - started)
+        raise
+    finally:
+        for store, locks in reversed(locked):
+            store.unlock_products(locks)
+
+    if started is not None:
+        metrics.recorder.record_order(shopping_list, deactivated, perf_counter() - started)
+    return line_prices, deactivated
+
+
+class OrderTransaction:
+    """Collects order lines on a Store and applies them together or not at all.
+
+    Lines are checked when they are reserved and checked again when the
+    transaction commits, because other orders may have taken stock since.
+    Used as a context manager, the transaction commits on a clean exit and
+    aborts when the block raises.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.lines = []
+        self.state = "open"
+        self._requested = {}
+
+
+    def reserve(self, product, quantity):
+        """Add a line to the transaction after checking it against current stock."""
+        if self.state != "open":
+            raise Exception(f"Transaction is already {self.state}!")
+        if quantity <= 0:
+            raise Exception("Quantity to buy must be at least 1!")
+
+        # Check the product's combined quantity without re-checking earlier lines
+        key = self.store.lock_key(product)
+        requested = self._requested.get(key, 0) + quantity
+        self.store.check_stock([(product, requested)])
+        self._requested[key] = requested
+        self.lines.append((product, quantity))
+
+
+    def commit(self):
+        """Apply all reserved lines in one batch and return the total price."""
+        if self.state != "open":
+            raise Exception(f"Transaction is already {self.state}!")
+
+        try:
+            line_prices, _ = self.store._checkout(self.lines)
+        except Exception:
+            self.abort()
+            raise
+
+        self.state = "committed"
+        return sum_prices(line_prices)
 
-            # If this purchase would zero out the product, mark it for deactivation later
-            if product.quantity <= 0 and not isinstance(product, NonStockedProduct):
-                products_to_deactivate.append(product)
 
-            total_price += item_price
-            order_details.append(Fore.BLUE + f"{quantity} * {product.name} for {product.price}€")
+    def abort(self):
+        """Drop all reserved lines without touching the store."""
+        if self.state == "open":
+            self.lines = []
+            self._requested = {}
+            self.state = "aborted"
 
-        # Print order summary
-        for detail in order_details:
-            print(detail)
 
-        print(f"_____________________________________")
-        print(f"Total price: {total_price:.2f} €" + Style.RESET_ALL)
+    def __enter__(self):
+        return self
 
-        # Now deactivate products that should be deactivated
-        for product in products_to_deactivate:
-            product.deactivate()
 
-        return total_price
\ No newline at end of file
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        elif self.state == "open":
+            self.commit()
+        return False
@@ -1,35 +1,177 @@
 from products import Product
+from pricing import sum_prices
+import stores
 
-class Store:
-    def __init__(self, products=None):
-        self.products = products or []
-
-    def add_product(self, product):
-        """Add a product to the store."""
-        self.products.append(product)
-
-    def remove_product(self, product):
-        """Remove a product from the store."""
-        if product in self.products:
-            self.products.remove(product)
 
+class Store(stores.Store):
     def __contains__(self, item):
         """Check if a product exists in the store using 'in' operator."""
         if isinstance(item, Product):
-            return item in self.products
+            return self.has_product(item)
         elif isinstance(item, str):
             # Also allow checking by product name
-            return any(p.name == item for p in self.products)
+            return self.get_product(item) is not None
+        return False
+
+    def __add__(self, other):
+        """Combine two stores using '+' operator into a StoreUnion view."""
+        if isinstance(other, (Store, StoreUnion)):
+            return StoreUnion([self, other])
+        return NotImplemented
+
+    def materialize(self):
+        """Return the store itself; StoreUnion offers the same method."""
+        return self
+
+
+class StoreUnion:
+    """A live view over several stores, as if they were one.
+
+    Nothing is copied: lookups, totals and listings are answered by the
+    member stores' indexes. Products are de-duplicated by name; when several
+    members have products with the same name, the earliest member wins and
+    the others' products with that name are hidden. materialize() builds a
+    real Store holding the visible products when one is needed.
+
+    Changes are passed on to the members: add_product adds to the first
+    member and remove_product removes from the member holding the product.
+    Orders may mix products of several members; each line is checked and
+    applied by the member holding its product, under that member's locks and
+    reservations, and the order as a whole is applied completely or not at all.
+    """
+
+    def __init__(self, members):
+        self.members = []
+        for member in members:
+            # Nested unions are flattened, so a + b + c has three members
+            if isinstance(member, StoreUnion):
+                self.members.extend(member.members)
+            else:
+                self.members.append(member)
+        # Shadowed names per member, valid while the members' names_version match
+        self._shadowed = None
+        self._shadowed_versions = None
+
+    def _owner(self, name):
+        """Return the index of the first member with a product of that name, or None."""
+        for index, member in enumerate(self.members):
+            if name in member.product_names():
+                return index
+        return None
+
+    def _is_visible(self, index, product):
+        return self._owner(product.name) == index
+
+    def get_product(self, name):
+        """Return the product of that name from the first member that has one."""
+        index = self._owner(name)
+        return None if index is None else self.members[index].get_product(name)
+
+    def __contains__(self, item):
+        """Check if a visible product or product name is in the union."""
+        if isinstance(item, Product):
+            index = self._owner(item.name)
+            return index is not None and self.members[index].has_product(item)
+        elif isinstance(item, str):
+            return self._owner(item) is not None
         return False
 
     def __add__(self, other):
-        """Combine two stores using '+' operator."""
-        if isinstance(other, Store):
-            new_store = Store()
-            # Add products from both stores
-            for product in self.products:
-                new_store.add_product(product)
-            for product in other.products:
-                new_store.add_product(product)
-            return new_store
-        return NotImplemented
\ No newline at end of file
+        """Extend the union with another store or union."""
+        if isinstance(other, (Store, StoreUnion)):
+            return StoreUnion([self, other])
+        return NotImplemented
+
+    def add_product(self, product):
+        """Add a product to the first member; it hides same-named products of later members."""
+        self.members[0].add_product(product)
+
+    def remove_product(self, product):
+        """Remove the product from the member that holds it."""
+        for member in self.members:
+            if member.has_product(product):
+                member.remove_product(product)
+
+    def _checkout(self, shopping_list):
+        """Split an order by the members holding its products and apply it as one unit."""
+        parts = {}
+        for product, quantity in shopping_list:
+            member = next((member for member in self.members if member.has_product(product)), None)
+            if member is None:
+                raise Exception(f"Product {product.name} is not available!")
+            parts.setdefault(id(member), (member, []))[1].append((product, quantity))
+        return stores.checkout_across([(member, lines, ()) for member, lines in parts.values()],
+                                      shopping_list)
+
+    def checkout(self, shopping_list):
+        """Process an order without any output and return its OrderResult."""
+        line_prices, deactivated = self._checkout(shopping_list)
+        lines = [stores.OrderLine(product, quantity, line_price)
+                 for (product, quantity), line_price in zip(shopping_list, line_prices)]
+        return stores.OrderResult(lines, sum_prices(line_prices), deactivated)
+
+    def order(self, shopping_list, quiet=False):
+        """Process an order and return the total price, printing a summary unless quiet is set."""
+        if quiet:
+            line_prices, _ = self._checkout(shopping_list)
+            return sum_prices(line_prices)
+
+        from receipts import print_order
+
+        result = self.checkout(shopping_list)
+        print_order(result)
+        return result.total_price
+
+    def _shadowed_names(self, index):
+        """Return the names in a member that an earlier member already provides.
+
+        Recomputed only after a member has added, removed or renamed products.
+        """
+        versions = [member.names_version for member in self.members]
+        if versions != self._shadowed_versions:
+            shadowed = []
+            for position, member in enumerate(self.members):
+                names = member.product_names()
+                hidden = set()
+                for earlier in self.members[:position]:
+                    hidden |= names & earlier.product_names()
+                shadowed.append(hidden)
+            self._shadowed = shadowed
+            self._shadowed_versions = versions
+        return self._shadowed[index]
+
+    @property
+    def products(self):
+        """Return the visible products of all members, member by member."""
+        return [product for index, member in enumerate(self.members) for product in member.products
+                if self._is_visible(index, product)]
+
+    def get_all_products(self):
+        """Return the visible active products of all members."""
+        return [product for index, member in enumerate(self.members) for product in member.get_all_products()
+                if self._is_visible(index, product)]
+
+    def total_quantity(self):
+        """Return the total quantity of the visible products.
+
+        Each member's total comes from its own running total; only products
+        hidden behind an earlier member's product are subtracted again.
+        """
+        total = 0
+        for index, member in enumerate(self.members):
+            total += member.total_quantity()
+            for name in self._shadowed_names(index):
+                total -= sum(product.quantity for product in member.get_products_named(name))
+        return total
+
+    def get_total_quantity(self):
+        """Return formatted total quantity of the visible products."""
+        return f"Total items of {self.total_quantity()} in store"
+
+    def materialize(self):
+        """Return a new Store holding the visible products (the product objects are shared).
+
+        The new store has its own locks and no reservations, so orders for the
+        shared products belong in the union or its members, not in the copy.
+        """
+        return Store(self.products)
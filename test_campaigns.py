@@ -0,0 +1,44 @@
+import pytest
+
+from campaigns import simulate_campaigns
+from products import Product, NonStockedProduct, SecondHalfPrice, ThirdOneFree, PercentDiscount
+from stores import Store
+
+
+def build_store():
+    product_list = [Product(f"Product {i}", price=10 * (i + 1), quantity=5) for i in range(10)]
+    product_list.append(NonStockedProduct("Windows License", price=100))
+    product_list[0].set_promotion(ThirdOneFree("Third One Free!"))
+    return Store(product_list)
+
+
+class TestCampaigns:
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_campaign_revenue(self, workers):
+        """Test that every campaign is quoted across the whole catalog."""
+        store = build_store()
+        candidates = {
+            "none": None,
+            "half": SecondHalfPrice("Second Half price!"),
+            "third": ThirdOneFree("Third One Free!"),
+            "percent": PercentDiscount("10% off!", percent=10),
+        }
+
+        quotes = simulate_campaigns(store, candidates, quantity=3, workers=workers, chunk_size=4)
+
+        list_price = 3 * (sum(10 * (i + 1) for i in range(10)) + 100)
+        assert [quote.name for quote in quotes] == ["none", "half", "third", "percent"]
+        assert quotes[0].revenue == list_price
+        assert quotes[1].revenue == list_price * 2.5 / 3
+        assert quotes[2].revenue == list_price * 2 / 3
+        assert quotes[3].revenue == pytest.approx(list_price * 0.9)
+        # The first product already has Third One Free, so the baseline is lower
+        assert quotes[0].baseline_revenue == list_price - 10
+        assert quotes[0].revenue_change == 10
+
+    def test_stock_is_not_changed(self):
+        # Quoting a campaign never buys anything
+        store = build_store()
+        simulate_campaigns(store, {"half": SecondHalfPrice("Half")}, quantity=5, workers=1)
+        assert store.get_total_quantity() == "Total items of 50 in store"
@@ -0,0 +1,122 @@
+from fractions import Fraction
+
+from catalog_io import read_csv, read_jsonl, write_csv, write_jsonl, import_products, load_into_store
+from products import Product, NonStockedProduct, LimitedProduct, SecondHalfPrice, ThirdOneFree, PercentDiscount
+from promotion_engine import PromotionEngine
+from stores import Store
+
+
+def build_products():
+    earbuds = Product("Bose QuietComfort Earbuds", price=250, quantity=500)
+    earbuds.set_promotion(ThirdOneFree("Third One Free!"))
+    license = NonStockedProduct("Windows License", price=125)
+    license.set_promotion(PercentDiscount("30% off!", percent=30))
+    return [earbuds, license, LimitedProduct("Shipping", price=10, quantity=250, maximum=1)]
+
+
+class TestCatalogIO:
+
+    def test_csv_and_jsonl_round_trip(self, tmp_path):
+        """Test that exported products are imported back unchanged."""
+        expected = [product.show() for product in build_products()]
+
+        for write, read, filename in [(write_csv, read_csv, "feed.csv"), (write_jsonl, read_jsonl, "feed.jsonl")]:
+            path = tmp_path / filename
+            assert write(build_products(), path) == 3
+
+            batches = list(import_products(read(path)))
+            products = [product for batch in batches for product in batch.products]
+
+            assert [product.show() for product in products] == expected
+            assert all(not batch.errors for batch in batches)
+
+    def test_engine_pricing_plans_round_trip(self, tmp_path):
+        """Test that promotions compiled by the PromotionEngine are exported and price the same after import."""
+        earbuds, license, shipping = build_products()
+        engine = PromotionEngine()
+        engine.add_rule(earbuds, SecondHalfPrice("Second Half price!"), priority=1)
+        engine.add_rule(earbuds, PercentDiscount("12.5% off!", percent=12.5))
+        # A third off has no decimal form and is written as 100/3
+        engine.add_rule(license, PercentDiscount("A third off", percent=Fraction(100, 3)))
+
+        for write, read, filename in [(write_csv, read_csv, "feed.csv"), (write_jsonl, read_jsonl, "feed.jsonl")]:
+            path = tmp_path / filename
+            write([earbuds, license], path)
+
+            batch = next(import_products(read(path)))
+
+            assert not batch.errors
+            for product, loaded in zip([earbuds, license], batch.products):
+                assert loaded.show() == product.show()
+                assert [loaded.get_price(quantity) for quantity in range(1, 8)] == \
+                    [product.get_price(quantity) for quantity in range(1, 8)]
+
+    def test_bad_rows_are_reported_per_batch(self):
+        # Invalid rows are collected as errors and the remaining rows still load
+        rows = [
+            {"name": "MacBook Air M2", "price": "1450", "quantity": "100"},
+            {"name": "", "price": "10", "quantity": "1"},
+            {"name": "Pixel", "price": "500", "quantity": "1", "promotion": "buy_one_get_two"},
+            {"name": "Shipping", "kind": "limited", "price": "10", "quantity": "250", "maximum": "1",
+             "promotion": "percent_discount", "percent": "10"},
+        ]
+        store = Store()
+
+        report = load_into_store(store, rows, batch_size=2)
+
+        assert report.imported == 2
+        assert report.errors == [(2, "Product name cannot be empty!"), (3, "Unknown promotion buy_one_get_two!")]
+        assert [product.name for product in store.products] == ["MacBook Air M2", "Shipping"]
+        assert store.get_product("Shipping").promotion.percent == 10
+
+    def test_rows_with_wrong_types_are_reported(self, tmp_path):
+        """Test that JSON values of the wrong type fail their row instead of the import."""
+        path = tmp_path / "feed.jsonl"
+        path.write_text('{"name": 123, "price": "10", "quantity": 1}\n'
+                        '{"name": "Pixel", "price": "500", "quantity": 1.7}\n'
+                        '{"name": "Shipping", "price": "10", "quantity": true}\n'
+                        '{"name": "MacBook Air M2", "price": "1450", "quantity": 100.0}\n')
+        store = Store()
+
+        report = load_into_store(store, read_jsonl(path))
+
+        assert report.errors == [(1, "Invalid product name 123!"), (2, "Invalid whole number 1.7!"),
+                                 (3, "Invalid whole number True!")]
+        assert store.query(name_prefix="") == [store.get_product("MacBook Air M2")]
+        assert store.get_product("MacBook Air M2").quantity == 100
+
+    def test_inactive_products_stay_inactive(self, tmp_path):
+        pixel = Product("Google Pixel 7", price=500, quantity=10)
+        pixel.deactivate()
+
+        for write, read, filename in [(write_csv, read_csv, "feed.csv"), (write_jsonl, read_jsonl, "feed.jsonl")]:
+            path = tmp_path / filename
+            write([pixel, Product("Shipping", price=10, quantity=250)], path)
+
+            products = next(import_products(read(path))).products
+
+            assert [product.active for product in products] == [False, True]
+
+    def test_promotions_are_shared_between_rows(self):
+        """Test that rows with the same promotion get the same promotion object."""
+        rows = [{"name": f"Product {i}", "price": "10", "quantity": "1",
+                 "promotion": "third_one_free", "promotion_name": "Third One Free!"} for i in range(3)]
+
+        products = next(import_products(rows)).products
+
+        assert products[0].promotion is products[1].promotion is products[2].promotion
+
+    def test_malformed_jsonl_lines_are_reported(self, tmp_path):
+        path = tmp_path / "feed.jsonl"
+        path.write_text('{"name": "MacBook Air M2", "price": "1450", "quantity": "100"}\n'
+                        '\n'
+                        '{"name": "Pixel", "price": \n'
+                        '["not", "a", "row"]\n'
+                        '{"name": "Shipping", "price": "10", "quantity": "250"}\n')
+
+        batch, = import_products(read_jsonl(path))
+
+        assert [product.name for product in batch.products] == ["MacBook Air M2", "Shipping"]
+        assert [row_number for row_number, _ in batch.errors] == [2, 3]
+        assert batch.errors[0][1].startswith("Invalid JSON on line 3:")
+        assert batch.errors[1][1] == "Line 4 is not a JSON object!"
@@ -0,0 +1,99 @@
+import pytest
+from event_store import EventSourcedInventory
+from products import Product, NonStockedProduct, LimitedProduct, SecondHalfPrice, PercentDiscount
+
+
+def fill(inventory):
+    inventory.add_product(Product("MacBook Air M2", price=1450, quantity=10))
+    inventory.add_product(NonStockedProduct("Windows License", price=125))
+    inventory.add_product(LimitedProduct("Shipping", price=10, quantity=250, maximum=1))
+
+
+def state(inventory):
+    return [product.show() for product in inventory.store.products]
+
+
+class TestEventSourcedInventory:
+
+    def test_events_rebuild_the_projection(self, tmp_path):
+        log_path, snapshot_path = tmp_path / "events.log", tmp_path / "inventory.snap"
+        with EventSourcedInventory(log_path, snapshot_path) as inventory:
+            fill(inventory)
+            inventory.set_promotion("MacBook Air M2", SecondHalfPrice("Second Half price!"))
+            assert inventory.order([("MacBook Air M2", 10), ("Shipping", 1)]) == 5 * 1450 + 5 * 725 + 10
+            assert not inventory.get_product("MacBook Air M2").is_active()
+            inventory.restock("MacBook Air M2", 4)
+            inventory.remove_product("Shipping")
+            expected = state(inventory)
+
+        assert expected == ["MacBook Air M2, Price: 1450, Quantity: 4, Promotion: Second Half price!",
+                            "Windows License, Price: 125, Quantity: Unlimited"]
+
+        with EventSourcedInventory(log_path, snapshot_path) as recovered:
+            assert state(recovered) == expected
+            assert recovered.last_seq == 7
+            assert [event["type"] for event in recovered.events()] == \
+                ["add", "add", "add", "promotion", "buy", "restock", "remove"]
+
+    def test_failed_commands_append_nothing(self, tmp_path):
+        with EventSourcedInventory(tmp_path / "events.log", tmp_path / "inventory.snap") as inventory:
+            fill(inventory)
+            with pytest.raises(Exception, match="Not enough MacBook Air M2 in stock!"):
+                inventory.order([("MacBook Air M2", 11)])
+            with pytest.raises(Exception, match="already exists!"):
+                inventory.add_product(Product("MacBook Air M2", price=1, quantity=1))
+            with pytest.raises(Exception, match="is not in the inventory!"):
+                inventory.restock("Pixel", 1)
+            assert inventory.last_seq == 3
+
+    def test_compaction_bounds_replay_and_keeps_history(self, tmp_path):
+        log_path, snapshot_path = tmp_path / "events.log", tmp_path / "inventory.snap"
+        with EventSourcedInventory(log_path, snapshot_path, compact_every=4) as inventory:
+            fill(inventory)
+            inventory.set_promotion("Windows License", PercentDiscount("30% off!", percent=30))
+            # The fourth event triggered a snapshot and started an empty log
+            assert snapshot_path.exists()
+            assert log_path.read_text() == ""
+            inventory.order([("MacBook Air M2", 2)])
+            inventory.order([("MacBook Air M2", 3)])
+            expected = state(inventory)
+
+        with EventSourcedInventory(log_path, snapshot_path, compact_every=4) as recovered:
+            assert state(recovered) == expected
+            assert recovered.snapshot_seq == 4
+            assert len(list(recovered.log.read())) == 2
+            assert [event["seq"] for event in recovered.events()] == [1, 2, 3, 4, 5, 6]
+            assert [event["seq"] for event in recovered.events(after_seq=3)] == [4, 5, 6]
+
+            recovered.compact()
+            recovered.compact()
+            assert [event["seq"] for event in recovered.events()] == [1, 2, 3, 4, 5, 6]
+            recovered.restock("MacBook Air M2", 1)
+            assert recovered.last_seq == 7
+
+    def test_failed_write_leaves_the_projection_alone(self, tmp_path):
+        with EventSourcedInventory(tmp_path / "events.log", tmp_path / "inventory.snap") as inventory:
+            fill(inventory)
+            inventory.log.close()
+
+            with pytest.raises(ValueError):
+                inventory.order([("MacBook Air M2", 2)])
+            with pytest.raises(ValueError):
+                inventory.restock("Shipping", 5)
+            assert inventory.get_product("MacBook Air M2").quantity == 10
+            assert inventory.get_product("Shipping").quantity == 250
+
+    def test_failed_compaction_does_not_fail_the_command(self, tmp_path):
+        # The snapshot cannot be written into a directory that does not exist
+        snapshot_path = tmp_path / "missing" / "inventory.snap"
+        with EventSourcedInventory(tmp_path / "events.log", snapshot_path, compact_every=2) as inventory:
+            fill(inventory)
+            assert inventory.last_seq == 3
+            assert isinstance(inventory.last_compaction_error, OSError)
+
+            # The next event retries and succeeds once the directory exists
+            snapshot_path.parent.mkdir()
+            inventory.restock("Shipping", 5)
+            assert inventory.last_compaction_error is None
+            assert inventory.snapshot_seq == 4
+            assert inventory.get_product("Shipping").quantity == 255
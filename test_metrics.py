@@ -0,0 +1,90 @@
+import pytest
+import metrics
+from products import Product, NonStockedProduct, SecondHalfPrice, ThirdOneFree
+from stores import Store
+
+
+@pytest.fixture
+def recording():
+    """Enable metrics for one test and leave them disabled and empty afterwards."""
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+    metrics.reset()
+
+
+class TestMetrics:
+
+    def test_disabled_by_default_records_nothing(self):
+        metrics.reset()
+        product = Product("MacBook Air M2", price=1450, quantity=100)
+        Store([product]).order([(product, 2)], quiet=True)
+        product.buy(1)
+
+        snapshot = metrics.snapshot()
+        assert snapshot["orders"] == {"ok": 0, "failed": 0}
+        assert snapshot["units_sold"] == {}
+        assert snapshot["latency"] == {}
+
+    def test_order_records_latency_units_and_deactivations(self, recording):
+        mac = Product("MacBook Air M2", price=1450, quantity=2)
+        pixel = Product("Google Pixel 7", price=500, quantity=10)
+        pixel.set_promotion(SecondHalfPrice("Second Half price!"))
+        store = Store([mac, pixel])
+
+        store.order([(mac, 2), (pixel, 3)], quiet=True)
+
+        snapshot = recording.snapshot()
+        assert snapshot["orders"] == {"ok": 1, "failed": 0}
+        assert snapshot["units_sold"] == {"MacBook Air M2": 2, "Google Pixel 7": 3}
+        assert snapshot["deactivations"] == {"MacBook Air M2": 1}
+        assert snapshot["latency"]["order"]["count"] == 1
+        assert snapshot["latency"]["order"]["buckets"][-1] == (float("inf"), 1)
+        assert snapshot["lines_priced"] == 2
+        assert snapshot["promotion_lines"] == {"SecondHalfPrice": 1}
+        assert snapshot["promotion_hit_rate"] == 0.5
+
+    def test_failed_order_records_stockout(self, recording):
+        mac = Product("MacBook Air M2", price=1450, quantity=1)
+        store = Store([mac])
+
+        with pytest.raises(Exception):
+            store.order([(mac, 5)], quiet=True)
+
+        snapshot = recording.snapshot()
+        assert snapshot["orders"] == {"ok": 0, "failed": 1}
+        assert snapshot["stockouts"] == {"MacBook Air M2": 1}
+        assert snapshot["units_sold"] == {}
+
+    def test_buy_records_units_and_promotions(self, recording):
+        product = Product("Bose QuietComfort Earbuds", price=250, quantity=3)
+        product.set_promotion(ThirdOneFree("Third One Free!"))
+        license = NonStockedProduct("Windows License", price=125)
+
+        product.buy(3)
+        license.buy(2)
+        with pytest.raises(Exception):
+            Product("Empty", price=1, quantity=1).buy(2)
+
+        snapshot = recording.snapshot()
+        assert snapshot["latency"]["buy"]["count"] == 2
+        assert snapshot["units_sold"] == {"Bose QuietComfort Earbuds": 3, "Windows License": 2}
+        assert snapshot["deactivations"] == {"Bose QuietComfort Earbuds": 1}
+        assert snapshot["stockouts"] == {"Empty": 1}
+        assert snapshot["promotion_lines"] == {"ThirdOneFree": 1}
+
+    def test_write_prometheus(self, recording, tmp_path):
+        product = Product('Cable "USB-C"', price=10, quantity=10)
+        Store([product]).order([(product, 4)], quiet=True)
+
+        path = tmp_path / "metrics.prom"
+        metrics.write_prometheus(path)
+        text = path.read_text()
+
+        assert "# TYPE bestbuy_latency_seconds histogram" in text
+        assert 'bestbuy_latency_seconds_bucket{operation="order",le="+Inf"} 1' in text
+        assert 'bestbuy_latency_seconds_count{operation="order"} 1' in text
+        assert 'bestbuy_orders_total{outcome="ok"} 1' in text
+        assert 'bestbuy_units_sold_total{product="Cable \\"USB-C\\""} 4' in text
+        assert "bestbuy_lines_priced_total 1" in text
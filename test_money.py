@@ -0,0 +1,67 @@
+import pytest
+from decimal import Decimal
+from fractions import Fraction
+from money import Money
+from products import Product, SecondHalfPrice, PercentDiscount
+from stores import Store
+
+
+class TestMoney:
+
+    def test_amounts_are_exact_cents(self):
+        assert Money(19.99).cents == 1999
+        assert Money("0.10").cents == 10
+        assert Money(Decimal("2.005")).cents == 201
+        assert Money(1450).cents == 145000
+        assert Money(0.1) + Money(0.2) == Money("0.3")
+
+    def test_compares_with_plain_numbers(self):
+        assert Money(10) == 10
+        assert Money(10) == 10.0
+        assert Money(19.99) == 19.99
+        assert Money(5) < 5.01
+        assert 3 * Money(10.0) == 30.0
+        assert hash(Money(10)) == hash(10)
+        assert hash(Money(19.99)) == hash(19.99)
+
+    def test_equal_amounts_hash_alike(self):
+        # Decimal and Fraction order against Money but are never equal to it
+        assert Money("19.99") != Decimal("19.99")
+        assert Money(10) != Fraction(10)
+        assert Money(5) < Decimal("5.01")
+        assert len({Money(10), 10, 10.0, Money("10.00")}) == 1
+
+    def test_rounds_half_away_from_zero_once(self):
+        assert (Money("0.01") * 0.5).cents == 1
+        assert (Money("-0.01") * 0.5).cents == -1
+        assert (Money("0.03") / 2).cents == 2
+        # Multiplying first and rounding once differs from rounding every item
+        assert Money("0.01") * 3 * 0.5 == Money("0.02")
+        assert round(Money("2.50")) == 3
+
+    def test_formatting(self):
+        assert f"{Money(1450):.2f}" == "1450.00"
+        assert str(Money(1450)) == "1450"
+        assert str(Money(12.5)) == "12.50"
+        assert repr(Money(12.5)) == "Money('12.50')"
+
+    def test_promotions_and_totals_are_exact(self):
+        product = Product("Cable", price=0.1, quantity=100)
+        assert product.buy(3) == Money("0.3")
+
+        # Half of 19.99 is rounded up to 10.00
+        product = Product("Case", price=19.99, quantity=100)
+        product.set_promotion(SecondHalfPrice("Second Half price!"))
+        assert product.get_price(2).cents == 2999
+
+        product.set_promotion(PercentDiscount("33% off", percent=33))
+        assert product.get_price(3).cents == 4018
+
+        store = Store([Product("A", price=0.1, quantity=10), Product("B", price=0.2, quantity=10)])
+        total = store.order([(product, 1) for product in store.products], quiet=True)
+        assert isinstance(total, Money)
+        assert total == Money("0.3")
+
+    def test_invalid_amounts(self):
+        with pytest.raises(ValueError):
+            Money(float("nan"))
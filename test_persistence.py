@@ -0,0 +1,192 @@
+import threading
+from fractions import Fraction
+
+import pytest
+
+from products import Product, NonStockedProduct, LimitedProduct, SecondHalfPrice, ThirdOneFree, PercentDiscount
+from promotion_engine import PromotionEngine
+from persistence import save_snapshot, load_snapshot, checkpoint, restore, OrderLog
+from stores import Store
+
+
+class TornFile:
+    """Wraps a log file so that writes stop halfway with an error, like a full disk."""
+
+    def __init__(self, file, can_truncate=True):
+        self.file = file
+        self.can_truncate = can_truncate
+
+    def write(self, data):
+        self.file.write(data[:len(data) // 2])
+        raise OSError("No space left on device")
+
+    def truncate(self, size):
+        if not self.can_truncate:
+            raise OSError("Read-only file system")
+        return self.file.truncate(size)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def build_store():
+    macbook = Product("MacBook Air M2", price=1450, quantity=100)
+    macbook.set_promotion(SecondHalfPrice("Second Half price!"))
+    license = NonStockedProduct("Windows License", price=125)
+    license.set_promotion(PercentDiscount("30% off!", percent=30))
+    return Store([macbook, license, LimitedProduct("Shipping", price=10, quantity=250, maximum=1)])
+
+
+class TestPersistence:
+
+    def test_snapshot_round_trip(self, tmp_path):
+        """Test that a loaded snapshot has the same products, stock and promotions."""
+        path = tmp_path / "catalog.snap"
+        save_snapshot(build_store(), path, order_seq=7)
+
+        store, order_seq = load_snapshot(path)
+
+        assert order_seq == 7
+        assert [product.show() for product in store.products] == [
+            "MacBook Air M2, Price: 1450, Quantity: 100, Promotion: Second Half price!",
+            "Windows License, Price: 125, Quantity: Unlimited, Promotion: 30% off!",
+            "Shipping, Price: 10, Quantity: 250, Limited to 1 per order",
+        ]
+        assert store.get_product("Windows License").promotion.percent == 30
+        assert store.get_total_quantity() == "Total items of 350 in store"
+
+    def test_engine_pricing_plans_round_trip(self, tmp_path):
+        """Test that promotions compiled by the PromotionEngine are saved and price the same after loading."""
+        earbuds = Product("Bose QuietComfort Earbuds", price=250, quantity=500)
+        license = NonStockedProduct("Windows License", price=125)
+        engine = PromotionEngine()
+        engine.add_rule(earbuds, ThirdOneFree("Third One Free!"), priority=1)
+        engine.add_rule(earbuds, PercentDiscount("10% off!", percent=10))
+        engine.add_rule(earbuds, PercentDiscount("Staff price", percent=12.5))
+        engine.add_rule(license, PercentDiscount("A third off", percent=Fraction(100, 3)))
+        engine.add_rule(license, PercentDiscount("10% off!", percent=10))
+        path = tmp_path / "catalog.snap"
+        save_snapshot(Store([earbuds, license]), path)
+
+        store, _ = load_snapshot(path)
+
+        for product in (earbuds, license):
+            loaded = store.get_product(product.name)
+            assert loaded.show() == product.show()
+            assert [loaded.get_price(quantity) for quantity in range(1, 8)] == \
+                [product.get_price(quantity) for quantity in range(1, 8)]
+
+    def test_restart_replays_orders_after_snapshot(self, tmp_path):
+        # Orders logged after the snapshot are applied again on restore
+        snapshot_path, log_path = tmp_path / "catalog.snap", tmp_path / "orders.log"
+        store = build_store()
+        log = OrderLog(log_path)
+        log.attach(store)
+
+        store.order([(store.get_product("MacBook Air M2"), 10)], quiet=True)
+        assert checkpoint(store, log, snapshot_path) == 1
+        store.order([(store.get_product("MacBook Air M2"), 5), (store.get_product("Shipping"), 1)], quiet=True)
+        store.order([(store.get_product("Windows License"), 2)], quiet=True)
+        log.close()
+
+        restored, restored_log = restore(snapshot_path, log_path)
+
+        assert restored.get_product("MacBook Air M2").quantity == 85
+        assert restored.get_product("Shipping").quantity == 249
+        assert restored_log.last_seq == 3
+
+        # The restored store keeps logging with the next sequence number
+        restored.order([(restored.get_product("Shipping"), 1)], quiet=True)
+        restored_log.close()
+        assert [seq for seq, _ in OrderLog(log_path).entries(after_seq=3)] == [4]
+
+    def test_checkpoint_waits_for_logged_orders_to_apply(self, tmp_path):
+        """Test that a checkpoint taken mid-order does not skip the logged but unapplied order."""
+        snapshot_path, log_path = tmp_path / "catalog.snap", tmp_path / "orders.log"
+        store = build_store()
+        log = OrderLog(log_path)
+        log.attach(store)
+        logged, proceed = threading.Event(), threading.Event()
+
+        def pause(shopping_list):
+            # Runs after the log entry is written and before stock changes
+            logged.set()
+            proceed.wait(5)
+
+        store.add_order_listener(pause)
+        order = threading.Thread(target=store.order, args=([(store.get_product("MacBook Air M2"), 10)],),
+                                 kwargs={"quiet": True})
+        order.start()
+        logged.wait(5)
+        saver = threading.Thread(target=checkpoint, args=(store, log, snapshot_path))
+        saver.start()
+        saver.join(0.2)
+        assert saver.is_alive()
+
+        proceed.set()
+        order.join()
+        saver.join()
+        log.close()
+        restored, restored_log = restore(snapshot_path, log_path)
+        restored_log.close()
+        assert restored.get_product("MacBook Air M2").quantity == 90
+
+    def test_torn_log_entry_is_ignored(self, tmp_path):
+        """Test that a half-written last entry does not break replay or new appends."""
+        log_path = tmp_path / "orders.log"
+        log_path.write_text('{"seq": 1, "items": [["Shipping", 1]]}\n{"seq": 2, "ite')
+
+        log = OrderLog(log_path)
+        assert log.last_seq == 1
+        log.append([(Product("Shipping", 10, 5), 1)])
+        log.close()
+
+        assert [seq for seq, _ in OrderLog(log_path).entries()] == [1, 2]
+
+    def test_failed_log_write_rejects_the_order(self, tmp_path):
+        # The order is logged before stock changes, so a failed write changes nothing
+        store = build_store()
+        log = OrderLog(tmp_path / "orders.log")
+        log.attach(store)
+        log.close()
+        macbook = store.get_product("MacBook Air M2")
+
+        with pytest.raises(ValueError):
+            store.order([(macbook, 10)], quiet=True)
+        assert macbook.quantity == 100
+
+    @pytest.mark.parametrize("can_truncate", [True, False])
+    def test_partial_log_write_does_not_hide_the_next_entry(self, tmp_path, can_truncate):
+        """Test that an entry written after a failed, half-written one is replayed."""
+        snapshot_path, log_path = tmp_path / "catalog.snap", tmp_path / "orders.log"
+        store = build_store()
+        save_snapshot(store, snapshot_path)
+        log = OrderLog(log_path)
+        log.attach(store)
+        macbook = store.get_product("MacBook Air M2")
+        store.order([(macbook, 10)], quiet=True)
+
+        log_file = log._file
+        log._file = TornFile(log_file, can_truncate)
+        with pytest.raises(OSError):
+            store.order([(macbook, 5)], quiet=True)
+        log._file = log_file
+        assert log.last_seq == 1
+
+        store.order([(macbook, 20)], quiet=True)
+        log.close()
+        assert macbook.quantity == 70
+
+        restored, restored_log = restore(snapshot_path, log_path)
+        restored_log.close()
+        assert restored.get_product("MacBook Air M2").quantity == 70
+        assert restored_log.last_seq == 2
+
+    def test_lines_that_are_not_entries_are_skipped(self, tmp_path):
+        log_path = tmp_path / "orders.log"
+        log_path.write_text('{"seq": 1, "items": [["Shipping", 1]]}\n[1, 2]\n"text"\n{"items": []}\n')
+
+        log = OrderLog(log_path)
+        assert log.last_seq == 1
+        assert [seq for seq, _ in log.entries()] == [1]
+        log.close()
@@ -0,0 +1,41 @@
+import pytest
+import pricing
+from products import Product, NonStockedProduct, SecondHalfPrice, ThirdOneFree, PercentDiscount
+
+
+def build_shopping_list(lines):
+    """Build a shopping list that cycles through every promotion type."""
+    promotions = [None, SecondHalfPrice("Half"), ThirdOneFree("Free"), PercentDiscount("30% off", percent=30)]
+    shopping_list = []
+    for i in range(lines):
+        if i % 5 == 4:
+            product = NonStockedProduct(f"License {i}", price=125.25)
+        else:
+            product = Product(f"Product {i}", price=10 + i * 0.37, quantity=1000)
+        if promotions[i % 4]:
+            product.set_promotion(promotions[i % 4])
+        shopping_list.append((product, i % 7 + 1))
+    return shopping_list
+
+
+class TestPricing:
+
+    def test_price_line_applies_promotion(self):
+        # A line is priced through the product's promotion when it has one
+        product = Product("MacBook Air M2", 1450, 100)
+        assert pricing.price_line(product, 3) == 4350
+
+        product.set_promotion(SecondHalfPrice("Second Half price!"))
+        assert pricing.price_line(product, 3) == 1450 * 2 + 725
+
+    def test_batch_pricing_matches_per_line_pricing(self, monkeypatch):
+        """Test that the NumPy batch path returns exactly the per-line results."""
+        pytest.importorskip("numpy")
+        monkeypatch.setattr(pricing, "BATCH_MIN_LINES", 1)
+        shopping_list = build_shopping_list(500)
+
+        expected = [pricing.price_line(product, quantity) for product, quantity in shopping_list]
+        actual = pricing.price_lines(shopping_list)
+
+        assert actual == expected
+        assert pricing.sum_prices(actual) == pricing.sum_prices(expected)
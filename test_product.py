@@ -1,5 +1,14 @@
+import pickle
+
 import pytest
-from products import Product  # Assuming the Product class is in a file named product.py
+from products import Product, NonStockedProduct, LimitedProduct  # Assuming the Product class is in a file named product.py
+import products
+import products_with_magic
+from catalog import CatalogStore
+
+
+class TaggedProduct(Product):
+    """A Product subclass without __slots__, so instances have a __dict__."""
 
 class TestProduct:
 
@@ -75,3 +84,71 @@ class TestProduct:
         assert product.quantity == 5
         assert product.is_active() is True
 
+
+    def test_products_use_slots(self):
+        """Test that the product hierarchy has no per-instance __dict__."""
+        for product in [Product("Test Product", 10.0, 5),
+                        NonStockedProduct("Test License", 10.0),
+                        LimitedProduct("Test Shipping", 10.0, 5, maximum=1),
+                        products_with_magic.LimitedProduct("Test Shipping", 10.0, 5, maximum=1)]:
+            assert not hasattr(product, "__dict__")
+
+        # The magic variant keeps its property based API
+        product = products_with_magic.Product("Test Product", 10.0, 5)
+        product.promotion = products_with_magic.ThirdOneFree("Third One Free!")
+        product.quantity = 0
+        assert product.promotion.name == "Third One Free!"
+        assert product.active is False
+
+    def test_equal_prices_share_one_money_object(self):
+        # Otherwise every product would pay for its own Money object
+        pixel = Product("Google Pixel 7", 499.99, 5)
+        pixel.price = 500
+        assert Product("Bose QuietComfort Earbuds", 500, 5).price is pixel.price
+        assert products_with_magic.Product("Google Pixel 7", 499.99, 5).price is \
+            Product("MacBook Air M2", 499.99, 5).price
+
+    def test_pickling_keeps_subclass_attributes(self):
+        """Test that pickled products keep their slots and any attributes of a subclass __dict__."""
+        product = TaggedProduct("Test Product", 10.0, 5)
+        product.tag = "clearance"
+        product.add_observer(lambda *change: None)
+        copy = pickle.loads(pickle.dumps(product))
+
+        assert (copy.name, copy.price, copy.quantity, copy.tag) == ("Test Product", 10, 5, "clearance")
+        copy.quantity = 3  # Observers are not pickled
+
+        view = CatalogStore([Product("Test Product", 10.0, 5)]).get_product("Test Product")
+        assert pickle.loads(pickle.dumps(view)).quantity == 5
+
+    def test_promotion_quotes_are_cached(self):
+        """Test that repeated quotes hit the cache and changes are never served stale."""
+        cache = products.QuoteCache(maxsize=2)
+        product = Product("Test Product", 10, 100)
+        half_price = products.SecondHalfPrice("Half price")
+
+        assert cache.quote(half_price, product, 2) == 15
+        assert cache.quote(products.SecondHalfPrice("Other name"), product, 2) == 15
+        assert cache.stats()["hits"] == 1
+
+        # A new price or another promotion no longer matches the cached entries
+        product.price = 20
+        assert cache.quote(half_price, product, 2) == 30
+        assert cache.quote(products.PercentDiscount("50% off", percent=50), product, 2) == 20
+        assert cache.stats() == {"hits": 1, "misses": 3, "hit_rate": 0.25, "size": 2, "maxsize": 2}
+
+    def test_buy_uses_current_promotion(self):
+        # Switching promotions on a product changes its next quote
+        product = Product("Test Product", 10, 100)
+        product.set_promotion(products.ThirdOneFree("Third One Free!"))
+        assert product.buy(3) == 20
+
+        product.remove_promotion()
+        assert product.buy(3) == 30
+
+    def test_magic_products_sort_by_price(self):
+        # sorted() orders magic products by price
+        cheap = products_with_magic.Product("Cheap", 5, 1)
+        expensive = products_with_magic.Product("Expensive", 50, 1)
+        assert sorted([expensive, cheap]) == [cheap, expensive]
+        assert cheap < expensive
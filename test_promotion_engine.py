@@ -0,0 +1,56 @@
+import pytest
+
+from products import Product, SecondHalfPrice, ThirdOneFree, PercentDiscount
+from promotion_engine import PromotionEngine, PricingPlan
+
+
+class TestPromotionEngine:
+
+    def test_percent_discount_stacks_with_quantity_promotion(self):
+        """Test that a percentage off is applied on top of Third One Free."""
+        product = Product("Bose QuietComfort Earbuds", 250, 500)
+        engine = PromotionEngine()
+
+        engine.add_rule(product, ThirdOneFree("Third One Free!"), priority=1)
+        engine.add_rule(product, PercentDiscount("10% off!", percent=10))
+
+        assert isinstance(product.promotion, PricingPlan)
+        assert product.promotion.name == "Third One Free! + 10% off!"
+        assert product.buy(3) == pytest.approx(2 * 250 * 0.9)
+
+    def test_only_highest_priority_quantity_promotion_applies(self):
+        # Two quantity based promotions cannot stack
+        product = Product("MacBook Air M2", 1450, 100)
+        engine = PromotionEngine()
+
+        engine.add_rule(product, ThirdOneFree("Third One Free!"), priority=1)
+        engine.add_rule(product, SecondHalfPrice("Second Half price!"), priority=2)
+
+        assert product.get_price(2) == 1450 + 725
+
+    def test_exclusive_rules(self):
+        """Test that a top exclusive rule wins alone and lower exclusive rules are skipped."""
+        product = Product("Google Pixel 7", 500, 250)
+        engine = PromotionEngine()
+
+        engine.add_rule(product, PercentDiscount("Staff price", percent=50), priority=1, exclusive=True)
+        engine.add_rule(product, PercentDiscount("10% off!", percent=10))
+        assert product.get_price(1) == 250
+
+        engine.add_rule(product, PercentDiscount("20% off!", percent=20), priority=5)
+        assert product.get_price(1) == pytest.approx(500 * 0.8 * 0.9)
+
+    def test_category_rules_follow_membership(self):
+        # Category rules apply to every product in the category until cleared
+        laptop = Product("MacBook Air M2", 1450, 100)
+        phone = Product("Google Pixel 7", 500, 250)
+        engine = PromotionEngine()
+        engine.add_product(laptop, category="computers")
+        engine.add_product(phone, category="phones")
+
+        engine.add_category_rule("computers", SecondHalfPrice("Second Half price!"))
+        assert laptop.promotion.name == "Second Half price!"
+        assert phone.promotion is None
+
+        engine.clear_category_rules("computers")
+        assert laptop.promotion is None
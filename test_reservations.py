@@ -0,0 +1,110 @@
+import pytest
+from products import Product, NonStockedProduct
+from stores import Store
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def shop():
+    """A store with one stocked product and a reservation book on a fake clock."""
+    macbook = Product("MacBook Air M2", price=1450, quantity=10)
+    store = Store([macbook, NonStockedProduct("Windows License", price=125)])
+    book = store.reservations()
+    book.clock = FakeClock()
+    book.ttl = 60
+    return store, book, macbook
+
+
+class TestReservations:
+
+    def test_holds_reduce_available_stock(self, shop):
+        store, book, macbook = shop
+        assert store.reservations() is book
+
+        hold = book.hold(macbook, 4)
+        assert book.held(macbook) == 4
+        assert book.available(macbook) == 6
+        assert macbook.quantity == 10
+
+        # Other orders and holds only see the stock that is not held
+        with pytest.raises(Exception, match="Not enough MacBook Air M2 in stock!"):
+            store.order([(macbook, 7)], quiet=True)
+        with pytest.raises(Exception, match="Not enough MacBook Air M2 in stock!"):
+            book.hold(macbook, 7)
+        store.order([(macbook, 6)], quiet=True)
+
+        book.release(hold)
+        assert book.available(macbook) == 4
+
+    def test_holds_expire_after_ttl(self, shop):
+        store, book, macbook = shop
+        first = book.hold(macbook, 3)
+        book.clock.now = 30
+        second = book.hold(macbook, 5)
+
+        book.clock.now = 61
+        assert book.expire() == [first]
+        assert book.held(macbook) == 5
+        assert not book.is_live(first)
+
+        # Extending restarts the TTL, so the old expiry entry is skipped
+        book.extend(second)
+        book.clock.now = 100
+        assert book.is_live(second)
+        book.clock.now = 200
+        assert book.held(macbook) == 0
+        with pytest.raises(Exception, match="Reservation of MacBook Air M2 has expired!"):
+            book.extend(second)
+
+    def test_cart_orders_held_stock(self, shop):
+        store, book, macbook = shop
+        cart = book.cart()
+        cart.add(macbook, 8)
+        cart.add(store.get_product("Windows License"), 2)
+
+        # The held stock is available to the cart's own order only
+        with pytest.raises(Exception):
+            store.order([(macbook, 3)], quiet=True)
+        assert cart.order(quiet=True) == 8 * 1450 + 2 * 125
+        assert macbook.quantity == 2
+        assert book.held(macbook) == 0
+        assert cart.holds == []
+
+    def test_expired_cart_orders_if_stock_is_left(self, shop):
+        store, book, macbook = shop
+        cart = book.cart()
+        cart.add(macbook, 2)
+        other = book.cart()
+        other.add(macbook, 2)
+        book.clock.now = 61
+
+        # The stock of an expired hold is taken again when it is still there
+        assert cart.order(quiet=True) == 2 * 1450
+        assert macbook.quantity == 8
+
+        # ...and the order fails only if others took it meanwhile
+        store.order([(macbook, 7)], quiet=True)
+        with pytest.raises(Exception, match="Not enough MacBook Air M2 in stock!"):
+            other.order(quiet=True)
+        assert macbook.quantity == 1
+
+    def test_hold_expiring_during_the_check_is_not_counted_twice(self, shop):
+        """Test that a hold expiring while an order is checked does not free other carts' stock."""
+        store, book, macbook = shop
+        own = book.hold(macbook, 4)
+        book.hold(macbook, 6, ttl=600)
+
+        # Every reading of the clock moves it on, so the first hold expires mid-check
+        times = iter([59, 61, 61, 61])
+        book.clock = lambda: next(times)
+
+        with pytest.raises(Exception, match="Not enough MacBook Air M2 in stock!"):
+            store.order([(macbook, 8)], quiet=True, holds=[own])
+        assert macbook.quantity == 10
@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+from products import Product, SecondHalfPrice
+from service import CheckoutService
+from stores import Store
+
+
+def build_store():
+    macbook = Product("MacBook Air M2", price=1450, quantity=100)
+    macbook.set_promotion(SecondHalfPrice("Second Half price!"))
+    return Store([macbook, Product("Google Pixel 7", price=500, quantity=3)])
+
+
+class TestCheckoutService:
+
+    def test_concurrent_submissions_are_priced_and_applied(self):
+        """Test that many queued orders are priced like Store.order and update stock."""
+        store = build_store()
+        service = CheckoutService(store)
+
+        async def run():
+            results = await asyncio.gather(*(service.submit([["MacBook Air M2", 2]]) for _ in range(50)),
+                                           return_exceptions=True)
+            await service.stop()
+            return results
+
+        results = asyncio.run(run())
+
+        assert results == [1450 + 725] * 50
+        assert store.get_product("MacBook Air M2").quantity == 0
+        assert service.orders_processed == 50
+
+    def test_tcp_orders_report_errors_without_changing_stock(self):
+        # A rejected order over TCP gets an error response and leaves stock untouched
+        store = build_store()
+        service = CheckoutService(store)
+
+        async def run():
+            server = await service.serve()
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            responses = []
+            for items in ([["Google Pixel 7", 2]], [["Google Pixel 7", 1], ["Unknown", 1]]):
+                writer.write(json.dumps({"items": items}).encode() + b"\n")
+                await writer.drain()
+                responses.append(json.loads(await reader.readline()))
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            await service.stop()
+            return responses
+
+        ok, failed = asyncio.run(run())
+
+        assert ok == {"ok": True, "total": 1000}
+        assert failed == {"ok": False, "error": "Product Unknown is not available!"}
+        assert store.get_product("Google Pixel 7").quantity == 1
+
+    def test_invalid_quantities_are_rejected(self):
+        """Test that fractional, boolean and non-positive quantities never reach the store."""
+        store = build_store()
+        service = CheckoutService(store)
+
+        async def run():
+            results = await asyncio.gather(
+                *(service.submit(items) for items in ([["Google Pixel 7", 1.5]], [["Google Pixel 7", True]],
+                                                      [["Google Pixel 7", 0]], [[7, 1]])),
+                return_exceptions=True)
+            await service.stop()
+            return results
+
+        results = asyncio.run(run())
+
+        assert [str(error) for error in results] == [
+            "Invalid quantity 1.5 for Google Pixel 7!", "Invalid quantity True for Google Pixel 7!",
+            "Invalid quantity 0 for Google Pixel 7!", "Invalid product name 7!"]
+        assert store.get_product("Google Pixel 7").quantity == 3
+        assert service.orders_failed == 4
@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from products import Product, NonStockedProduct, SecondHalfPrice
+from sharding import ShardedInventory, shard_for
+from stores import Store
+
+
+def build_products():
+    product_list = [Product(f"Product {i}", price=10 + i, quantity=20) for i in range(12)]
+    product_list[0].set_promotion(SecondHalfPrice("Second Half price!"))
+    product_list.append(NonStockedProduct("Windows License", price=125))
+    return product_list
+
+
+@pytest.fixture(params=[False, True], ids=["in-process", "multi-process"])
+def inventory(request):
+    inventory = ShardedInventory(shard_count=3, processes=request.param)
+    inventory.add_products(build_products())
+    yield inventory
+    inventory.close()
+
+
+class TestShardedInventory:
+
+    def test_products_spread_over_shards(self, inventory):
+        # Every product is found through its shard
+        assert len({shard_for(product.name, 3) for product in build_products()}) == 3
+        assert inventory.get_product("Product 5").price == 15
+        assert inventory.get_product("Unknown") is None
+        assert inventory.get_total_quantity() == "Total items of 240 in store"
+
+    def test_order_matches_single_store(self, inventory):
+        """Test that a cross-shard order costs the same as in one Store and updates every shard."""
+        items = [("Product 0", 3), ("Product 7", 2), ("Windows License", 1), ("Product 0", 1)]
+        reference = Store(build_products())
+        expected = reference.order([(reference.get_product(name), quantity) for name, quantity in items], quiet=True)
+
+        assert inventory.order(items) == expected
+        assert inventory.get_product("Product 0").quantity == 16
+        assert inventory.total_quantity() == reference.total_quantity()
+
+    def test_rejected_order_changes_no_shard(self, inventory):
+        # One shard lacking stock aborts the parts already accepted by the others
+        with pytest.raises(Exception) as e:
+            inventory.order([("Product 1", 5), ("Product 2", 5), ("Product 3", 21)])
+
+        assert str(e.value) == "Not enough Product 3 in stock!"
+        assert inventory.total_quantity() == 240
+
+    def test_concurrent_orders_never_oversell(self, inventory):
+        """Test that parallel routers calls never sell more than the stock."""
+        def buy(_):
+            try:
+                inventory.order([("Product 4", 3), ("Product 9", 1)])
+                return True
+            except Exception:
+                return False
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            succeeded = sum(pool.map(buy, range(20)))
+
+        assert succeeded == 6
+        assert inventory.get_product("Product 4").quantity == 2
+        assert inventory.get_product("Product 9").quantity == 14
+
+    def test_busy_shard_does_not_block_others(self, inventory):
+        # Requests only lock the shards they address
+        busy = shard_for("Product 5", 3)
+        other = next(product.name for product in build_products() if shard_for(product.name, 3) != busy)
+        with inventory._shard_locks[busy]:
+            assert inventory.get_product(other).name == other
@@ -0,0 +1,74 @@
+import sqlite3
+
+import pytest
+
+from products import Product, NonStockedProduct, LimitedProduct, SecondHalfPrice
+from sqlite_store import SQLiteStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    macbook = Product("MacBook Air M2", price=1450, quantity=100)
+    macbook.set_promotion(SecondHalfPrice("Second Half price!"))
+    store = SQLiteStore(tmp_path / "store.db", [
+        macbook,
+        NonStockedProduct("Windows License", price=125),
+        LimitedProduct("Shipping", price=10, quantity=1, maximum=1),
+    ])
+    yield store
+    store.close()
+
+
+class TestSQLiteStore:
+
+    def test_store_api(self, store):
+        """Test that the SQLite store answers like the list based Store."""
+        assert store.get_total_quantity() == "Total items of 101 in store"
+        assert [product.name for product in store.get_all_products()] == \
+            ["MacBook Air M2", "Windows License", "Shipping"]
+        assert store.get_product("Shipping").maximum == 1
+        assert store.get_product("MacBook Air M2").promotion.name == "Second Half price!"
+
+        store.remove_product(store.get_product("Windows License"))
+        assert store.get_product("Windows License") is None
+
+    def test_order_updates_rows_in_one_transaction(self, store):
+        # The order is priced from the database and the stock update is shared
+        macbook = store.get_product("MacBook Air M2")
+        shipping = store.get_product("Shipping")
+
+        total = store.order([(macbook, 2), (shipping, 1), (store.get_product("Windows License"), 1)], quiet=True)
+
+        assert total == 1450 + 725 + 10 + 125
+        assert macbook.quantity == 98
+        assert shipping.is_active() is False
+        assert store.get_total_quantity() == "Total items of 98 in store"
+        assert [product.name for product in store.get_all_products()] == ["MacBook Air M2", "Windows License"]
+
+    def test_failed_order_rolls_back(self, store, tmp_path):
+        """Test that a rejected order changes nothing, also as seen from another connection."""
+        macbook = store.get_product("MacBook Air M2")
+
+        with pytest.raises(Exception) as e:
+            store.order([(macbook, 2), (store.get_product("Shipping"), 2)], quiet=True)
+        assert str(e.value) == "Not enough Shipping in stock!"
+
+        other = SQLiteStore(tmp_path / "store.db")
+        assert other.get_total_quantity() == "Total items of 101 in store"
+        other.close()
+
+    def test_other_schema_versions_are_rejected(self, tmp_path):
+        newer = tmp_path / "new.db"
+        connection = sqlite3.connect(newer)
+        connection.execute("PRAGMA user_version = 99")
+        connection.close()
+        # A products table without a recorded version was not written by this store
+        unversioned = tmp_path / "unversioned.db"
+        connection = sqlite3.connect(unversioned)
+        connection.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, price REAL)")
+        connection.close()
+
+        for path, version in [(newer, 99), (unversioned, 0)]:
+            with pytest.raises(Exception) as e:
+                SQLiteStore(path)
+            assert f"schema version {version}," in str(e.value)
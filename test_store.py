@@ -0,0 +1,565 @@
+import gc
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from products import Product, NonStockedProduct, LimitedProduct, Promotion, SecondHalfPrice
+from stores import Store
+from catalog import CatalogStore
+import products_with_magic
+import stores_with_magic
+
+
+class TestStore:
+
+    def test_get_product_by_name(self):
+        # Products can be looked up by name without scanning the list
+        macbook = Product("MacBook Air M2", 1450, 100)
+        pixel = Product("Google Pixel 7", 500, 250)
+        store = Store([macbook, pixel])
+
+        assert store.get_product("Google Pixel 7") is pixel
+        assert store.get_product("Unknown") is None
+
+    def test_remove_product_keeps_indexes_in_sync(self):
+        """Test that removed products disappear from the list and name index."""
+        macbook = Product("MacBook Air M2", 1450, 100)
+        pixel = Product("Google Pixel 7", 500, 250)
+        store = Store([macbook, pixel])
+
+        store.remove_product(macbook)
+
+        assert store.products == [pixel]
+        assert store.get_product("MacBook Air M2") is None
+
+        # Removing a product that is not in the store is a no-op
+        store.remove_product(macbook)
+        assert store.products == [pixel]
+
+    def test_products_is_a_read_only_live_view(self):
+        macbook = Product("MacBook Air M2", 1450, 100)
+        pixel = Product("Google Pixel 7", 500, 250)
+        products = [macbook]
+        store = Store(products)
+        view = store.products
+
+        # Changes go through the store; the view follows them
+        store.add_product(pixel)
+        assert list(view) == [macbook, pixel]
+        assert view[-1] is pixel
+        assert products == [macbook]
+        with pytest.raises(AttributeError):
+            view.append(pixel)
+
+    def test_magic_products_can_be_stored_and_ordered(self):
+        laptop = products_with_magic.Product("Laptop", 1000, 5)
+        mouse = products_with_magic.Product("Mouse", 20, 10)
+        for store in (Store([laptop]), stores_with_magic.Store([laptop])):
+            store.add_product(mouse)
+            assert store.total_quantity() == 15
+            assert store.cheapest(1) == [mouse]
+            store.remove_product(mouse)
+        store = Store([laptop, mouse])
+
+        assert store.order([(laptop, 5), (mouse, 2)], quiet=True) == 5040
+        assert store.total_quantity() == 8
+        assert store.get_all_products() == [mouse]
+        mouse.price = 5
+        assert store.query(max_price=10) == [mouse]
+
+    def test_renamed_products_are_reindexed(self):
+        macbook = Product("MacBook Air M2", 1450, 100)
+        pixel = Product("Google Pixel 7", 500, 250)
+        store = Store([macbook, pixel])
+
+        pixel.name = "MacBook Pro"
+        assert store.get_product("Google Pixel 7") is None
+        assert store.get_product("MacBook Pro") is pixel
+        assert store.query(name_prefix="MacBook") == [macbook, pixel]
+        assert store.query(name_prefix="Google") == []
+
+        # The product added first keeps winning a name lookup
+        pixel.name = macbook.name
+        macbook.name = "Old MacBook"
+        macbook.name = pixel.name
+        assert store.get_product("MacBook Air M2") is macbook
+
+    def test_duplicate_names_fall_back_to_remaining_product(self):
+        """Test that the name index survives removal of one of two same-named products."""
+        first = Product("Shipping", 10, 5)
+        second = Product("Shipping", 12, 5)
+        store = Store([first, second])
+
+        assert store.get_product("Shipping") is first
+        store.remove_product(first)
+        assert store.get_product("Shipping") is second
+
+    def test_magic_store_contains_uses_index(self):
+        # Membership works by instance and by name
+        pixel = Product("Google Pixel 7", 500, 250)
+        store = stores_with_magic.Store([pixel])
+
+        assert pixel in store
+        assert "Google Pixel 7" in store
+        assert "MacBook Air M2" not in store
+        assert Product("Google Pixel 7", 500, 250) not in store
+
+    def test_total_quantity_follows_product_changes(self):
+        """Test that the running total reflects purchases, restocks and removals."""
+        macbook = Product("MacBook Air M2", 1450, 100)
+        pixel = Product("Google Pixel 7", 500, 250)
+        store = Store([macbook, pixel])
+        assert store.get_total_quantity() == "Total items of 350 in store"
+
+        macbook.buy(10)
+        pixel.set_quantity(300)
+        assert store.get_total_quantity() == "Total items of 390 in store"
+
+        store.remove_product(pixel)
+        assert store.get_total_quantity() == "Total items of 90 in store"
+
+        # Removed products no longer update the store
+        pixel.set_quantity(1)
+        assert store.get_total_quantity() == "Total items of 90 in store"
+
+    def test_active_products_follow_activation(self):
+        """Test that deactivated products are hidden and reactivated ones keep catalog order."""
+        macbook = Product("MacBook Air M2", 1450, 100)
+        earbuds = Product("Bose QuietComfort Earbuds", 250, 500)
+        pixel = Product("Google Pixel 7", 500, 250)
+        store = Store([macbook, earbuds, pixel])
+
+        macbook.deactivate()
+        earbuds.set_quantity(0)
+        assert store.get_all_products() == [pixel]
+
+        macbook.activate()
+        assert store.get_all_products() == [macbook, pixel]
+
+
+class TestCatalogStore:
+
+    def test_catalog_store_keeps_store_api(self):
+        """Test that views over catalog rows behave like products in a Store."""
+        store = CatalogStore([
+            Product("MacBook Air M2", price=1450, quantity=100),
+            NonStockedProduct("Windows License", price=125),
+            LimitedProduct("Shipping", price=10, quantity=250, maximum=1),
+        ])
+        assert store.get_total_quantity() == "Total items of 350 in store"
+
+        macbook = store.get_product("MacBook Air M2")
+        shipping = store.get_product("Shipping")
+        assert isinstance(store.get_product("Windows License"), NonStockedProduct)
+        assert shipping.maximum == 1
+
+        macbook.set_promotion(SecondHalfPrice("Second Half price!"))
+        assert store.order([(macbook, 2), (shipping, 1)], quiet=True) == 1450 + 725 + 10
+        assert store.get_total_quantity() == "Total items of 347 in store"
+
+        macbook.set_quantity(0)
+        assert [product.name for product in store.get_all_products()] == ["Windows License", "Shipping"]
+
+    def test_removed_rows_are_skipped(self):
+        # Removing a product clears its row without renumbering the others
+        store = CatalogStore([Product("MacBook Air M2", 1450, 100), Product("Google Pixel 7", 500, 250)])
+        macbook = store.get_product("MacBook Air M2")
+
+        store.remove_product(macbook)
+
+        assert not store.has_product(macbook)
+        assert store.get_product("MacBook Air M2") is None
+        assert store.get_product("Google Pixel 7").quantity == 250
+        assert store.get_total_quantity() == "Total items of 250 in store"
+        assert len(store.products) == 1
+
+    def test_views_can_be_renamed(self):
+        """Test that renaming a view updates the catalog's names and name index."""
+        store = CatalogStore([Product("Google Pixel 7", 500, 5), Product("MacBook Air M2", 1450, 100),
+                              Product("Pixel 7", 480, 10)])
+        pixel, macbook = store.get_product("Google Pixel 7"), store.get_product("MacBook Air M2")
+        version = store.names_version
+
+        pixel.name = "Pixel 7"
+        macbook.name = "MacBook Air"
+
+        assert store.names_version == version + 2
+        assert store.get_product("Google Pixel 7") is None
+        assert store.get_product("Pixel 7") == pixel
+        assert [product.quantity for product in store.get_products_named("Pixel 7")] == [5, 10]
+        assert [product.name for product in store.products] == ["Pixel 7", "MacBook Air", "Pixel 7"]
+        with pytest.raises(ValueError):
+            macbook.name = ""
+
+        store.remove_product(macbook)
+        with pytest.raises(ValueError, match="removed"):
+            macbook.name = "MacBook Air M2"
+
+
+class TestConcurrentOrders:
+
+    def test_concurrent_orders_never_oversell(self, capsys):
+        """Test that many threads ordering the same products never drive stock negative."""
+        store = Store([Product(f"Product {i}", price=10, quantity=500) for i in range(4)])
+        products = store.products
+        sold = [0] * len(products)
+        sold_lock = threading.Lock()
+
+        def checkout(worker):
+            for attempt in range(200):
+                # Every order touches two products, in alternating order
+                first = products[(worker + attempt) % len(products)]
+                second = products[(worker + attempt + 1) % len(products)]
+                lines = [(first, 2), (second, 1)] if attempt % 2 else [(second, 1), (first, 2)]
+                try:
+                    store.order(lines, quiet=True)
+                except Exception:
+                    continue
+                with sold_lock:
+                    sold[products.index(first)] += 2
+                    sold[products.index(second)] += 1
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(checkout, range(16)))
+
+        for product, units_sold in zip(products, sold):
+            assert product.quantity >= 0
+            assert product.quantity == 500 - units_sold
+        assert store.get_total_quantity() == f"Total items of {sum(p.quantity for p in products)} in store"
+
+    def test_repeated_lines_are_checked_together(self):
+        # Two lines of the same product must not exceed its stock together
+        product = Product("Google Pixel 7", 500, 3)
+        store = Store([product])
+
+        with pytest.raises(Exception) as e:
+            store.order([(product, 2), (product, 2)], quiet=True)
+        assert "Not enough Google Pixel 7 in stock!" in str(e.value)
+        assert product.quantity == 3
+
+    def test_product_locks_only_exist_for_stocked_products(self):
+        # Orders of products outside the store must not leave locks behind
+        pixel = Product("Google Pixel 7", 500, 3)
+        stranger = Product("MacBook Air M2", 1450, 100)
+        store = Store([pixel])
+
+        store.order([(pixel, 1), (stranger, 1)], quiet=True)
+        assert list(store._product_locks) == [store.lock_key(pixel)]
+
+        store.remove_product(pixel)
+        assert store._product_locks == {}
+
+
+class FailingPromotion(Promotion):
+    """A promotion that cannot be applied, to simulate failures mid-order."""
+
+    def apply_promotion(self, product, quantity):
+        raise Exception("Promotion service unavailable!")
+
+
+class TestOrderTransactions:
+
+    def test_failed_order_leaves_no_trace(self):
+        """Test that a line failing to price leaves every product untouched."""
+        macbook = Product("MacBook Air M2", 1450, 100)
+        pixel = Product("Google Pixel 7", 500, 1)
+        pixel.set_promotion(FailingPromotion("Broken"))
+        store = Store([macbook, pixel])
+
+        with pytest.raises(Exception):
+            store.order([(macbook, 5), (pixel, 1)], quiet=True)
+
+        assert macbook.quantity == 100
+        assert pixel.quantity == 1
+        assert pixel.is_active() is True
+        assert store.get_total_quantity() == "Total items of 101 in store"
+
+    def test_transaction_commits_on_clean_exit(self):
+        # Lines reserved in a with-block are applied together at the end
+        macbook = Product("MacBook Air M2", 1450, 100)
+        license = NonStockedProduct("Windows License", 125)
+        store = Store([macbook, license])
+
+        with store.transaction() as transaction:
+            transaction.reserve(macbook, 2)
+            transaction.reserve(license, 3)
+            assert macbook.quantity == 100
+
+        assert transaction.state == "committed"
+        assert macbook.quantity == 98
+        assert license.quantity == 0
+
+    def test_transaction_aborts_on_error(self):
+        """Test that an exception inside the block aborts the transaction."""
+        macbook = Product("MacBook Air M2", 1450, 100)
+        store = Store([macbook])
+
+        with pytest.raises(Exception):
+            with store.transaction() as transaction:
+                transaction.reserve(macbook, 2)
+                transaction.reserve(macbook, 99)
+
+        assert transaction.state == "aborted"
+        assert macbook.quantity == 100
+        with pytest.raises(Exception):
+            transaction.commit()
+
+
+class TestOrderResults:
+
+    def test_checkout_returns_priced_lines(self, capsys):
+        """Test that checkout reports lines, total and sold-out products without printing."""
+        macbook = Product("MacBook Air M2", 1450, 2)
+        macbook.set_promotion(SecondHalfPrice("Second Half price!"))
+        license = NonStockedProduct("Windows License", 125)
+        store = Store([macbook, license])
+
+        result = store.checkout([(macbook, 2), (license, 1)])
+
+        assert [(line.product, line.quantity, line.price) for line in result.lines] == \
+            [(macbook, 2, 2175), (license, 1, 125)]
+        assert result.total_price == 2300
+        assert result.deactivated_products == [macbook]
+        assert capsys.readouterr().out == ""
+
+    def test_order_prints_summary(self, capsys):
+        # Without quiet, order prints every line and the total
+        pytest.importorskip("colorama")
+        pixel = Product("Google Pixel 7", 500, 10)
+        store = Store([pixel])
+
+        assert store.order([(pixel, 2)]) == 1000
+
+        output = capsys.readouterr().out
+        assert "2 * Google Pixel 7 for 500€" in output
+        assert "Total price: 1000.00 €" in output
+
+
+class TestProductQueries:
+
+    def build_store(self):
+        product_list = [
+            Product("MacBook Air M2", price=1450, quantity=100),
+            Product("MacBook Pro", price=2400, quantity=10),
+            Product("Bose QuietComfort Earbuds", price=250, quantity=500),
+            Product("Google Pixel 7", price=500, quantity=250),
+            NonStockedProduct("Windows License", price=125),
+            LimitedProduct("Shipping", price=10, quantity=250, maximum=1),
+        ]
+        product_list[0].set_promotion(SecondHalfPrice("Second Half price!"))
+        product_list[3].set_promotion(SecondHalfPrice("Second Half price!"))
+        return Store(product_list)
+
+    def test_filters(self):
+        """Test each filter on its own and combined."""
+        store = self.build_store()
+
+        def names(products):
+            return [product.name for product in products]
+
+        assert names(store.query(name_prefix="MacBook")) == ["MacBook Air M2", "MacBook Pro"]
+        assert names(store.query(min_price=200, max_price=1450)) == \
+            ["Bose QuietComfort Earbuds", "Google Pixel 7", "MacBook Air M2"]
+        assert names(store.query(promotion_type=SecondHalfPrice)) == ["MacBook Air M2", "Google Pixel 7"]
+        assert names(store.query(kind=NonStockedProduct)) == ["Windows License"]
+        assert names(store.query(name_prefix="MacBook", promotion_type=SecondHalfPrice)) == ["MacBook Air M2"]
+        assert names(store.query(max_price=500, offset=1, limit=2)) == ["Windows License", "Bose QuietComfort Earbuds"]
+
+    def test_indexes_follow_changes(self):
+        # Price, promotion, activity and removal changes are reflected in queries
+        store = self.build_store()
+        pixel = store.get_product("Google Pixel 7")
+        macbook = store.get_product("MacBook Air M2")
+
+        pixel.price = 3000
+        pixel.remove_promotion()
+        macbook.set_quantity(0)
+        store.remove_product(store.get_product("MacBook Pro"))
+
+        assert store.query(min_price=2000) == [pixel]
+        assert store.query(promotion_type=SecondHalfPrice) == []
+        assert store.query(name_prefix="MacBook") == []
+        assert store.query(name_prefix="MacBook", active_only=False) == [macbook]
+
+    def test_large_indexes_stay_sorted(self):
+        """Test the price index and name trie past a few index chunks, with adds and removals."""
+        products = [Product(f"Item {i * 7919 % 3000:04d}", price=(i * 37 % 1000) / 4, quantity=1)
+                    for i in range(3000)]
+        store = Store(products[:2000])
+        for product in products[2000:]:
+            store.add_product(product)
+        for product in products[::3]:
+            store.remove_product(product)
+        remaining = [product for index, product in enumerate(products) if index % 3]
+
+        by_price = sorted(remaining, key=lambda product: product.price)
+        assert store.query(min_price=10.01, max_price=99.5) == \
+            [product for product in by_price if 10.01 <= product.price <= 99.5]
+        assert store.cheapest(5) == by_price[:5]
+        assert store.query(name_prefix="Item 12") == \
+            sorted((product for product in remaining if product.name.startswith("Item 12")),
+                   key=lambda product: product.name)
+
+    def test_cheapest_and_most_expensive(self):
+        """Test that top-k queries come from the price index and skip inactive products."""
+        store = self.build_store()
+        store.get_product("Shipping").deactivate()
+
+        assert [product.name for product in store.cheapest(2)] == ["Windows License", "Bose QuietComfort Earbuds"]
+        assert [product.name for product in store.most_expensive(2)] == ["MacBook Pro", "MacBook Air M2"]
+        assert store.cheapest(1, active_only=False) == [store.get_product("Shipping")]
+
+        store.get_product("Windows License").price = 5000
+        assert store.most_expensive(1)[0].name == "Windows License"
+
+        # Products that are changed while inactive come back at their new price
+        shipping = store.get_product("Shipping")
+        shipping.price = 3000
+        assert store.most_expensive(1)[0].name == "Windows License"
+        shipping.activate()
+        assert store.most_expensive(2) == [store.get_product("Windows License"), shipping]
+        assert store.query(min_price=2500, max_price=3500) == [shipping]
+
+    def test_catalog_store_top_k(self):
+        # The columnar store answers the same top-k questions
+        store = CatalogStore(self.build_store().products)
+
+        assert [product.name for product in store.cheapest(2)] == ["Shipping", "Windows License"]
+        assert [product.name for product in store.most_expensive(1)] == ["MacBook Pro"]
+
+
+class TestPaginatedListing:
+
+    def test_pages_follow_cursor(self):
+        """Test that cursors walk the catalog page by page and skip inactive products."""
+        product_list = [Product(f"Product {i}", price=10, quantity=5) for i in range(7)]
+        product_list[2].deactivate()
+        store = Store(product_list)
+
+        first = store.list_products(page_size=3)
+        second = store.list_products(first.next_cursor, page_size=3)
+
+        assert first.products == [product_list[0], product_list[1], product_list[3]]
+        assert second.products == product_list[4:7]
+        assert second.next_cursor is None
+        assert list(first.render())[0] == "Product 0, Price: 10, Quantity: 5"
+
+    def test_cursor_survives_removals(self):
+        # Removing products, even enough to compact the index, keeps cursors valid
+        product_list = [Product(f"Product {i}", price=10, quantity=5) for i in range(200)]
+        store = Store(product_list)
+        page = store.list_products(page_size=10)
+
+        for product in product_list[5:150]:
+            store.remove_product(product)
+
+        assert store.list_products(page.next_cursor, page_size=3).products == product_list[150:153]
+
+    def test_catalog_store_pages(self):
+        """Test that CatalogStore pages by row."""
+        store = CatalogStore([Product(f"Product {i}", price=10, quantity=5) for i in range(5)])
+        store.remove_product(store.get_product("Product 1"))
+
+        page = store.list_products(page_size=2)
+        assert [product.name for product in page.products] == ["Product 0", "Product 2"]
+        assert [product.name for product in store.list_products(page.next_cursor).products] == \
+            ["Product 3", "Product 4"]
+
+
+class TestStoreUnion:
+
+    def build_union(self):
+        berlin = stores_with_magic.Store([Product("MacBook Air M2", 1450, 100), Product("Google Pixel 7", 500, 10)])
+        hamburg = stores_with_magic.Store([Product("Google Pixel 7", 480, 5), Product("Shipping", 10, 250)])
+        return berlin, hamburg, berlin + hamburg
+
+    def test_union_is_a_deduplicated_view(self):
+        """Test that '+' returns a view where the first store wins for duplicate names."""
+        berlin, hamburg, union = self.build_union()
+
+        assert union.members == [berlin, hamburg]
+        assert union.get_product("Google Pixel 7") is berlin.get_product("Google Pixel 7")
+        assert "Shipping" in union
+        assert hamburg.get_product("Google Pixel 7") not in union
+        assert [product.name for product in union.products] == ["MacBook Air M2", "Google Pixel 7", "Shipping"]
+        assert union.get_total_quantity() == "Total items of 360 in store"
+
+    def test_union_follows_member_changes(self):
+        # The view reflects later changes to its members without being rebuilt
+        berlin, hamburg, union = self.build_union()
+
+        berlin.remove_product(berlin.get_product("Google Pixel 7"))
+        hamburg.get_product("Shipping").set_quantity(0)
+
+        assert union.get_product("Google Pixel 7").price == 480
+        assert [product.name for product in union.get_all_products()] == ["MacBook Air M2", "Google Pixel 7"]
+        assert union.get_total_quantity() == "Total items of 105 in store"
+
+    def test_nested_unions_flatten_and_materialize(self):
+        """Test that chained '+' keeps one flat member list and materializes to a Store."""
+        berlin, hamburg, union = self.build_union()
+        munich = stores_with_magic.Store([Product("Windows License", 125, 0)])
+
+        combined = union + munich
+        snapshot = combined.materialize()
+
+        assert combined.members == [berlin, hamburg, munich]
+        assert isinstance(snapshot, stores_with_magic.Store)
+        assert [product.name for product in snapshot.products] == \
+            ["MacBook Air M2", "Google Pixel 7", "Shipping", "Windows License"]
+
+    def test_union_passes_changes_to_members(self):
+        berlin, hamburg, union = self.build_union()
+        macbook = berlin.get_product("MacBook Air M2")
+        shipping = hamburg.get_product("Shipping")
+        charger = Product("Charger", 20, 30)
+
+        union.add_product(charger)
+        assert berlin.get_product("Charger") is charger
+        assert union.total_quantity() == 100 + 10 + 250 + 30
+
+        assert union.order([(shipping, 2)], quiet=True) == 20
+        assert shipping.quantity == 248
+
+        union.remove_product(hamburg.get_product("Google Pixel 7"))
+        union.remove_product(charger)
+        assert "Charger" not in union
+        assert union.total_quantity() == 100 + 10 + 248
+
+    def test_union_orders_can_span_members(self):
+        """Test that an order mixing members is checked against each member's reservations."""
+        berlin, hamburg, union = self.build_union()
+        macbook = berlin.get_product("MacBook Air M2")
+        shipping = hamburg.get_product("Shipping")
+        hamburg.reservations().hold(shipping, 249)
+
+        assert union.order([(macbook, 2), (shipping, 1)], quiet=True) == 2910
+        assert (macbook.quantity, shipping.quantity) == (98, 249)
+
+        # Shipping is held or sold, so nothing is taken from Berlin either
+        with pytest.raises(Exception, match="Not enough Shipping"):
+            union.order([(macbook, 1), (shipping, 1)], quiet=True)
+        assert (macbook.quantity, shipping.quantity) == (98, 249)
+
+    def test_dropped_stores_stop_observing_products(self):
+        berlin, hamburg, union = self.build_union()
+        macbook = berlin.get_product("MacBook Air M2")
+
+        for _ in range(100):
+            union.materialize()
+        gc.collect()
+        macbook.quantity -= 1
+
+        assert len(macbook._observers) == 1
+        assert berlin.total_quantity() == 99 + 10
+
+    def test_shadowed_names_follow_member_changes(self):
+        berlin, hamburg, union = self.build_union()
+        assert union.total_quantity() == 100 + 10 + 250
+
+        # Removing Berlin's Pixel uncovers Hamburg's, renaming covers Shipping
+        berlin.remove_product(berlin.get_product("Google Pixel 7"))
+        assert union.total_quantity() == 100 + 5 + 250
+        berlin.get_product("MacBook Air M2").name = "Shipping"
+        assert union.total_quantity() == 100 + 5